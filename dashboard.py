@@ -2,6 +2,8 @@
 # dependencies = [
 #   "bbos",
 #   "fastapi",
+#   "numpy",
+#   "psutil",
 #   "uvicorn",
 #   "wsproto",
 # ]
@@ -9,16 +11,46 @@
 # bbos = { path = "/home/bracketbot/BracketBotOS", editable = true }
 # ///
 import asyncio
+import collections
+import itertools
 import json
+import os
 import signal
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse
+import numpy as np
+import psutil
 import uvicorn
 
 from bbos.app_manager import get_status, start_app, stop_app
+from tools.coldstart import RESULTS_PATH, app_name, load_results, summary
 
-REFRESH_TIME: float = 2.0  # seconds
+POLL_TIME: float = 1.0  # seconds between status scans, shared by all clients
+DIFF_HISTORY = 64  # diffs kept for cheap resync of reconnecting clients
+JOB_WORKERS = 8  # app starts/stops running at once
+JOB_HISTORY = 20  # finished jobs kept for newly connected clients
+METRICS_TIME: float = 1.0  # seconds between app process samples
+METRICS_HISTORY = 120  # samples kept per app for sparklines
+
+METRICS_DTYPE = np.dtype([
+    ("time", "<f8"),
+    ("cpu", "<f4"),  # percent of one core, summed over the process tree
+    ("rss", "<u8"),  # bytes
+    ("threads", "<u4"),
+    ("ctx", "<f4"),  # context switches per second
+])
+
+# Named groups of apps started and stopped together: app -> apps it needs
+# running first. Independent apps start in parallel; stopping goes in
+# reverse dependency order.
+PROFILES: Dict[str, Dict[str, List[str]]] = {
+    "stack": {"flow": [], "viewer": [], "nav": []},
+}
 
 _stop = False
 
@@ -28,8 +60,374 @@ def _sigint(*_):
 
 signal.signal(signal.SIGINT, _sigint)
 
+class StatusCache:
+    """One app status map, polled in the background and shared by every client.
+
+    Each change bumps `version` and is pushed to all subscribers as a diff
+    carrying only the apps whose state changed, from the version it applies to:
+
+        {"type": "diff", "from": 6, "version": 7, "changed": {"app": true}, "removed": []}
+
+    A client applies a diff only if `from` is the version it has. One that
+    missed versions asks for `since(version)` and gets the merged diffs it
+    missed (from its version), or a full snapshot if they are no longer kept.
+    """
+
+    def __init__(self):
+        self.status: Dict[str, Any] = {}
+        self.version = 0
+        self._diffs = collections.deque(maxlen=DIFF_HISTORY)  # (version, changed, removed)
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._lock = None
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"type": "snapshot", "version": self.version, "apps": self.status}
+
+    def since(self, version: Optional[int]) -> Dict[str, Any]:
+        """Everything a client at `version` needs to catch up."""
+        if version is None or version > self.version or (
+                version < self.version and (not self._diffs or self._diffs[0][0] > version + 1)):
+            return self.snapshot()
+        changed, removed = {}, set()
+        for v, c, r in self._diffs:
+            if v > version:
+                changed.update(c)
+                removed.difference_update(c)
+                removed.update(r)
+                for name in r:
+                    changed.pop(name, None)
+        return {"type": "diff", "from": version, "version": self.version,
+                "changed": changed, "removed": sorted(removed)}
+
+    def subscribe(self) -> asyncio.Queue:
+        queue = asyncio.Queue(maxsize=DIFF_HISTORY)
+        self._subscribers.add(queue)
+        return queue
+
+    def unsubscribe(self, queue: asyncio.Queue):
+        self._subscribers.discard(queue)
+
+    def push(self, queue: asyncio.Queue, message: Dict[str, Any]):
+        """Queue a message for one subscriber without ever blocking.
+
+        A client too slow to keep up gets its backlog compacted instead of
+        dropped: status diffs become one snapshot, and of the other messages
+        only the newest per kind (per job for job updates) is kept, so it
+        still sees every job finish and the current metrics.
+        """
+        try:
+            queue.put_nowait(message)
+        except asyncio.QueueFull:
+            pending = []
+            while not queue.empty():
+                pending.append(queue.get_nowait())
+            kept: Dict[Any, Dict[str, Any]] = {}
+            for i, m in enumerate(pending + [message]):
+                kind = m.get("type")
+                if kind in ("diff", "snapshot"):
+                    continue
+                if kind == "job":
+                    kept[("job", m["job"]["id"])] = m
+                elif kind in ("metrics", "metrics_history", "coldstart"):
+                    kept[kind] = m
+                else:
+                    kept[i] = m  # errors and anything else, in order
+            for m in [self.snapshot(), *kept.values()]:
+                try:
+                    queue.put_nowait(m)
+                except asyncio.QueueFull:
+                    break
+
+    def broadcast(self, message: Dict[str, Any]):
+        for queue in self._subscribers:
+            self.push(queue, message)
+
+    async def refresh(self):
+        """Scan app status once and broadcast what changed."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        async with self._lock:
+            status = await asyncio.to_thread(get_status, exclude=['dashboard'])
+            changed = {name: state for name, state in status.items()
+                       if name not in self.status or self.status[name] != state}
+            removed = [name for name in self.status if name not in status]
+            if not changed and not removed:
+                return
+            self.status = status
+            self.version += 1
+            self._diffs.append((self.version, changed, removed))
+            self.broadcast({"type": "diff", "from": self.version - 1, "version": self.version,
+                            "changed": changed, "removed": removed})
+
+    async def run(self):
+        while not _stop:
+            try:
+                await self.refresh()
+            except Exception as e:
+                print(f"[dashboard] Status poll error: {e}")
+            await asyncio.sleep(POLL_TIME)
+
+class JobManager:
+    """App starts and stops run as background jobs on a thread pool.
+
+    A job starts or stops a set of apps, each as soon as the apps it
+    depends on are done (for stops: once the apps depending on it are
+    stopped), so a profile takes as long as its slowest dependency chain.
+    Every state change is broadcast to all clients:
+
+        {"type": "job", "job": {"id", "action", "target", "state",
+         "progress", "apps": {"nav": "running", ...}, "started", "finished"}}
+
+    App states go pending -> running -> done | failed. An app is skipped if
+    it is already in the requested state or busy in another job, and
+    blocked if something it needs failed.
+    """
+
+    def __init__(self, status_cache: StatusCache):
+        self.status_cache = status_cache
+        self.jobs: Dict[str, Dict[str, Any]] = collections.OrderedDict()
+        self._busy: Set[str] = set()
+        self._ids = itertools.count(1)
+        self._pool = ThreadPoolExecutor(max_workers=JOB_WORKERS, thread_name_prefix="dashboard-job")
+        self._tasks: Set[asyncio.Task] = set()  # the loop only keeps weak references
+
+    def active(self) -> List[Dict[str, Any]]:
+        return [job for job in self.jobs.values() if job["state"] == "running"]
+
+    def _emit(self, job: Dict[str, Any]):
+        job["progress"] = round(sum(state not in ("pending", "running") for state in job["apps"].values())
+                                / max(len(job["apps"]), 1), 3)
+        self.status_cache.broadcast({"type": "job", "job": {**job, "apps": dict(job["apps"])}})
+
+    def submit(self, action: str, target: str, graph: Dict[str, List[str]]) -> str:
+        """Start a job running `action` ("start" or "stop") over `graph` and return its id."""
+        job_id = f"job-{next(self._ids)}"
+        job = {"id": job_id, "action": action, "target": target, "state": "running",
+               "progress": 0.0, "apps": {name: "pending" for name in graph},
+               "started": time.time(), "finished": None}
+        self.jobs[job_id] = job
+        while len(self.jobs) > JOB_HISTORY and next(iter(self.jobs.values()))["state"] != "running":
+            self.jobs.popitem(last=False)
+        task = asyncio.create_task(self._run(job, graph))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return job_id
+
+    async def _call(self, job: Dict[str, Any], action: str, name: str) -> bool:
+        job["apps"][name] = "running"
+        self._emit(job)
+        fn = start_app if action == "start" else stop_app
+        try:
+            return bool(await asyncio.get_running_loop().run_in_executor(self._pool, fn, name))
+        except Exception as e:
+            print(f"[dashboard] Error in {action} of {name}: {e}")
+            return False
+
+    async def _run(self, job: Dict[str, Any], graph: Dict[str, List[str]]):
+        action, apps = job["action"], job["apps"]
+        if action == "start":
+            needs = {name: set(deps) & set(graph) for name, deps in graph.items()}
+        else:
+            needs = {name: {other for other, deps in graph.items() if name in deps} for name in graph}
+        wanted = action == "start"
+        for name in graph:
+            if name in self._busy or self.status_cache.status.get(name) == wanted:
+                apps[name] = "skipped"
+        self._busy.update(name for name, state in apps.items() if state == "pending")
+
+        running: Dict[asyncio.Task, str] = {}
+        try:
+            while True:
+                for name, state in apps.items():
+                    if state != "pending":
+                        continue
+                    if any(apps[dep] in ("failed", "blocked") for dep in needs[name]):
+                        apps[name] = "blocked"
+                        self._busy.discard(name)
+                    elif all(apps[dep] in ("done", "skipped") for dep in needs[name]):
+                        running[asyncio.create_task(self._call(job, action, name))] = name
+                if not running:
+                    break
+                finished, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in finished:
+                    name = running.pop(task)
+                    apps[name] = "done" if task.result() else "failed"
+                    self._busy.discard(name)
+                    self._emit(job)
+                await self.status_cache.refresh()
+        finally:
+            # Whatever is still pending waits on a failed app or a dependency cycle
+            for name, state in apps.items():
+                if state == "pending":
+                    apps[name] = "blocked"
+                    self._busy.discard(name)
+            job["state"] = "failed" if {"failed", "blocked"} & set(apps.values()) else "done"
+            job["finished"] = time.time()
+            self._emit(job)
+
+class AppMonitor:
+    """Samples each app's process tree on a background thread.
+
+    Every METRICS_TIME the thread sums CPU %, RSS, threads and context
+    switches over each app's processes and their descendants, appends a
+    row to the app's ring of METRICS_HISTORY samples and hands the latest
+    values to `publish`. Processes are classified by command line once per
+    PID and their psutil handles are kept, so CPU % is measured between
+    samples.
+    """
+
+    def __init__(self, apps: Callable[[], Iterable[str]], publish: Callable[[Dict[str, Any]], None]):
+        self.apps = apps
+        self.publish = publish
+        self._names: Dict[int, Optional[str]] = {}  # pid -> app it runs, if any
+        self._procs: Dict[int, psutil.Process] = {}
+        self._ctx: Dict[int, int] = {}  # pid -> context switches at the last sample
+        self._rings: Dict[str, np.ndarray] = {}
+        self._counts: Dict[str, int] = {}
+        self._last = time.monotonic()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="dashboard-metrics", daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(METRICS_TIME):
+            try:
+                self._sample()
+            except Exception as e:
+                print(f"[dashboard] Metrics sample error: {e}")
+
+    def _trees(self, wanted: Set[str]) -> Dict[str, Set[int]]:
+        """PIDs of each wanted app's processes and all their descendants."""
+        children: Dict[int, List[int]] = collections.defaultdict(list)
+        live = set()
+        for proc in psutil.process_iter(["ppid"]):
+            live.add(proc.pid)
+            children[proc.info["ppid"]].append(proc.pid)
+        for pid in self._names.keys() - live:
+            del self._names[pid]
+            self._procs.pop(pid, None)
+            self._ctx.pop(pid, None)
+
+        trees: Dict[str, Set[int]] = {}
+        for pid in live:
+            if pid not in self._names:
+                try:
+                    self._names[pid] = app_name(psutil.Process(pid).cmdline())
+                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                    self._names[pid] = None
+            name = self._names[pid]
+            if name in wanted and pid != os.getpid():
+                trees.setdefault(name, set()).add(pid)
+        for pids in trees.values():
+            stack = list(pids)
+            while stack:
+                for child in children.get(stack.pop(), ()):
+                    if child not in pids:
+                        pids.add(child)
+                        stack.append(child)
+        return trees
+
+    def _sample(self):
+        now, mono = time.time(), time.monotonic()
+        dt, self._last = max(mono - self._last, 1e-3), mono
+        latest = {}
+        for name, pids in self._trees(set(self.apps())).items():
+            row = np.zeros((), dtype=METRICS_DTYPE)
+            row["time"] = now
+            for pid in pids:
+                proc = self._procs.get(pid)
+                try:
+                    if proc is None:
+                        proc = self._procs[pid] = psutil.Process(pid)
+                        proc.cpu_percent(None)  # first call only primes the counter
+                    with proc.oneshot():
+                        row["cpu"] += proc.cpu_percent(None)
+                        row["rss"] += proc.memory_info().rss
+                        row["threads"] += proc.num_threads()
+                        switches = sum(proc.num_ctx_switches())
+                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                    continue
+                row["ctx"] += max(switches - self._ctx.get(pid, switches), 0) / dt
+                self._ctx[pid] = switches
+            with self._lock:
+                ring = self._rings.setdefault(name, np.zeros(METRICS_HISTORY, dtype=METRICS_DTYPE))
+                count = self._counts.get(name, 0)
+                ring[count % len(ring)] = row
+                self._counts[name] = count + 1
+            latest[name] = self._row(row)
+        self.publish({"type": "metrics", "apps": latest})
+
+    @staticmethod
+    def _row(row: np.ndarray) -> Dict[str, Any]:
+        return {
+            "time": float(row["time"]),
+            "cpu": round(float(row["cpu"]), 1),
+            "rss": int(row["rss"]),
+            "threads": int(row["threads"]),
+            "ctx": round(float(row["ctx"]), 1),
+        }
+
+    def history(self) -> Dict[str, Any]:
+        """Every app's kept samples, oldest first, as columns."""
+        apps = {}
+        with self._lock:
+            for name, ring in self._rings.items():
+                count = self._counts[name]
+                rows = ring[np.arange(max(count - len(ring), 0), count) % len(ring)]
+                apps[name] = {
+                    "time": rows["time"].tolist(),
+                    "cpu": np.round(rows["cpu"].astype(np.float64), 1).tolist(),
+                    "rss": rows["rss"].tolist(),
+                    "threads": rows["threads"].tolist(),
+                    "ctx": np.round(rows["ctx"].astype(np.float64), 1).tolist(),
+                }
+        return {"type": "metrics_history", "apps": apps}
+
+def coldstart_message() -> Dict[str, Any]:
+    """Cold-start results per app, as saved by tools/coldstart.py."""
+    return {"type": "coldstart", "apps": {name: summary(runs) for name, runs in load_results().items() if runs}}
+
 def main():
     app = FastAPI()
+    status_cache = StatusCache()
+    jobs = JobManager(status_cache)
+    monitor = None
+
+    @app.on_event("startup")
+    async def startup():
+        nonlocal monitor
+        asyncio.create_task(status_cache.run())
+        loop = asyncio.get_running_loop()
+        monitor = AppMonitor(lambda: status_cache.status,
+                             lambda message: loop.call_soon_threadsafe(status_cache.broadcast, message))
+        monitor.start()
+        asyncio.create_task(watch_coldstart())
+
+    async def watch_coldstart():
+        """Broadcast cold-start results whenever tools/coldstart.py saves a run."""
+        mtime = None
+        while not _stop:
+            try:
+                current = RESULTS_PATH.stat().st_mtime
+            except OSError:
+                current = None
+            if current != mtime:
+                mtime = current
+                status_cache.broadcast(coldstart_message())
+            await asyncio.sleep(POLL_TIME)
+
+    @app.on_event("shutdown")
+    async def shutdown():
+        if monitor is not None:
+            monitor.stop()
     
     @app.get("/", response_class=HTMLResponse)
     async def root():
@@ -127,6 +525,64 @@ h1, h2 {
   cursor: not-allowed;
 }
 
+.app-metrics {
+  font-size: 12px;
+  color: #bbb;
+  margin-top: 5px;
+  font-family: ui-monospace, Menlo, Consolas, monospace;
+}
+
+.spark {
+  width: 100%;
+  height: 30px;
+  display: block;
+  margin-top: 5px;
+}
+
+.app-job {
+  font-size: 12px;
+  color: #FFC107;
+  margin-top: 5px;
+}
+
+.profiles, .jobs {
+  display: flex;
+  flex-wrap: wrap;
+  gap: 10px;
+  margin-top: 15px;
+}
+
+.profile {
+  background: #333;
+  border-radius: 8px;
+  padding: 10px 15px;
+}
+
+.profile .toggle-btn {
+  width: auto;
+  margin-right: 5px;
+}
+
+.job {
+  background: #333;
+  border-radius: 8px;
+  padding: 10px 15px;
+  font-size: 13px;
+  min-width: 220px;
+}
+
+.job.failed {
+  border-left: 4px solid #f44336;
+}
+
+.job.done {
+  border-left: 4px solid #4CAF50;
+}
+
+.job.running {
+  border-left: 4px solid #FFC107;
+}
+
 .loading {
   text-align: center;
   color: #888;
@@ -141,10 +597,23 @@ h1, h2 {
     <h2>Applications</h2>
     <div id="apps-container" class="loading">Loading apps...</div>
   </div>
+
+  <div class="section">
+    <h2>Profiles</h2>
+    <div id="profiles-container" class="profiles"></div>
+    <div id="jobs-container" class="jobs"></div>
+  </div>
 </div>
 
 <script>
 let ws = null;
+let apps = {};
+let version = null;
+let jobs = {};
+let coldstart = {};  // app -> {runs, latest, median} from tools/coldstart.py
+let metrics = {};  // app -> {cpu: [...], rss: [...], latest: {...}}
+const METRICS_HISTORY = """ + str(METRICS_HISTORY) + """;
+const PROFILES = """ + json.dumps(PROFILES) + """;
 
 function connectWebSocket() {
   const protocol = location.protocol === "https:" ? "wss://" : "ws://";
@@ -156,8 +625,60 @@ function connectWebSocket() {
   };
   
   ws.onmessage = function(event) {
-    const data = JSON.parse(event.data);
-    updateApps(data);
+    const msg = JSON.parse(event.data);
+    if (msg.type === "job") {
+      jobs[msg.job.id] = msg.job;
+      updateJobs();
+      updateApps(apps);
+      return;
+    }
+    if (msg.type === "metrics_history") {
+      for (const [name, cols] of Object.entries(msg.apps)) {
+        const n = cols.time.length;
+        metrics[name] = {
+          cpu: cols.cpu, rss: cols.rss,
+          latest: n ? { cpu: cols.cpu[n - 1], rss: cols.rss[n - 1], threads: cols.threads[n - 1], ctx: cols.ctx[n - 1] } : null,
+        };
+      }
+      for (const name of Object.keys(metrics)) drawMetrics(name);
+      return;
+    }
+    if (msg.type === "metrics") {
+      for (const [name, latest] of Object.entries(msg.apps)) {
+        const m = metrics[name] || (metrics[name] = { cpu: [], rss: [], latest: null });
+        m.cpu.push(latest.cpu);
+        m.rss.push(latest.rss);
+        if (m.cpu.length > METRICS_HISTORY) { m.cpu.shift(); m.rss.shift(); }
+        m.latest = latest;
+        drawMetrics(name);
+      }
+      return;
+    }
+    if (msg.type === "coldstart") {
+      coldstart = msg.apps;
+      updateApps(apps);
+      return;
+    }
+    if (msg.type === "error") {
+      console.error(msg.detail);
+      return;
+    }
+    if (msg.type === "snapshot") {
+      apps = msg.apps;
+    } else if (msg.type === "diff") {
+      if (version === null || msg.version <= version) return;
+      if (msg.from !== version) {
+        // Missed an update: ask for what we lack
+        requestStatus();
+        return;
+      }
+      Object.assign(apps, msg.changed);
+      for (const name of msg.removed) delete apps[name];
+    } else {
+      return;
+    }
+    version = msg.version;
+    updateApps(apps);
   };
   
   ws.onclose = function() {
@@ -172,7 +693,7 @@ function connectWebSocket() {
 
 function requestStatus() {
   if (ws && ws.readyState === WebSocket.OPEN) {
-    ws.send(JSON.stringify({ action: "get_status" }));
+    ws.send(JSON.stringify({ action: "resync", version: version }));
   }
 }
 
@@ -183,6 +704,106 @@ function toggleApp(appName, isRunning) {
   }
 }
 
+function runProfile(name, op) {
+  if (ws && ws.readyState === WebSocket.OPEN) {
+    ws.send(JSON.stringify({ action: "profile", name: name, op: op }));
+  }
+}
+
+// App name -> state in the newest running job that touches it
+function appJobs() {
+  const busy = {};
+  for (const job of Object.values(jobs)) {
+    if (job.state !== "running") continue;
+    for (const [name, state] of Object.entries(job.apps)) {
+      if (state === "pending" || state === "running") busy[name] = `${job.action} ${state}`;
+    }
+  }
+  return busy;
+}
+
+function updateProfiles() {
+  const container = document.getElementById("profiles-container");
+  container.innerHTML = "";
+  for (const [name, graph] of Object.entries(PROFILES)) {
+    const div = document.createElement("div");
+    div.className = "profile";
+    div.innerHTML = `
+      <div class="app-name">${name}</div>
+      <div class="app-job">${Object.keys(graph).join(", ")}</div>
+      <button class="toggle-btn" onclick="runProfile('${name}', 'start')">Start</button>
+      <button class="toggle-btn" onclick="runProfile('${name}', 'stop')">Stop</button>
+    `;
+    container.appendChild(div);
+  }
+}
+
+function updateJobs() {
+  const container = document.getElementById("jobs-container");
+  container.innerHTML = "";
+  const recent = Object.values(jobs).sort((a, b) => b.started - a.started).slice(0, 8);
+  for (const job of recent) {
+    const div = document.createElement("div");
+    div.className = `job ${job.state}`;
+    const elapsed = ((job.finished || Date.now() / 1000) - job.started).toFixed(1);
+    const appStates = Object.entries(job.apps).map(([name, state]) => `${name}: ${state}`).join("<br>");
+    div.innerHTML = `
+      <b>${job.action} ${job.target}</b> ${Math.round(job.progress * 100)}% (${elapsed}s)
+      <div class="app-job">${appStates}</div>
+    `;
+    container.appendChild(div);
+  }
+}
+
+function formatBytes(n) {
+  if (n >= 1 << 30) return (n / (1 << 30)).toFixed(1) + " GB";
+  return (n / (1 << 20)).toFixed(0) + " MB";
+}
+
+// Latest values and a CPU % sparkline (scaled to the peak) on an app's card
+function drawMetrics(name) {
+  const m = metrics[name];
+  const text = document.getElementById(`metrics-${name}`);
+  const canvas = document.getElementById(`spark-${name}`);
+  if (!m || !text || !canvas) return;
+  if (!apps[name] || !m.latest) {
+    text.textContent = "";
+    canvas.style.display = "none";
+    return;
+  }
+  const l = m.latest;
+  text.textContent = `CPU ${l.cpu.toFixed(0)}%  RSS ${formatBytes(l.rss)}  ${l.threads} thr  ${l.ctx.toFixed(0)} csw/s`;
+  canvas.style.display = "block";
+  const w = canvas.width = canvas.clientWidth * devicePixelRatio;
+  const h = canvas.height = canvas.clientHeight * devicePixelRatio;
+  const ctx = canvas.getContext("2d");
+  const values = m.cpu;
+  const peak = Math.max(100, ...values);
+  ctx.clearRect(0, 0, w, h);
+  ctx.strokeStyle = "#4CAF50";
+  ctx.lineWidth = devicePixelRatio;
+  ctx.beginPath();
+  values.forEach((v, i) => {
+    const x = (i + METRICS_HISTORY - values.length) / (METRICS_HISTORY - 1) * w;
+    const y = h - v / peak * (h - 2) - 1;
+    i ? ctx.lineTo(x, y) : ctx.moveTo(x, y);
+  });
+  ctx.stroke();
+}
+
+// Median time to first sample (or to the last phase seen), with the latest run's phases as a tooltip
+function coldstartText(name) {
+  const c = coldstart[name];
+  if (!c || !c.latest) return "";
+  const phases = Object.entries(c.median);
+  if (!phases.length) return "";
+  const [phase, t] = c.median.first_publish !== undefined ? ["first_publish", c.median.first_publish] : phases[phases.length - 1];
+  const latest = Object.entries(c.latest.phases).map(([k, v]) => `${k}: ${v.toFixed(2)}s`).join("\\n");
+  const label = phase === "first_publish" ? `first ${c.latest.writer} sample` : phase;
+  return `<div class="app-metrics" title="${latest}">cold start: ${label} in ${t.toFixed(1)}s` +
+    ` (median of ${c.runs})${c.latest.timed_out ? ", last run timed out" : ""}</div>`;
+}
+
 function updateApps(apps) {
   const container = document.getElementById("apps-container");
   container.innerHTML = "";
@@ -193,6 +814,7 @@ function updateApps(apps) {
     return;
   }
   
+  const busy = appJobs();
   for (const [appName, isRunning] of Object.entries(apps)) {
     const card = document.createElement("div");
     card.className = `app-card ${isRunning ? "running" : "stopped"}`;
@@ -202,59 +824,80 @@ function updateApps(apps) {
       <div class="app-status ${isRunning ? "status-running" : "status-stopped"}">
         ${isRunning ? "RUNNING" : "STOPPED"}
       </div>
-      <button class="toggle-btn" onclick="toggleApp('${appName}', ${isRunning})">
+      <div class="app-metrics" id="metrics-${appName}"></div>
+      ${coldstartText(appName)}
+      <canvas class="spark" id="spark-${appName}"></canvas>
+      ${busy[appName] ? `<div class="app-job">${busy[appName]}...</div>` : ""}
+      <button class="toggle-btn" onclick="toggleApp('${appName}', ${isRunning})" ${busy[appName] ? "disabled" : ""}>
         ${isRunning ? "Stop" : "Start"} App
       </button>
     `;
     
     container.appendChild(card);
+    drawMetrics(appName);
   }
 }
 
-// Connect WebSocket and refresh status periodically
+// Connect WebSocket; status changes and job events are pushed by the server
+updateProfiles();
 connectWebSocket();
-setInterval(requestStatus, """ + str(int(REFRESH_TIME * 1000)) + """);
 </script>
 """)
     
+    async def pump(websocket: WebSocket, queue: asyncio.Queue):
+        """Send this client's queued snapshots and diffs."""
+        while True:
+            await websocket.send_text(json.dumps(await queue.get()))
+
     @app.websocket("/ws")
     async def websocket_endpoint(websocket: WebSocket):
         await websocket.accept()
         print("[dashboard] WebSocket client connected")
-        status = lambda: get_status(exclude=['dashboard'])
+        queue = status_cache.subscribe()
+        if monitor is not None:
+            status_cache.push(queue, monitor.history())
+        status_cache.push(queue, coldstart_message())
+        for job in jobs.jobs.values():
+            status_cache.push(queue, {"type": "job", "job": {**job, "apps": dict(job["apps"])}})
+        sender = asyncio.create_task(pump(websocket, queue))
         try:
-            while not _stop:
+            while not _stop and not sender.done():
                 try:
                     # Wait for message with timeout
                     message = await asyncio.wait_for(websocket.receive_text(), timeout=1.0)
                     data = json.loads(message)
                     
                     if data.get("action") == "get_status":
-                        await websocket.send_text(json.dumps(status()))
+                        status_cache.push(queue, status_cache.snapshot())
                     
-                    elif data.get("action") == "start_app":
-                        app_name = data.get("app_name")
-                        if app_name:
-                            success = start_app(app_name)
-                            if success:
-                                await websocket.send_text(json.dumps(status()))
+                    elif data.get("action") == "resync":
+                        status_cache.push(queue, status_cache.since(data.get("version")))
                     
-                    elif data.get("action") == "stop_app":
+                    elif data.get("action") in ("start_app", "stop_app"):
                         app_name = data.get("app_name")
                         if app_name:
-                            success = stop_app(app_name)
-                            print(f"[dashboard] Stopping app: {app_name} - {success}")
-                            if success:
-                                await websocket.send_text(json.dumps(status()))
+                            action = data["action"].split("_")[0]
+                            job_id = jobs.submit(action, app_name, {app_name: []})
+                            print(f"[dashboard] {job_id}: {action} app {app_name}")
+                    
+                    elif data.get("action") == "profile":
+                        name, action = data.get("name"), data.get("op", "start")
+                        if name in PROFILES and action in ("start", "stop"):
+                            job_id = jobs.submit(action, name, PROFILES[name])
+                            print(f"[dashboard] {job_id}: {action} profile {name}")
+                        else:
+                            status_cache.push(queue, {"type": "error", "detail": f"Unknown profile {name} or op {action}"})
                 
                 except asyncio.TimeoutError:
-                    # Send periodic status updates
-                    await websocket.send_text(json.dumps(status()))
+                    continue
                     
         except WebSocketDisconnect:
             print("[dashboard] WebSocket client disconnected")
         except Exception as e:
             print(f"[dashboard] WebSocket error: {e}")
+        finally:
+            sender.cancel()
+            status_cache.unsubscribe(queue)
 
     # Run the server
     uvicorn.run(
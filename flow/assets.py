@@ -0,0 +1,131 @@
+"""In-memory static files for the Flow frontend.
+
+Files are read once at startup and kept with compressed variants. A file's
+`.br`/`.gz` siblings on disk are used if present (see vendor.py); otherwise
+it is gzip-compressed at load, and brotli-compressed too if the module is
+installed. Each encoding gets its own strong ETag, and `respond()` picks a
+representation from Accept-Encoding and answers If-None-Match with a 304.
+"""
+
+import gzip
+import hashlib
+import mimetypes
+import os
+from typing import Dict, Mapping, Optional, Set
+
+from fastapi.responses import Response
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+# Content-Encoding -> file suffix, most preferred first
+ENCODINGS = {'br': '.br', 'gzip': '.gz'}
+
+# Versioned file names never change content
+IMMUTABLE = 'public, max-age=31536000, immutable'
+# Unversioned pages are revalidated with their ETag
+REVALIDATE = 'no-cache'
+
+MIN_COMPRESS_BYTES = 512
+
+
+def compress(content: bytes) -> Dict[str, bytes]:
+    """Compressed variants of `content` that are actually smaller."""
+    if len(content) < MIN_COMPRESS_BYTES:
+        return {}
+    variants = {'gzip': gzip.compress(content, compresslevel=9, mtime=0)}
+    if brotli is not None:
+        variants['br'] = brotli.compress(content)
+    return {enc: data for enc, data in variants.items() if len(data) < len(content)}
+
+
+class Asset:
+    """One file's content and compressed variants, with an ETag per encoding."""
+
+    def __init__(self, content: bytes, media_type: str, cache_control: str,
+                 variants: Optional[Dict[str, bytes]] = None):
+        self.content = content
+        self.media_type = media_type
+        self.cache_control = cache_control
+        self.variants = compress(content) if variants is None else variants
+        digest = hashlib.sha256(content).hexdigest()[:32]
+        self.etags = {enc: f'"{digest}-{enc}"' for enc in self.variants}
+        self.etags[None] = f'"{digest}"'
+
+    @classmethod
+    def load(cls, path: str, cache_control: str) -> 'Asset':
+        """Read `path` and any precompressed siblings."""
+        with open(path, 'rb') as f:
+            content = f.read()
+        variants = {}
+        for enc, suffix in ENCODINGS.items():
+            if os.path.exists(path + suffix):
+                with open(path + suffix, 'rb') as f:
+                    variants[enc] = f.read()
+        media_type = mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        return cls(content, media_type, cache_control, variants or None)
+
+
+class AssetStore:
+    """Every file in a directory, loaded into memory, by name."""
+
+    def __init__(self, root: str, cache_control: str = IMMUTABLE):
+        self.root = root
+        self.assets: Dict[str, Asset] = {}
+        if os.path.isdir(root):
+            for name in sorted(os.listdir(root)):
+                path = os.path.join(root, name)
+                if name.startswith('.') or name.endswith((*ENCODINGS.values(), '.tmp')) or not os.path.isfile(path):
+                    continue
+                self.assets[name] = Asset.load(path, cache_control)
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.assets
+
+    def get(self, name: str) -> Optional[Asset]:
+        return self.assets.get(name)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        return {
+            name: {'bytes': len(asset.content), **{enc: len(data) for enc, data in asset.variants.items()}}
+            for name, asset in self.assets.items()
+        }
+
+
+def accepted(header: str) -> Set[str]:
+    """Encodings an Accept-Encoding header allows (q > 0)."""
+    encodings = set()
+    for part in header.split(','):
+        name, _, params = part.strip().partition(';')
+        q = 1.0
+        for param in params.split(';'):
+            key, _, value = param.strip().partition('=')
+            if key == 'q':
+                try:
+                    q = float(value)
+                except ValueError:
+                    q = 0.0
+        if name and q > 0:
+            encodings.add(name.strip().lower())
+    return encodings
+
+
+def respond(asset: Asset, headers: Mapping[str, str]) -> Response:
+    """Best representation of `asset` for a request's headers, or 304 if the client has it."""
+    allowed = accepted(headers.get('accept-encoding', ''))
+    encoding = next((enc for enc in ENCODINGS if enc in allowed and enc in asset.variants), None)
+    etag = asset.etags[encoding]
+    response_headers = {'ETag': etag, 'Cache-Control': asset.cache_control, 'Vary': 'Accept-Encoding'}
+
+    if_none_match = headers.get('if-none-match')
+    if if_none_match:
+        tags = [t.strip() for t in if_none_match.split(',')]
+        if '*' in tags or etag in tags or f'W/{etag}' in tags:
+            return Response(status_code=304, headers=response_headers)
+
+    if encoding is None:
+        return Response(asset.content, media_type=asset.media_type, headers=response_headers)
+    response_headers['Content-Encoding'] = encoding
+    return Response(asset.variants[encoding], media_type=asset.media_type, headers=response_headers)
@@ -0,0 +1,176 @@
+"""Server-side audio analytics for the Flow dashboard.
+
+Each audio chunk is reduced once, in the ingest thread, to:
+
+* min/max waveform envelope columns (int8, `samples_per_column` samples each)
+* RMS level of the chunk
+* spectrogram frames from a Hann-windowed STFT (uint8 dB, log-spaced bands),
+  with the window overlap carried between chunks
+
+Results go into fixed-size rings with running totals, so each client only
+needs a pair of cursors to pull whatever is new at its own display rate. The
+rings and totals live in one structured array that can be moved into a shared
+buffer (`share()`), so web worker processes can read what the ingest process
+computes.
+
+Binary messages are a 16-byte little-endian header followed by the data:
+
+    uint32  env_start     index of the first envelope column in this message
+    uint32  frame_start   index of the first spectrogram frame in this message
+    uint16  n_env, n_frames
+    float32 rms           latest chunk RMS, 0..1
+
+    envelope     n_env * 2 int8 (min, max)
+    spectrogram  n_frames * bands uint8
+"""
+
+import struct
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+import numpy as np
+
+HEADER = struct.Struct('<IIHHf')
+
+_DB_FLOOR = -90.0
+
+
+class AudioAnalyzer:
+    """Rolling envelope, RMS and spectrogram for one audio writer."""
+
+    def __init__(self, sample_rate: int, samples_per_column: int = 32, columns: int = 1024,
+                 n_fft: int = 1024, hop: int = 512, bands: int = 64, frames: int = 256):
+        self.sample_rate = sample_rate
+        self.samples_per_column = samples_per_column
+        self.n_fft = n_fft
+        self.hop = hop
+        self.window = np.hanning(n_fft).astype(np.float32)
+        # Full-scale sine through the window peaks at 32768 * sum(window) / 2
+        self._ref = 32768.0 * self.window.sum() / 2
+        edges = np.geomspace(1, n_fft // 2 + 1, bands + 1)[:-1]
+        self._band_starts = np.unique(np.round(edges).astype(np.int64))
+        self.bands = len(self._band_starts)
+
+        self._lock = threading.Lock()
+        self._bind(np.zeros((), dtype=np.dtype([
+            ('env_count', '<u8'),
+            ('frame_count', '<u8'),
+            ('rms', '<f4'),
+            ('env', 'i1', (columns, 2)),
+            ('spec', 'u1', (frames, self.bands)),
+        ])))
+        self._pending = np.zeros(0, dtype=np.float32)
+        self._overlap = np.zeros(0, dtype=np.float32)
+
+    def _bind(self, state: np.ndarray):
+        self._state = state
+        self._env = state['env']
+        self._spec = state['spec']
+
+    @property
+    def nbytes(self) -> int:
+        return self._state.nbytes
+
+    def share(self, buffer, init: bool = True):
+        """Move the rings into `buffer` (e.g. shared memory), copying them if `init`."""
+        state = np.ndarray((), dtype=self._state.dtype, buffer=buffer)
+        if init:
+            state[()] = self._state
+        self._bind(state)
+
+    @property
+    def env_count(self) -> int:
+        return int(self._state['env_count'])
+
+    @property
+    def frame_count(self) -> int:
+        return int(self._state['frame_count'])
+
+    @property
+    def rms(self) -> float:
+        return float(self._state['rms'])
+
+    @property
+    def header(self) -> Dict[str, Any]:
+        return {
+            'type': 'header',
+            'sample_rate': self.sample_rate,
+            'samples_per_column': self.samples_per_column,
+            'columns': len(self._env),
+            'hop': self.hop,
+            'n_fft': self.n_fft,
+            'bands': self.bands,
+            'frames': len(self._spec),
+        }
+
+    @staticmethod
+    def _write(ring: np.ndarray, count: int, rows: np.ndarray):
+        if len(rows) > len(ring):
+            count += len(rows) - len(ring)
+            rows = rows[-len(ring):]
+        idx = (count + np.arange(len(rows))) % len(ring)
+        ring[idx] = rows
+
+    def feed(self, audio: np.ndarray):
+        """Analyze one chunk of int16 samples (first channel only)."""
+        x = np.asarray(audio).reshape(len(audio), -1)[:, 0].astype(np.float32)
+        if not len(x):
+            return
+
+        spc = self.samples_per_column
+        pending = np.concatenate([self._pending, x])
+        ncols = len(pending) // spc
+        cols = None
+        if ncols:
+            blocks = pending[:ncols * spc].reshape(ncols, spc)
+            cols = np.stack([blocks.min(axis=1), blocks.max(axis=1)], axis=1)
+            cols = np.clip(np.round(cols / 256), -128, 127).astype(np.int8)
+        self._pending = pending[ncols * spc:]
+
+        buf = np.concatenate([self._overlap, x])
+        nframes = (len(buf) - self.n_fft) // self.hop + 1 if len(buf) >= self.n_fft else 0
+        spec = None
+        if nframes:
+            windows = np.lib.stride_tricks.sliding_window_view(buf, self.n_fft)[::self.hop][:nframes]
+            mag = np.abs(np.fft.rfft(windows * self.window, axis=1))
+            banded = np.maximum.reduceat(mag, self._band_starts, axis=1)
+            db = 20 * np.log10(banded / self._ref + 1e-12)
+            spec = np.clip((db - _DB_FLOOR) / -_DB_FLOOR * 255, 0, 255).astype(np.uint8)
+        self._overlap = buf[nframes * self.hop:]
+
+        rms = float(np.sqrt(np.mean(x * x))) / 32768.0
+        state = self._state
+        with self._lock:
+            if cols is not None:
+                self._write(self._env, self.env_count, cols)
+                state['env_count'] += ncols
+            if spec is not None:
+                self._write(self._spec, self.frame_count, spec)
+                state['frame_count'] += nframes
+            state['rms'] = rms
+
+    def since(self, env_cursor: Optional[int], frame_cursor: Optional[int]) -> Tuple[Optional[bytes], int, int]:
+        """Encode everything newer than the cursors; None cursors mean "whatever is still in the rings".
+
+        Returns (message or None if nothing is new, new env cursor, new frame cursor).
+        """
+        with self._lock:
+            env_end, frame_end = self.env_count, self.frame_count
+            env_start = max(env_cursor if env_cursor is not None else 0, env_end - len(self._env))
+            frame_start = max(frame_cursor if frame_cursor is not None else 0, frame_end - len(self._spec))
+            if env_start >= env_end and frame_start >= frame_end:
+                return None, env_end, frame_end
+            env = self._env[np.arange(env_start, env_end) % len(self._env)]
+            spec = self._spec[np.arange(frame_start, frame_end) % len(self._spec)]
+            rms = self.rms
+            # A writer in another process does not take our lock: drop any
+            # rows it overwrote while they were being copied
+            env_lost = self.env_count - len(self._env) - env_start
+            frame_lost = self.frame_count - len(self._spec) - frame_start
+        if env_lost > 0:
+            env, env_start = env[env_lost:], env_start + env_lost
+        if frame_lost > 0:
+            spec, frame_start = spec[frame_lost:], frame_start + frame_lost
+        header = HEADER.pack(env_start & 0xFFFFFFFF, frame_start & 0xFFFFFFFF, len(env), len(spec), rms)
+        message = header + env.tobytes() + spec.tobytes()
+        return message, env_end, frame_end
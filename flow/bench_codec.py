@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# /// script
+# dependencies = [
+#   "numpy",
+# ]
+# ///
+"""Micro-benchmark: per-dtype compiled JSON encoders vs convert_numpy_to_json.
+
+Runs both on synthetic samples shaped like camera.points, speakerphone.mic and
+drive.state and prints microseconds per sample. Samples are published into a
+Hub and borrowed back, so the encoders see the same 0-d structured arrays as
+in the server.
+"""
+
+import time
+
+import numpy as np
+
+from codec import binary_encoder, convert_numpy_to_json, json_encoder
+from hub import Hub
+
+SAMPLES = {
+    'camera.points': np.dtype([
+        ('timestamp', 'M8[ns]'),
+        ('num_points', '<i4'),
+        ('points', '<f2', (100000, 3)),
+        ('colors', 'u1', (100000, 3)),
+    ]),
+    'speakerphone.mic': np.dtype([
+        ('timestamp', 'M8[ns]'),
+        ('audio', '<i2', (1600, 1)),
+    ]),
+    'drive.state': np.dtype([
+        ('timestamp', 'M8[ns]'),
+        ('vel', '<f4', (2,)),
+        ('pos', '<f4', (2,)),
+        ('voltage', '<f4'),
+    ]),
+}
+
+
+def make_sample(dtype: np.dtype) -> np.ndarray:
+    rng = np.random.default_rng(0)
+    sample = np.zeros((), dtype=dtype)
+    for name in dtype.names:
+        kind = dtype.fields[name][0].base.kind
+        if kind == 'M':
+            sample[name] = np.datetime64(time.time_ns(), 'ns')
+        elif kind == 'f':
+            sample[name] = rng.standard_normal(dtype.fields[name][0].shape)
+        elif kind in 'iu':
+            sample[name] = rng.integers(0, 100, dtype.fields[name][0].shape)
+    return sample
+
+
+def hub_sample(writer: str, dtype: np.dtype) -> np.ndarray:
+    """A sample as Hub.read/borrow hands it to the encoders: a 0-d array in a slab."""
+    hub = Hub([writer])
+    hub.publish(writer, make_sample(dtype))
+    return hub.borrow(writer).value
+
+
+def bench(fn, n: int) -> float:
+    fn()
+    t0 = time.perf_counter()
+    for _ in range(n):
+        fn()
+    return (time.perf_counter() - t0) / n * 1e6
+
+
+def main():
+    n = 2000
+    print(f"{'writer':<20}{'legacy us':>12}{'json us':>12}{'binary us':>12}{'speedup':>10}")
+    for writer, dtype in SAMPLES.items():
+        data = hub_sample(writer, dtype)
+        legacy = bench(lambda: convert_numpy_to_json(data), n)
+        compiled = bench(lambda: json_encoder(writer, dtype).encode(data), n)
+        binary = bench(lambda: binary_encoder(writer, dtype).encode(data), n)
+        print(f"{writer:<20}{legacy:>12.1f}{compiled:>12.1f}{binary:>12.1f}{legacy / compiled:>9.1f}x")
+
+
+if __name__ == "__main__":
+    main()
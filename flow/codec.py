@@ -0,0 +1,335 @@
+"""Wire encodings for Flow writer streams.
+
+Encoders are compiled once per (writer, dtype, projection) by `json_encoder`
+and `binary_encoder`: the field plan, skip list and per-field conversions are
+decided up front so encoding a sample is a straight run of precomputed steps.
+All clients asking for the same projection share one encoder, and through
+`encode_latest()` one encoding of each sample.
+
+A projection names the fields a client wants, each optionally with numpy
+basic indices (see `parse_fields`):
+
+    vel,pos[0],audio[:400:2],points[0:1000,2]
+
+Without one, streams send every field except those in `default_skip`.
+
+The binary protocol is self-describing: a JSON header derived from the
+writer's structured dtype is sent once as a text message, then every sample
+goes out as a binary message holding the raw little-endian field bytes at the
+offsets listed in the header. Offsets are aligned to each field's element
+size so the browser can view them directly as typed arrays.
+"""
+
+import re
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+# ((field, index items or None), ...); slices are kept as (start, stop, step) so it hashes
+Projection = Tuple[Tuple[str, Optional[Tuple[Union[int, Tuple], ...]]], ...]
+
+MAX_ENCODERS = 256  # compiled encoders kept before the cache is reset
+
+_FIELD = re.compile(r'^([A-Za-z_][A-Za-z0-9_]*)(?:\[([^\[\]]*)\])?$')
+
+# numpy kind/itemsize -> element type name understood by the frontend decoder
+_ELEMENT_TYPES = {
+    ('i', 1): 'int8', ('i', 2): 'int16', ('i', 4): 'int32', ('i', 8): 'int64',
+    ('u', 1): 'uint8', ('u', 2): 'uint16', ('u', 4): 'uint32', ('u', 8): 'uint64',
+    ('f', 2): 'float16', ('f', 4): 'float32', ('f', 8): 'float64',
+    ('b', 1): 'bool',
+}
+
+
+def _field_spec(name: str, ftype: np.dtype):
+    """Return (little-endian base dtype, header entry) for one field, or None if unsupported."""
+    base, shape = ftype.base, ftype.shape
+    entry: Dict[str, Any] = {'name': name, 'shape': list(shape)}
+    if base.kind == 'M':
+        entry['type'] = 'datetime64'
+        entry['unit'] = np.datetime_data(base)[0]
+    elif base.kind == 'S':
+        entry['type'] = 'string'
+        entry['size'] = base.itemsize
+    elif (base.kind, base.itemsize) in _ELEMENT_TYPES:
+        entry['type'] = _ELEMENT_TYPES[(base.kind, base.itemsize)]
+    else:
+        return None
+    return base.newbyteorder('<'), entry
+
+
+def default_skip(writer: str, dtype: np.dtype) -> List[str]:
+    """Fields left out of /ws/writer streams (sent through dedicated endpoints instead)."""
+    skip = []
+    # JPEG frames go out over the MJPEG stream
+    if writer == 'camera.jpeg':
+        skip.append('jpeg')
+    # Point cloud arrays go out over the binary point cloud websocket
+    if 'num_points' in dtype.names:
+        skip += ['points', 'colors']
+    return skip
+
+
+def _split(text: str) -> List[str]:
+    """Split on commas outside brackets."""
+    parts, depth, start = [], 0, 0
+    for i, c in enumerate(text):
+        if c == '[':
+            depth += 1
+        elif c == ']':
+            depth -= 1
+        elif c == ',' and depth == 0:
+            parts.append(text[start:i])
+            start = i + 1
+    parts.append(text[start:])
+    return [p.strip() for p in parts if p.strip()]
+
+
+def _index_item(text: str) -> Union[int, Tuple]:
+    bounds = [b.strip() for b in text.split(':')]
+    if len(bounds) == 1:
+        return int(bounds[0])
+    if len(bounds) > 3:
+        raise ValueError(f"Bad slice {text!r}")
+    return tuple(int(b) if b else None for b in bounds) + (None,) * (3 - len(bounds))
+
+
+def parse_fields(text: str) -> Projection:
+    """Parse a projection like "vel,pos[0],audio[:400:2]"; raises ValueError on bad syntax."""
+    projection = []
+    for part in _split(text):
+        match = _FIELD.match(part)
+        if match is None:
+            raise ValueError(f"Bad field {part!r}")
+        name, index = match.groups()
+        try:
+            items = tuple(_index_item(i) for i in index.split(',')) if index is not None else None
+        except ValueError:
+            raise ValueError(f"Bad index in {part!r}")
+        projection.append((name, items))
+    if not projection:
+        raise ValueError("No fields")
+    names = [name for name, _ in projection]
+    if len(set(names)) != len(names):
+        raise ValueError("Each field can be selected once")
+    return tuple(projection)
+
+
+def _plan(dtype: np.dtype, skip: Iterable[str],
+          fields: Optional[Projection]) -> List[Tuple[str, Optional[tuple], np.dtype]]:
+    """(name, numpy index or None, projected field dtype) for each field to encode.
+
+    Unknown fields raise KeyError, indices that don't fit the field ValueError.
+    """
+    if fields is None:
+        skip = set(skip)
+        return [(name, None, dtype.fields[name][0]) for name in dtype.names if name not in skip]
+    plan = []
+    for name, items in fields:
+        if name not in dtype.names:
+            raise KeyError(name)
+        ftype = dtype.fields[name][0]
+        if items is None:
+            plan.append((name, None, ftype))
+            continue
+        index = tuple(slice(*i) if isinstance(i, tuple) else i for i in items)
+        # Index a zero-stride stand-in to get the projected shape without allocating
+        base, shape = ftype.base, ftype.shape
+        probe = np.lib.stride_tricks.as_strided(np.zeros(1, dtype=base), shape, (0,) * len(shape))
+        try:
+            projected = probe[index].shape
+        except IndexError as e:
+            raise ValueError(f"{name}: {e}")
+        plan.append((name, index, np.dtype((base, projected)) if projected else base))
+    return plan
+
+
+class _Latest:
+    """Memo of the last encoded sample, so clients on the same encoder share it."""
+
+    def encode_latest(self, seq: int, data) -> Any:
+        """encode(), done once per hub sequence number for all callers."""
+        last = self._last
+        if last is not None and last[0] == seq:
+            return last[1]
+        payload = self.encode(data)
+        self._last = (seq, payload)
+        return payload
+
+
+def _json_converter(name: str, ftype: np.dtype) -> Callable[[Any], Any]:
+    """Pick the conversion for one field from its dtype."""
+    base, shape = ftype.base, ftype.shape
+    if shape:
+        if name == 'audio' and base == np.int16 and len(shape) == 2 and shape[1] == 1:
+            # Flatten mono audio from (samples, 1) to (samples,)
+            return lambda v: v.reshape(-1).tolist()
+        return lambda v: v.tolist()
+    if base.kind in 'iu':
+        return int
+    if base.kind == 'f':
+        return float
+    if base.kind == 'b':
+        return bool
+    if base.kind == 'M':
+        return str
+    if base.kind == 'S':
+        # Handle numpy bytes strings (like text from transcriber)
+        return lambda v: v.item().decode('utf-8', errors='replace').strip()
+    return lambda v: v.tolist()
+
+
+class JsonEncoder(_Latest):
+    """Converts a structured sample to a JSON-serializable dict."""
+
+    def __init__(self, writer: str, dtype: np.dtype, skip: Iterable[str] = (),
+                 fields: Optional[Projection] = None):
+        self.writer = writer
+        self.dtype = dtype
+        self.steps: List[Tuple[str, Optional[tuple], Callable[[Any], Any]]] = [
+            (name, index, _json_converter(name, ftype))
+            for name, index, ftype in _plan(dtype, skip, fields)
+        ]
+        self._last = None
+
+    def encode(self, data) -> Dict[str, Any]:
+        return {name: conv(data[name] if index is None else data[name][index])
+                for name, index, conv in self.steps}
+
+
+class BinaryEncoder(_Latest):
+    """Packs the selected fields of a structured sample into a fixed layout."""
+
+    def __init__(self, writer: str, dtype: np.dtype, skip: Iterable[str] = (),
+                 fields: Optional[Projection] = None):
+        names: List[str] = []
+        formats: List[Any] = []
+        offsets: List[int] = []
+        entries: List[Dict[str, Any]] = []
+        self._index: Dict[str, tuple] = {}
+        offset = 0
+        for name, index, ftype in _plan(dtype, skip, fields):
+            spec = _field_spec(name, ftype)
+            if spec is None:
+                continue
+            base, entry = spec
+            align = min(base.itemsize, 8)
+            offset = -(-offset // align) * align
+            size = base.itemsize * int(np.prod(entry['shape'], dtype=np.int64))
+            entry['offset'] = offset
+            names.append(name)
+            formats.append((base, tuple(entry['shape'])) if entry['shape'] else base)
+            offsets.append(offset)
+            entries.append(entry)
+            if index is not None:
+                self._index[name] = index
+            offset += size
+        itemsize = -(-offset // 8) * 8
+        self.writer = writer
+        self.dtype = dtype
+        self.names = names
+        self.packed = np.dtype({'names': names, 'formats': formats,
+                                'offsets': offsets, 'itemsize': max(itemsize, 8)})
+        self.header = {
+            'type': 'header',
+            'writer': writer,
+            'itemsize': self.packed.itemsize,
+            'fields': entries,
+        }
+        self._out = np.zeros((), dtype=self.packed)
+        self._last = None
+
+    def project(self, name: str, values: np.ndarray, rows: bool = False) -> np.ndarray:
+        """Apply the field's projection to its values (of one sample, or of many with `rows`)."""
+        index = self._index.get(name)
+        if index is None:
+            return values
+        return values[(slice(None),) + index] if rows else values[index]
+
+    def encode(self, data) -> bytes:
+        out = self._out
+        for name in self.names:
+            out[name] = self.project(name, data[name])
+        return out.tobytes()
+
+
+_encoders: Dict[Tuple[str, str, np.dtype, Optional[Projection]], Any] = {}
+
+
+def _encoder(cls, kind: str, writer: str, dtype: np.dtype, fields: Optional[Projection]):
+    key = (kind, writer, dtype, fields)
+    encoder = _encoders.get(key)
+    if encoder is None:
+        encoder = cls(writer, dtype, skip=default_skip(writer, dtype), fields=fields)
+        # Projections come from clients: bound the cache
+        if len(_encoders) >= MAX_ENCODERS:
+            _encoders.clear()
+        _encoders[key] = encoder
+    return encoder
+
+
+def json_encoder(writer: str, dtype: np.dtype, fields: Optional[Projection] = None) -> JsonEncoder:
+    """Cached JSON encoder for a writer's dtype and an optional projection."""
+    return _encoder(JsonEncoder, 'json', writer, dtype, fields)
+
+
+def binary_encoder(writer: str, dtype: np.dtype, fields: Optional[Projection] = None) -> BinaryEncoder:
+    """Cached binary encoder for a writer's dtype and an optional projection."""
+    return _encoder(BinaryEncoder, 'binary', writer, dtype, fields)
+
+
+def convert_numpy_to_json(data, skip_jpeg=False):
+    """Convert numpy structured array to JSON-serializable dict.
+
+    Generic per-message converter that inspects every field on every call.
+    Superseded by `json_encoder`; kept as the baseline for bench_codec.py.
+    """
+    json_data = {}
+    
+    if hasattr(data, 'dtype') and data.dtype.names:
+        # It's a structured array
+        for field_name in data.dtype.names:
+            value = data[field_name]
+            
+            # Skip JPEG data if requested (for MJPEG streaming)
+            if field_name == 'jpeg' and skip_jpeg:
+                continue
+            
+            # Skip large point cloud arrays to avoid JSON bloat
+            if field_name in ['points', 'colors'] and 'num_points' in data.dtype.names:
+                # Don't send the actual arrays for point clouds
+                continue
+            
+            if isinstance(value, np.ndarray):
+                # For audio data, convert to int16 list (flatten if 2D)
+                if field_name == 'audio' and value.dtype == np.int16:
+                    if value.ndim == 2 and value.shape[1] == 1:
+                        # Flatten mono audio from (samples, 1) to (samples,)
+                        json_data[field_name] = value.flatten().tolist()
+                    else:
+                        json_data[field_name] = value.tolist()
+                # For other arrays, convert based on type
+                elif value.dtype in [np.float16, np.float32, np.float64]:
+                    json_data[field_name] = value.tolist()
+                elif value.dtype in [np.uint8, np.uint16, np.uint32]:
+                    json_data[field_name] = value.tolist()
+                else:
+                    json_data[field_name] = value.tolist()
+            elif isinstance(value, (np.int32, np.int64, np.uint32, np.uint64)):
+                json_data[field_name] = int(value)
+            elif isinstance(value, (np.float32, np.float64)):
+                json_data[field_name] = float(value)
+            elif isinstance(value, np.datetime64):
+                json_data[field_name] = str(value)
+            elif isinstance(value, bytes):
+                json_data[field_name] = value.decode('utf-8', errors='replace')
+            elif isinstance(value, np.bytes_):
+                # Handle numpy bytes strings (like text from transcriber)
+                json_data[field_name] = value.decode('utf-8', errors='replace').strip()
+            else:
+                json_data[field_name] = value
+    else:
+        # If it's already a dict, use it directly
+        json_data = data if isinstance(data, dict) else {'data': data}
+    
+    return json_data
@@ -0,0 +1,104 @@
+"""Discovery of active bbos writers.
+
+Writers listen on abstract unix sockets named `<writer>[__...].bbos` and reply
+to a connection with a JSON metadata packet. Sockets are found by parsing
+/proc/net/unix directly, new ones are probed in parallel, and metadata is
+cached per socket inode so unchanged writers are never probed twice.
+"""
+
+import json
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+PROC_NET_UNIX = '/proc/net/unix'
+PROBE_TIMEOUT_S = 0.1
+CACHE_TTL_S = 1.0
+MAX_PROBES = 16
+
+_LISTEN = '01'
+
+
+def listening_sockets(path: str = PROC_NET_UNIX) -> Dict[str, int]:
+    """Map abstract `.bbos` socket names in LISTEN state to their inode."""
+    sockets = {}
+    with open(path, 'r') as f:
+        next(f, None)  # header
+        for line in f:
+            # Num RefCount Protocol Flags Type St Inode [Path]
+            cols = line.split(None, 7)
+            if len(cols) < 8 or cols[5] != _LISTEN:
+                continue
+            name = cols[7].rstrip('\n')
+            if name.startswith('@') and name.endswith('.bbos'):
+                sockets[name[1:]] = int(cols[6])
+    return sockets
+
+
+def probe(sock: str, timeout: float = PROBE_TIMEOUT_S) -> Optional[bytes]:
+    """Connect to a writer socket and read its whole metadata packet."""
+    s = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
+    s.settimeout(timeout)
+    try:
+        s.connect(f'\0{sock}')
+        # MSG_TRUNC reports the full packet length so large replies aren't cut off
+        size = s.recv_into(bytearray(1), 1, socket.MSG_PEEK | socket.MSG_TRUNC)
+        return s.recv(max(size, 1))
+    except OSError:
+        return None
+    finally:
+        s.close()
+
+
+def writer_name(sock: str) -> str:
+    return sock.split("__")[0].replace(".bbos", "")
+
+
+def parse_metadata(name: str, data: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        info = json.loads(data)
+    except ValueError:
+        return None
+    if not isinstance(info, dict):
+        return None
+    return {
+        'name': name,
+        'caller': info.get('caller', 'Unknown'),
+        'owner': info.get('owner', 'Unknown'),
+        'period': info.get('period', 0),
+        'dtype': info.get('dtype', [])
+    }
+
+
+class WriterDiscovery:
+    """Cached view of active writers and their metadata."""
+
+    def __init__(self, ttl: float = CACHE_TTL_S):
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=MAX_PROBES, thread_name_prefix='flow-probe')
+        self._by_socket: Dict[str, Tuple[int, Dict[str, Any]]] = {}
+        self._writers: Dict[str, Any] = {}
+        self._refreshed = 0.0
+
+    def writers(self) -> Dict[str, Any]:
+        """Metadata for all active writers, refreshed at most once per TTL."""
+        with self._lock:
+            if time.monotonic() - self._refreshed >= self.ttl:
+                self._refresh()
+            return self._writers
+
+    def _refresh(self):
+        sockets = {s: inode for s, inode in listening_sockets().items() if 'timelog' not in s}
+        cached = {s: self._by_socket[s] for s in sockets
+                  if s in self._by_socket and self._by_socket[s][0] == sockets[s]}
+        stale: List[str] = [s for s in sockets if s not in cached]
+        for sock, data in zip(stale, self._pool.map(probe, stale)):
+            info = parse_metadata(writer_name(sock), data) if data else None
+            if info is not None:
+                cached[sock] = (sockets[sock], info)
+        self._by_socket = cached
+        self._writers = {info['name']: info for _, info in cached.values()}
+        self._refreshed = time.monotonic()
@@ -0,0 +1,272 @@
+"""Load-shedding governor for Flow streams.
+
+A daemon thread checks three pressure signals every `interval` seconds:
+
+* load: 1-minute load average per CPU
+* temperature: hottest zone under /sys/class/thermal, in degrees C
+* backlog: the share of samples that arrived while a client was still sending
+  an older one, since the last check (telemetry's send lag). Samples a stream
+  skips because it is paced are not counted, so shedding cannot feed itself.
+
+If any signal is above its high threshold the governor goes up one level;
+once every signal has stayed below its low threshold for `restore_s` it goes
+back down one level. Each level sheds one more step, taken from the lowest
+priority stream class that still has steps left, so with the default priority
+point clouds are cut to their floor before the camera is touched and
+transcripts never are:
+
+    level 0: everything at full rate
+    level 1: points x0.5        level 4: points x0.1, camera x0.5
+    level 2: points x0.25       ...
+    level 3: points x0.1
+
+A step scales the stream's rate cap and, for point clouds, the point budget.
+Decisions are kept for /api/stats. The level, inputs and decisions live in
+one structured array; with several server processes it is moved into shared
+memory (`share()`) and only the ingest process runs the thread.
+"""
+
+import glob
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+# Stream classes, most important first
+DEFAULT_PRIORITY = ('transcript', 'writer', 'audio', 'camera', 'points')
+
+# Scale applied at each shedding step of a class
+DEFAULT_STEPS = {
+    'transcript': (),
+    'writer': (0.5,),
+    'audio': (0.5,),
+    'camera': (0.5, 0.25),
+    'points': (0.5, 0.25, 0.1),
+}
+
+# (high, low) thresholds
+LOAD_PER_CPU = (0.9, 0.6)
+TEMPERATURE_C = (75.0, 65.0)
+BACKLOG = (0.3, 0.1)
+
+MIN_POINT_BUDGET = 1000
+
+INPUTS = ('load', 'temperature', 'backlog')
+DECISIONS_KEPT = 50
+
+DECISION_DTYPE = np.dtype([
+    ('time', '<f8'),
+    ('inputs', '<f8', (len(INPUTS),)),  # NaN: signal not available
+    ('level', '<i4'),
+    ('reason', 'S48'),
+], align=True)
+
+STATE_DTYPE = np.dtype([
+    ('count', '<u8'),  # decisions made
+    ('inputs', '<f8', (len(INPUTS),)),
+    ('level', '<i4'),
+    ('decisions', DECISION_DTYPE, (DECISIONS_KEPT,)),
+], align=True)
+
+
+def stream_class(writer: str, stream: str) -> str:
+    """Shedding class of a (writer, stream) pair as counted by telemetry."""
+    if writer == 'transcript':
+        return 'transcript'
+    if writer == 'camera.jpeg':
+        return 'camera'
+    if writer == 'camera.points' or stream == 'points':
+        return 'points'
+    if stream == 'audio':
+        return 'audio'
+    return 'writer'
+
+
+def load_per_cpu() -> float:
+    return os.getloadavg()[0] / (os.cpu_count() or 1)
+
+
+def read_temperature() -> Optional[float]:
+    """Hottest thermal zone in degrees C, or None if there are none."""
+    hottest = None
+    for path in glob.glob('/sys/class/thermal/thermal_zone*/temp'):
+        try:
+            with open(path) as f:
+                value = int(f.read().strip()) / 1000.0
+        except (OSError, ValueError):
+            continue
+        if hottest is None or value > hottest:
+            hottest = value
+    return hottest
+
+
+class Governor:
+    """Steps stream rates and point budgets down under pressure and back up after it."""
+
+    def __init__(self, backlog: Callable[[], Tuple[int, int]],
+                 priority: Iterable[str] = DEFAULT_PRIORITY,
+                 steps: Dict[str, Tuple[float, ...]] = DEFAULT_STEPS,
+                 interval: float = 2.0, restore_s: float = 10.0,
+                 temperature: Callable[[], Optional[float]] = read_temperature,
+                 load: Callable[[], float] = load_per_cpu):
+        """`backlog` returns running totals (samples sent, samples passed over while sending)."""
+        self.backlog = backlog
+        self.priority = [c for c in priority if c in steps]
+        self.steps = steps
+        self.interval = interval
+        self.restore_s = restore_s
+        self.temperature = temperature
+        self.load = load
+        self.max_level = sum(len(steps[c]) for c in self.priority)
+        self._state = np.zeros((), dtype=STATE_DTYPE)
+        self._state['inputs'] = np.nan
+        self._scales_at = (0, self._scales(0))
+        self._calm_since: Optional[float] = None
+        self._last_backlog = (0, 0)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._last_backlog = self.backlog()
+            self._thread = threading.Thread(target=self._run, name='flow-governor', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    @property
+    def nbytes(self) -> int:
+        return self._state.nbytes
+
+    def share(self, buffer, init: bool = True):
+        """Move the state into `buffer` (e.g. shared memory), copying it if `init`."""
+        state = np.ndarray((), dtype=STATE_DTYPE, buffer=buffer)
+        if init:
+            state[()] = self._state
+        self._state = state
+
+    @property
+    def level(self) -> int:
+        return int(self._state['level'])
+
+    @level.setter
+    def level(self, level: int):
+        self._state['level'] = level
+
+    @property
+    def scales(self) -> Dict[str, float]:
+        level = self.level
+        if self._scales_at[0] != level:
+            self._scales_at = (level, self._scales(level))
+        return self._scales_at[1]
+
+    @staticmethod
+    def _inputs(values: np.ndarray) -> Dict[str, Optional[float]]:
+        return {k: None if np.isnan(v) else float(v) for k, v in zip(INPUTS, values)}
+
+    @property
+    def inputs(self) -> Dict[str, Optional[float]]:
+        return self._inputs(self._state['inputs'])
+
+    @property
+    def decisions(self) -> List[Dict[str, Any]]:
+        count = int(self._state['count'])
+        n = min(count, DECISIONS_KEPT)
+        decisions = []
+        for i in range(count - n, count):
+            d = self._state['decisions'][i % DECISIONS_KEPT]
+            level = int(d['level'])
+            decisions.append({'time': float(d['time']), 'level': level,
+                              'reason': d['reason'].decode(errors='replace'),
+                              'inputs': self._inputs(d['inputs']), 'scales': self._scales(level)})
+        return decisions
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.update()
+            except Exception as e:
+                print(f"Error updating load governor: {e}")
+
+    def _scales(self, level: int) -> Dict[str, float]:
+        scales = {c: 1.0 for c in self.priority}
+        for c in reversed(self.priority):
+            taken = min(level, len(self.steps[c]))
+            if taken:
+                scales[c] = self.steps[c][taken - 1]
+            level -= taken
+        return scales
+
+    def _measure(self) -> Dict[str, Any]:
+        sent, lagged = self.backlog()
+        d_sent, d_lagged = sent - self._last_backlog[0], lagged - self._last_backlog[1]
+        self._last_backlog = (sent, lagged)
+        return {
+            'load': round(self.load(), 3),
+            'temperature': self.temperature(),
+            'backlog': round(d_lagged / (d_sent + d_lagged), 3) if d_sent + d_lagged > 0 else 0.0,
+        }
+
+    def update(self, now: Optional[float] = None):
+        """Take one measurement and move at most one level."""
+        now = time.time() if now is None else now
+        inputs = self._measure()
+        self._state['inputs'] = [np.nan if inputs[k] is None else inputs[k] for k in INPUTS]
+        limits = {'load': LOAD_PER_CPU, 'temperature': TEMPERATURE_C, 'backlog': BACKLOG}
+        high = [k for k, (hi, _) in limits.items() if inputs[k] is not None and inputs[k] > hi]
+        calm = all(inputs[k] is None or inputs[k] < lo for k, (_, lo) in limits.items())
+
+        level, reason = self.level, None
+        if high:
+            self._calm_since = None
+            if level < self.max_level:
+                level, reason = level + 1, 'high ' + ', '.join(high)
+        elif calm:
+            self._calm_since = self._calm_since or now
+            if level > 0 and now - self._calm_since >= self.restore_s:
+                level, reason = level - 1, f'calm for {self.restore_s:g}s'
+                self._calm_since = now
+        else:
+            self._calm_since = None
+
+        if reason:
+            count = int(self._state['count'])
+            d = self._state['decisions'][count % DECISIONS_KEPT]
+            d['time'], d['inputs'], d['level'] = now, self._state['inputs'], level
+            d['reason'] = reason.encode()[:DECISION_DTYPE['reason'].itemsize]
+            self._state['count'] = count + 1
+            self.level = level
+            print(f"Flow governor: level {level} ({reason}), scales {self.scales}")
+
+    def scale(self, writer: str, stream: str) -> float:
+        return self.scales.get(stream_class(writer, stream), 1.0)
+
+    def rate(self, writer: str, stream: str, cap: Optional[float]) -> Optional[float]:
+        """Rate cap for a capped stream at the current level (None: unlimited)."""
+        scale = self.scale(writer, stream)
+        if scale >= 1.0 or not cap:
+            return cap
+        return cap * scale
+
+    def limit(self, writer: str, stream: str, full_rate: float) -> Optional[float]:
+        """Rate for an otherwise unpaced stream: None until it is shed, then a fraction of `full_rate`."""
+        scale = self.scale(writer, stream)
+        return None if scale >= 1.0 else full_rate * scale
+
+    def budget(self, budget: int) -> int:
+        """Point budget for a point cloud client at the current level."""
+        scale = self.scales.get('points', 1.0)
+        return budget if scale >= 1.0 else max(int(budget * scale), min(budget, MIN_POINT_BUDGET))
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {
+            'level': self.level,
+            'max_level': self.max_level,
+            'priority': self.priority,
+            'scales': self.scales,
+            'inputs': self.inputs,
+            'decisions': self.decisions,
+        }
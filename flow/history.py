@@ -0,0 +1,142 @@
+"""Fixed-memory history of raw samples per writer.
+
+Each writer gets a preallocated numpy ring of its structured dtype, sized
+from a history length in seconds and the writer's period (bounded by a byte
+budget), plus a parallel ring of sample times. Appending copies the sample
+into the next row, so keeping history costs no allocation per sample. The
+rings and counter may live in shared memory (see shm.py).
+
+`HistoryRing.window()` packs a time window of selected fields into a single
+binary message:
+
+    uint32  header length N
+    N bytes JSON header, space-padded so the records start 8-byte aligned:
+            {"type": "history", "writer", "count", "itemsize", "fields",
+             "times_offset"}
+    count * itemsize bytes of records, laid out like the binary writer
+            stream (see codec.py)
+    count float64 sample times (epoch seconds) at times_offset
+"""
+
+import json
+import struct
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+import numpy as np
+
+from codec import BinaryEncoder, Projection, default_skip
+from telemetry import sample_time
+
+DEFAULT_PERIOD_S = 0.05
+LENGTH = struct.Struct('<I')
+
+
+class HistoryRing:
+    """Ring of the last `capacity` samples of one writer.
+
+    `samples`, `times` and the one-element `counter` default to private
+    arrays; pass views of a shared buffer to share the ring between processes.
+    """
+
+    def __init__(self, writer: str, dtype: np.dtype, capacity: int,
+                 samples: Optional[np.ndarray] = None, times: Optional[np.ndarray] = None,
+                 counter: Optional[np.ndarray] = None):
+        self.writer = writer
+        self.dtype = dtype
+        self.samples = samples if samples is not None else np.zeros(capacity, dtype=dtype)
+        self.times = times if times is not None else np.zeros(capacity, dtype=np.float64)
+        self._counter = counter if counter is not None else np.zeros(1, dtype=np.uint64)
+        self._lock = threading.Lock()
+
+    @property
+    def capacity(self) -> int:
+        return len(self.samples)
+
+    @property
+    def count(self) -> int:
+        return int(self._counter[0])
+
+    def append(self, data: Any, t: float):
+        with self._lock:
+            i = self.count % len(self.samples)
+            self.samples[i] = data
+            self.times[i] = t
+            self._counter[0] += 1
+
+    def window(self, since: Optional[float] = None, fields: Optional[Projection] = None) -> bytes:
+        """Encode samples newer than `since` (epoch seconds), oldest first.
+
+        `fields` is a projection (see codec.parse_fields) and defaults to what
+        the binary writer stream sends; unknown names raise KeyError and bad
+        indices ValueError.
+        """
+        encoder = BinaryEncoder(self.writer, self.dtype, skip=default_skip(self.writer, self.dtype),
+                                fields=fields)
+
+        with self._lock:
+            count = self.count
+            n = min(count, len(self.samples))
+            index = np.arange(count - n, count)
+            order = index % len(self.samples)
+            times = self.times[order]
+            records = np.zeros(len(order), dtype=encoder.packed)
+            for name in encoder.names:
+                records[name] = encoder.project(name, self.samples[name][order], rows=True)
+            # An appender in another process does not take our lock: drop
+            # rows it overwrote while they were being copied
+            keep = index >= self.count - len(self.samples)
+        if since is not None:
+            keep &= times >= since
+        records, times = records[keep], times[keep]
+
+        header = {
+            **encoder.header,
+            'type': 'history',
+            'count': len(records),
+            'times_offset': records.nbytes,
+        }
+        text = json.dumps(header).encode()
+        text += b' ' * (-(LENGTH.size + len(text)) % 8)
+        return LENGTH.pack(len(text)) + text + records.tobytes() + times.tobytes()
+
+
+class HistoryStore:
+    """History rings for a set of writers, created on each writer's first sample."""
+
+    def __init__(self, seconds: Dict[str, float], default_s: float = 0.0,
+                 max_bytes: int = 8 << 20,
+                 allocate: Callable[[str, np.dtype, int], HistoryRing] = HistoryRing):
+        self.seconds = seconds
+        self.default_s = default_s
+        self.max_bytes = max_bytes
+        self.allocate = allocate
+        self.periods: Dict[str, float] = {}  # writer -> period in seconds
+        self._rings: Dict[str, Optional[HistoryRing]] = {}
+
+    def _create(self, writer: str, dtype: np.dtype) -> Optional[HistoryRing]:
+        seconds = self.seconds.get(writer, self.default_s)
+        if seconds <= 0:
+            return None
+        period = self.periods.get(writer) or DEFAULT_PERIOD_S
+        capacity = int(np.ceil(seconds / period))
+        capacity = max(1, min(capacity, self.max_bytes // max(dtype.itemsize, 1)))
+        return self.allocate(writer, dtype, capacity)
+
+    def append(self, writer: str, data: Any):
+        """Copy a sample into the writer's ring (called from the ingest thread)."""
+        ring = self._rings.get(writer)
+        if writer not in self._rings or (ring is not None and ring.dtype != data.dtype):
+            ring = self._rings[writer] = self._create(writer, data.dtype)
+        if ring is not None:
+            ring.append(data, sample_time(data) or time.time())
+
+    def get(self, writer: str) -> Optional[HistoryRing]:
+        return self._rings.get(writer)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            writer: {'capacity': ring.capacity, 'count': ring.count, 'bytes': ring.samples.nbytes}
+            for writer, ring in list(self._rings.items()) if ring is not None
+        }
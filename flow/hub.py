@@ -0,0 +1,352 @@
+"""Broadcast hub fanning reader samples out to every Flow client.
+
+Each writer has a single latest-value slot with a sequence number. Every
+client holds its own cursor into that slot, so all clients see the newest
+sample exactly once and a slow client simply skips ahead instead of taking
+frames away from the others.
+
+Slots own their data: each writer has a small pool of preallocated sample
+slabs. The ingest thread copies every sample once into a free slab and makes
+it the latest; readers borrow the latest slab by reference count, so a Reader
+reusing its shared memory can never change a sample underneath a client, and
+a client may hold a sample across awaits (e.g. while it is sent) without
+copying it. The pool grows on demand up to `max_slabs`; when every slab is
+borrowed the new sample is dropped and counted. After warm-up, publishing
+allocates nothing.
+
+Subscriptions are reference counted per writer. The first subscriber (or a
+pin) reports demand for the writer through `on_demand(writer, True)`; when
+the last one leaves, `on_demand(writer, False)` follows after a grace period
+unless someone subscribes again in the meantime.
+"""
+
+import asyncio
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional, Set
+
+import numpy as np
+
+
+class Snapshot(NamedTuple):
+    """A consistent read of a slot."""
+    seq: int
+    recv_time: float
+    value: Any
+
+
+class _Slab:
+    """One preallocated sample buffer of a writer's pool."""
+
+    __slots__ = ('array', 'refs', 'seq', 'recv_time')
+
+    def __init__(self, dtype: np.dtype):
+        self.array = np.zeros((), dtype=dtype)
+        self.refs = 0
+        self.seq = 0
+        self.recv_time = 0.0
+
+
+class Lease:
+    """A borrowed sample; `value` stays valid and unchanged until `release()`."""
+
+    __slots__ = ('seq', 'recv_time', 'value', '_slab', '_lock')
+
+    def __init__(self, seq: int, recv_time: float, value: Any,
+                 slab: Optional[_Slab] = None, lock: Optional[threading.Lock] = None):
+        self.seq = seq
+        self.recv_time = recv_time
+        self.value = value
+        self._slab = slab
+        self._lock = lock
+
+    def release(self):
+        if self._slab is not None:
+            with self._lock:
+                self._slab.refs -= 1
+            self._slab = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.release()
+
+
+class _Slot:
+    """Latest sample for one writer, kept in a pool of reference counted slabs.
+
+    A slab is free when nobody borrows it and it is not the latest; `seq`
+    counts samples published. The lock only guards the bookkeeping, never a
+    copy.
+    """
+
+    __slots__ = ('slabs', 'latest', 'seq', 'min_slabs', 'max_slabs', 'dropped', 'lock',
+                 'waiters', 'refs', 'active', 'release_at', 'release')
+
+    def __init__(self, min_slabs: int = 3, max_slabs: int = 8):
+        self.slabs: List[_Slab] = []
+        self.latest: Optional[_Slab] = None
+        self.seq = 0
+        self.min_slabs = min_slabs
+        self.max_slabs = max_slabs
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.waiters: Set[asyncio.Event] = set()
+        self.refs = 0
+        self.active = False
+        self.release_at: Optional[float] = None
+        self.release: Optional[asyncio.TimerHandle] = None
+
+    def _free(self, dtype: np.dtype) -> Optional[_Slab]:
+        if self.slabs and self.slabs[0].array.dtype != dtype:
+            # Borrowed slabs of the old dtype stay valid until released
+            self.slabs = []
+        if not self.slabs:
+            self.slabs = [_Slab(dtype) for _ in range(self.min_slabs)]
+        for slab in self.slabs:
+            if slab.refs == 0 and slab is not self.latest:
+                return slab
+        if len(self.slabs) < self.max_slabs:
+            slab = _Slab(dtype)
+            self.slabs.append(slab)
+            return slab
+        return None
+
+    def write(self, data: Any) -> bool:
+        """Copy a sample into a free slab and make it the latest; False if the pool is exhausted."""
+        with self.lock:
+            slab = self._free(data.dtype)
+            if slab is None:
+                self.dropped += 1
+                return False
+            slab.refs += 1  # held by the writer while copying
+        slab.array[()] = data
+        with self.lock:
+            slab.refs -= 1
+            slab.seq = self.seq + 1
+            slab.recv_time = time.time()
+            self.latest = slab
+            self.seq += 1
+        return True
+
+    def borrow(self) -> Optional[Lease]:
+        with self.lock:
+            slab = self.latest
+            if slab is None:
+                return None
+            slab.refs += 1
+        return Lease(slab.seq, slab.recv_time, slab.array, slab, self.lock)
+
+    def read(self, fn: Callable[[Any], Any]) -> Optional[Snapshot]:
+        lease = self.borrow()
+        if lease is None:
+            return None
+        with lease:
+            return Snapshot(lease.seq, lease.recv_time, fn(lease.value))
+
+    def stats(self) -> Dict[str, Any]:
+        with self.lock:
+            return {
+                'slabs': len(self.slabs),
+                'borrowed': sum(1 for slab in self.slabs if slab.refs),
+                'bytes': sum(slab.array.nbytes for slab in self.slabs),
+                'dropped': self.dropped,
+            }
+
+
+def _identity(data):
+    return data
+
+
+class Subscription:
+    """A client's cursor into one writer's slot."""
+
+    def __init__(self, hub: 'Hub', writer: str):
+        self.hub = hub
+        self.writer = writer
+        self.seq = 0
+        self.recv_time = 0.0
+        self.skipped = 0
+        self._slot = hub._slots[writer]
+        self._event = asyncio.Event()
+        self._slot.waiters.add(self._event)
+        self._closed = False
+        hub.acquire(writer)
+
+    def borrow(self) -> Optional[Lease]:
+        """Borrow the newest sample if this client has not seen it yet.
+
+        The caller must release the lease; the slab stays out of the pool until then.
+        """
+        if self._slot.seq == self.seq:
+            return None
+        lease = self._slot.borrow()
+        if lease is None or lease.seq == self.seq:
+            if lease is not None:
+                lease.release()
+            return None
+        self._advance(lease.seq, lease.recv_time)
+        return lease
+
+    def _advance(self, seq: int, recv_time: float):
+        if self.seq:
+            self.skipped += seq - self.seq - 1
+        self.seq, self.recv_time = seq, recv_time
+
+    def _read(self, fn: Callable[[Any], Any]) -> Optional[Snapshot]:
+        """fn(newest sample) if this client has not seen it yet, run wherever the slot keeps it."""
+        if self._slot.seq == self.seq:
+            return None
+        snap = self._slot.read(fn)
+        if snap is None or snap.seq == self.seq:
+            return None
+        self._advance(snap.seq, snap.recv_time)
+        return snap
+
+    def poll(self, fn: Callable[[Any], Any] = _identity) -> Optional[Any]:
+        """Return fn(newest sample) if this client has not seen it yet.
+
+        `fn` must not keep a reference to the sample it is given; use
+        borrow() to hold on to a sample.
+        """
+        snap = self._read(fn)
+        return None if snap is None else snap.value
+
+    async def _wait(self, take: Callable[[], Any], timeout: Optional[float]) -> Any:
+        while True:
+            self._event.clear()
+            result = take()
+            if result is not None:
+                return result
+            try:
+                await asyncio.wait_for(self._event.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+
+    async def next_lease(self, timeout: Optional[float] = None) -> Optional[Lease]:
+        """Wait for a sample newer than the last one and borrow it.
+
+        Returns None if `timeout` seconds pass without a new sample.
+        """
+        return await self._wait(self.borrow, timeout)
+
+    async def next(self, fn: Callable[[Any], Any] = _identity,
+                   timeout: Optional[float] = None) -> Optional[Any]:
+        """Wait for a sample newer than the last one and return fn(sample).
+
+        `fn` runs against the sample in place (in a worker, inside the
+        shared slot's seqlock read), so the same rule as poll() applies.
+        Returns None if `timeout` seconds pass without a new sample.
+        """
+        snap = await self._wait(lambda: self._read(fn), timeout)
+        return None if snap is None else snap.value
+
+    def close(self):
+        if not self._closed:
+            self._closed = True
+            self._slot.waiters.discard(self._event)
+            self.hub.release(self.writer)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class Hub:
+    """Per-writer latest-value slots shared by all clients."""
+
+    def __init__(self, writers: Iterable[str], grace: float = 10.0,
+                 on_demand: Optional[Callable[[str, bool], None]] = None,
+                 min_slabs: int = 3, max_slabs: int = 8):
+        self._slots: Dict[str, _Slot] = {w: _Slot(min_slabs, max_slabs) for w in writers}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.grace = grace
+        self.on_demand = on_demand
+
+    def __contains__(self, writer: str) -> bool:
+        return writer in self._slots
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        """Attach the event loop that subscribers wait on."""
+        self._loop = loop
+
+    def publish(self, writer: str, data: Any):
+        """Copy in a new sample and wake subscribers (called from the ingest thread)."""
+        slot = self._slots[writer]
+        if slot.write(data) and self._loop is not None and slot.waiters:
+            self._loop.call_soon_threadsafe(self._notify, slot)
+
+    @staticmethod
+    def _notify(slot: _Slot):
+        for event in slot.waiters:
+            event.set()
+
+    def read(self, writer: str, fn: Callable[[Any], Any]) -> Optional[Snapshot]:
+        """Apply fn to the newest sample without consuming it (None before the first sample).
+
+        Safe from any thread; the sample is borrowed while `fn` runs.
+        """
+        return self._slots[writer].read(fn)
+
+    def borrow(self, writer: str) -> Optional[Lease]:
+        """Borrow the newest sample (None before the first one); release the lease when done."""
+        return self._slots[writer].borrow()
+
+    def pools(self) -> Dict[str, Dict[str, Any]]:
+        """Slab pool size, borrowed slabs and drops of every writer that has published."""
+        return {writer: slot.stats() for writer, slot in self._slots.items() if slot.seq}
+
+    def subscribe(self, writer: str) -> Subscription:
+        return Subscription(self, writer)
+
+    def acquire(self, writer: str):
+        """Add a reference to a writer, reporting demand if it was idle."""
+        slot = self._slots[writer]
+        slot.refs += 1
+        if slot.release is not None:
+            slot.release.cancel()
+            slot.release = slot.release_at = None
+        if not slot.active:
+            slot.active = True
+            if self.on_demand is not None:
+                self.on_demand(writer, True)
+
+    def release(self, writer: str):
+        """Drop a reference; the writer goes idle `grace` seconds after the last one."""
+        slot = self._slots[writer]
+        slot.refs -= 1
+        if slot.refs > 0 or not slot.active:
+            return
+        if self._loop is None or self.grace <= 0:
+            self._idle(writer)
+            return
+        slot.release_at = time.time() + self.grace
+        slot.release = self._loop.call_later(self.grace, self._idle, writer)
+
+    def _idle(self, writer: str):
+        slot = self._slots[writer]
+        slot.release = slot.release_at = None
+        if slot.refs == 0 and slot.active:
+            slot.active = False
+            if self.on_demand is not None:
+                self.on_demand(writer, False)
+
+    def pin(self, writer: str):
+        """Keep a writer in demand regardless of subscribers."""
+        self.acquire(writer)
+
+    def demand(self) -> Dict[str, Dict[str, Any]]:
+        """Reference count and state of every writer."""
+        now = time.time()
+        return {
+            writer: {
+                'refs': slot.refs,
+                'active': slot.active,
+                'release_in': max(slot.release_at - now, 0.0) if slot.release_at else None,
+                'seq': slot.seq,
+            }
+            for writer, slot in self._slots.items()
+        }
@@ -0,0 +1,240 @@
+"""Reader ingestion engine for the Flow dashboard.
+
+Drains a set of bbos Readers without spinning. Readers that expose a file
+descriptor are waited on with a selector, so the thread sleeps in the kernel
+until a writer publishes. Everything else is polled on an adaptive schedule
+derived from the writer's advertised period.
+
+Readers can also be opened and closed while running: `open()` and `close()`
+queue a command and wake the loop, and the ingest thread itself creates,
+enters and exits the reader, so readers are only ever touched from one thread.
+"""
+
+import collections
+import os
+import selectors
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Set, Tuple
+
+MIN_BACKOFF_S = 0.0005   # never poll a reader more often than this
+MAX_BACKOFF_S = 0.05     # quiet readers are checked at least this often
+IDLE_WAIT_S = 0.5        # upper bound on a single wait
+DEFAULT_PERIOD_MS = 50   # used when a writer does not advertise its period
+
+
+class _Source:
+    """Scheduling state for one reader."""
+
+    def __init__(self, name: str, reader: Any, period_ms: float):
+        self.name = name
+        self.reader = reader
+        self.period = max((period_ms or DEFAULT_PERIOD_MS) / 1000.0, MIN_BACKOFF_S)
+        self.fd: Optional[int] = None
+        self.interval = MIN_BACKOFF_S
+        self.next_due = 0.0
+        self.samples = 0
+        self.misses = 0
+        self.errors = 0  # samples whose on_sample callback raised
+
+    def hit(self, now: float):
+        # The next sample is about one period away; look a little early and
+        # then tighten the interval so latency stays around period/8.
+        self.samples += 1
+        self.interval = max(self.period / 8, MIN_BACKOFF_S)
+        self.next_due = now + self.period * 0.75
+
+    def miss(self, now: float):
+        self.misses += 1
+        self.next_due = now + self.interval
+        self.interval = min(self.interval * 2, max(min(self.period, MAX_BACKOFF_S), MIN_BACKOFF_S))
+
+
+def _reader_fd(reader: Any) -> Optional[int]:
+    """Return a pollable file descriptor for the reader, if it has one."""
+    fileno = getattr(reader, 'fileno', None)
+    if not callable(fileno):
+        return None
+    try:
+        fd = fileno()
+    except (OSError, ValueError, NotImplementedError):
+        return None
+    return fd if isinstance(fd, int) and fd >= 0 else None
+
+
+class IngestEngine:
+    """Event-driven loop that hands every new reader sample to a callback."""
+
+    def __init__(self, readers: Dict[str, Any], on_sample: Callable[[str, Any], None],
+                 periods: Optional[Dict[str, float]] = None,
+                 open_reader: Optional[Callable[[str], Tuple[Any, float]]] = None):
+        periods = periods or {}
+        self.on_sample = on_sample
+        self.open_reader = open_reader
+        self._sources: Dict[str, _Source] = {}
+        self._owned: Set[str] = set()
+        self._commands = collections.deque()
+        self._selector = selectors.DefaultSelector()
+        self._wake_r, self._wake_w = os.pipe()
+        os.set_blocking(self._wake_r, False)
+        os.set_blocking(self._wake_w, False)
+        self._selector.register(self._wake_r, selectors.EVENT_READ, None)
+        self._stop = threading.Event()
+
+        self._started = time.monotonic()
+        self._busy_cpu = 0.0
+        self._idle = 0.0
+        self._wakeups = 0
+
+        for name, reader in readers.items():
+            self.add(name, reader, periods.get(name, 0))
+
+    def add(self, name: str, reader: Any, period_ms: float = 0):
+        """Start watching a reader."""
+        src = _Source(name, reader, period_ms)
+        src.fd = _reader_fd(reader)
+        if src.fd is not None:
+            try:
+                self._selector.register(src.fd, selectors.EVENT_READ, src)
+            except (ValueError, KeyError, OSError):
+                src.fd = None
+        self._sources[name] = src
+
+    def remove(self, name: str):
+        """Stop watching a reader, exiting it if this engine opened it."""
+        src = self._sources.pop(name, None)
+        if src is None:
+            return
+        self._demote(src)
+        if name in self._owned:
+            self._owned.discard(name)
+            try:
+                src.reader.__exit__(None, None, None)
+            except Exception as e:
+                print(f"Error closing reader {name}: {e}")
+
+    def open(self, name: str):
+        """Ask the ingest thread to open a reader via `open_reader` (any thread)."""
+        self._commands.append(('open', name))
+        self.wake()
+
+    def close(self, name: str):
+        """Ask the ingest thread to close a reader it opened (any thread)."""
+        self._commands.append(('close', name))
+        self.wake()
+
+    def _apply_commands(self):
+        while self._commands:
+            op, name = self._commands.popleft()
+            if op == 'open' and name not in self._sources and self.open_reader is not None:
+                try:
+                    reader, period_ms = self.open_reader(name)
+                    reader.__enter__()
+                except Exception as e:
+                    print(f"Error opening reader {name}: {e}")
+                    continue
+                self.add(name, reader, period_ms)
+                self._owned.add(name)
+            elif op == 'close' and name in self._owned:
+                self.remove(name)
+
+    def _demote(self, src: _Source):
+        """Fall back to polling for a reader whose descriptor is not a reliable signal."""
+        if src.fd is not None:
+            try:
+                self._selector.unregister(src.fd)
+            except (KeyError, ValueError):
+                pass
+            src.fd = None
+
+    def _check(self, src: _Source, now: float) -> bool:
+        if not src.reader.ready():
+            return False
+        try:
+            self.on_sample(src.name, src.reader.data)
+        except Exception as e:
+            # One bad sample or callback must not stop every other stream
+            src.errors += 1
+            if src.errors == 1 or src.errors % 100 == 0:
+                print(f"Error handling sample from {src.name} ({src.errors} so far): {e}")
+        src.hit(now)
+        return True
+
+    def _timeout(self, now: float) -> Optional[float]:
+        if not self._sources:
+            return None  # nothing to ingest: sleep until woken
+        due = [s.next_due for s in self._sources.values() if s.fd is None]
+        if not due:
+            return IDLE_WAIT_S
+        return min(max(min(due) - now, 0.0), IDLE_WAIT_S)
+
+    def wake(self):
+        """Interrupt the current wait (safe to call from any thread)."""
+        try:
+            os.write(self._wake_w, b'\0')
+        except (BlockingIOError, OSError):
+            pass
+
+    def stop(self):
+        self._stop.set()
+        self.wake()
+
+    def run(self):
+        """Block the calling thread and ingest until stop() is called."""
+        cpu = time.thread_time()
+        try:
+            while not self._stop.is_set():
+                self._apply_commands()
+                now = time.monotonic()
+                timeout = self._timeout(now)
+
+                self._busy_cpu += time.thread_time() - cpu
+                t0 = time.monotonic()
+                events = self._selector.select(timeout) if timeout is None or timeout > 0 else []
+                self._idle += time.monotonic() - t0
+                cpu = time.thread_time()
+                self._wakeups += 1
+
+                now = time.monotonic()
+                for key, _ in events:
+                    src = key.data
+                    if src is None:
+                        try:
+                            os.read(self._wake_r, 4096)
+                        except BlockingIOError:
+                            pass
+                    elif not self._check(src, now):
+                        # Readable descriptor but no sample: it is not a data
+                        # notification we can trust, so poll this reader instead.
+                        self._demote(src)
+                for src in list(self._sources.values()):
+                    if src.fd is None and src.next_due <= now and not self._check(src, now):
+                        src.miss(now)
+        finally:
+            self._busy_cpu += time.thread_time() - cpu
+            for name in list(self._owned):
+                self.remove(name)
+
+    def stats(self) -> Dict[str, Any]:
+        """Report idle/busy time for the ingest thread and per-reader scheduling."""
+        uptime = max(time.monotonic() - self._started, 1e-9)
+        return {
+            'uptime_s': uptime,
+            'busy_cpu_s': self._busy_cpu,
+            'idle_s': self._idle,
+            'cpu_percent': 100.0 * self._busy_cpu / uptime,
+            'wakeups': self._wakeups,
+            'wakeups_per_s': self._wakeups / uptime,
+            'readers': {
+                name: {
+                    'mode': 'select' if s.fd is not None else 'poll',
+                    'owned': name in self._owned,
+                    'period_ms': s.period * 1000.0,
+                    'backoff_ms': s.interval * 1000.0,
+                    'samples': s.samples,
+                    'misses': s.misses,
+                    'errors': s.errors,
+                }
+                for name, s in list(self._sources.items())
+            },
+        }
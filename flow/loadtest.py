@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+# /// script
+# dependencies = [
+#   "numpy",
+#   "fastapi",
+#   "uvicorn",
+#   "websockets",
+#   "psutil",
+#   "bbos",
+# ]
+# [tool.uv.sources]
+# bbos = { path = "/home/bracketbot/BracketBotOS", editable = true }
+# ///
+"""Load test: how many viewers can the Flow server take?
+
+Starts the Flow app in a child process, fed by stand-in readers that publish
+synthetic camera.jpeg, camera.points and speakerphone.mic samples at realistic
+rates instead of the robot's writers. Then opens N concurrent clients of each
+kind:
+
+* /ws/writer/<writer> (binary by default)
+* /ws/binary/camera.points
+* /mjpeg/camera
+
+After a warm-up it measures for `--duration` seconds and reports frames per
+second delivered per client, end-to-end age percentiles and the server
+process's CPU and memory. Ages are measured by the clients from the sample
+timestamp (MJPEG frames carry it in a JPEG comment segment). Point cloud
+frames carry no timestamp, so their ages come from the server's send
+telemetry instead.
+
+    python loadtest.py -n 4 --duration 20
+    python loadtest.py --ws 8 --points 2 --mjpeg 8 --json result.json
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import re
+import threading
+import time
+import urllib.request
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import psutil
+import websockets
+
+JPEG_COMMENT = b'\xff\xfe'
+
+
+def sample_dtypes(jpeg_bytes: int, max_points: int) -> Dict[str, np.dtype]:
+    return {
+        'camera.jpeg': np.dtype([
+            ('timestamp', 'M8[ns]'),
+            ('bytesused', '<u4'),
+            ('jpeg', 'u1', (jpeg_bytes,)),
+        ]),
+        'camera.points': np.dtype([
+            ('timestamp', 'M8[ns]'),
+            ('num_points', '<i4'),
+            ('points', '<f4', (max_points, 3)),
+            ('colors', 'u1', (max_points, 3)),
+        ]),
+        'speakerphone.mic': np.dtype([
+            ('timestamp', 'M8[ns]'),
+            ('audio', '<i2', (1600, 1)),
+        ]),
+    }
+
+
+class FakeReader:
+    """Stands in for a bbos Reader, publishing a prepared sample every period.
+
+    Only the timestamp (and the JPEG comment carrying it) changes between
+    samples, so producing them costs next to nothing next to serving them.
+    """
+
+    def __init__(self, name: str, dtype: np.dtype, rate: float):
+        self.name = name
+        self.period = 1.0 / rate
+        self.data = np.zeros((), dtype=dtype)
+        self._next = time.monotonic()
+        rng = np.random.default_rng(0)
+        if name == 'camera.jpeg':
+            size = len(self.data['jpeg'])
+            jpeg = rng.integers(0, 256, size, dtype=np.uint8)
+            jpeg[:2] = (0xFF, 0xD8)
+            jpeg[2:4] = np.frombuffer(JPEG_COMMENT, np.uint8)
+            jpeg[4:6] = (0, 22)  # segment length: 2 + 20 digits of time_ns
+            jpeg[-2:] = (0xFF, 0xD9)
+            self.data['jpeg'] = jpeg
+            self.data['bytesused'] = size
+        elif name == 'camera.points':
+            n = len(self.data['points'])
+            self.data['num_points'] = n
+            self.data['points'] = rng.standard_normal((n, 3)) * (2.0, 2.0, 0.5) + (0.0, 0.0, 3.0)
+            self.data['colors'] = rng.integers(0, 256, (n, 3))
+        elif name == 'speakerphone.mic':
+            self.data['audio'] = (rng.standard_normal((1600, 1)) * 3000).astype(np.int16)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def ready(self) -> bool:
+        now = time.monotonic()
+        if now < self._next:
+            return False
+        # Publish at the nominal rate, without bursts after a stall
+        self._next = max(self._next + self.period, now)
+        ns = time.time_ns()
+        self.data['timestamp'] = np.datetime64(ns, 'ns')
+        if self.name == 'camera.jpeg':
+            self.data['jpeg'][6:26] = np.frombuffer(b'%020d' % ns, np.uint8)
+        return True
+
+
+class IdleReader:
+    """Reader for writers the load test does not simulate."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
+
+    def ready(self) -> bool:
+        return False
+
+
+def serve(port: int, rates: Dict[str, float], jpeg_bytes: int, max_points: int):
+    """Child process: the Flow app with stand-in readers."""
+    import uvicorn
+    import main
+    from ingest import IngestEngine
+
+    dtypes = sample_dtypes(jpeg_bytes, max_points)
+
+    def open_reader(name: str):
+        if name not in dtypes:
+            return IdleReader(), 0
+        period_ms = 1000.0 / rates[name]
+        main.telemetry.periods[name] = main.history.periods[name] = period_ms / 1000.0
+        return FakeReader(name, dtypes[name], rates[name]), period_ms
+
+    ingest = main.ingest = IngestEngine({}, main.on_sample, open_reader=open_reader)
+    main.hub.on_demand = lambda writer, active: ingest.open(writer) if active else ingest.close(writer)
+    threading.Thread(target=ingest.run, daemon=True).start()
+    uvicorn.run(main.app, host='127.0.0.1', port=port, log_level='warning')
+
+
+class ClientResult:
+    """Frames, bytes and ages one client received inside the measurement window."""
+
+    def __init__(self, kind: str, window: List[float]):
+        self.kind = kind
+        self.window = window
+        self.frames = 0
+        self.bytes = 0
+        self.ages: List[float] = []
+        self.error: Optional[str] = None
+
+    def done(self) -> bool:
+        return time.time() >= self.window[1]
+
+    def record(self, nbytes: int, timestamp: Optional[float] = None):
+        now = time.time()
+        if not self.window[0] <= now < self.window[1]:
+            return
+        self.frames += 1
+        self.bytes += nbytes
+        if timestamp:
+            self.ages.append(now - timestamp)
+
+
+def _datetime_s(text: str) -> float:
+    return int(np.datetime64(text, 'ns').astype(np.int64)) / 1e9
+
+
+async def ws_writer_client(base: str, writer: str, format: str, result: ClientResult):
+    url = f'ws://{base}/ws/writer/{writer}?format={format}'
+    async with websockets.connect(url, max_size=None) as ws:
+        offset = None
+        async for message in ws:
+            if isinstance(message, bytes):
+                ts = None
+                if offset is not None:
+                    ts = int(np.frombuffer(message, '<i8', count=1, offset=offset)[0]) / 1e9
+                result.record(len(message), ts)
+            else:
+                msg = json.loads(message)
+                if msg.get('type') == 'header':
+                    offset = next((f['offset'] for f in msg['fields'] if f['name'] == 'timestamp'), None)
+                    continue
+                result.record(len(message), _datetime_s(msg['data']['timestamp']))
+            if result.done():
+                break
+
+
+async def points_client(base: str, budget: int, result: ClientResult):
+    url = f'ws://{base}/ws/binary/camera.points?budget={budget}'
+    async with websockets.connect(url, max_size=None) as ws:
+        async for message in ws:
+            result.record(len(message))
+            if result.done():
+                break
+
+
+async def mjpeg_client(host: str, port: int, result: ClientResult):
+    # HTTP/1.0 so the multipart body is not chunk encoded
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write(b'GET /mjpeg/camera HTTP/1.0\r\nHost: %s\r\n\r\n' % host.encode())
+        await writer.drain()
+        await reader.readuntil(b'\r\n\r\n')
+        while not result.done():
+            head = await reader.readuntil(b'\r\n\r\n')
+            size = int(re.search(rb'Content-Length: (\d+)', head).group(1))
+            jpeg = await reader.readexactly(size)
+            await reader.readexactly(2)
+            ts = None
+            if jpeg[2:4] == JPEG_COMMENT:
+                ts = int(jpeg[6:26]) / 1e9
+            result.record(len(head) + size + 2, ts)
+    finally:
+        writer.close()
+
+
+async def run_client(coro, result: ClientResult):
+    try:
+        await coro
+    except Exception as e:
+        result.error = f'{type(e).__name__}: {e}'
+
+
+def wait_ready(base: str, timeout: float = 30.0):
+    deadline = time.time() + timeout
+    while True:
+        try:
+            urllib.request.urlopen(f'http://{base}/api/readers', timeout=1).read()
+            return
+        except OSError:
+            if time.time() > deadline:
+                raise RuntimeError(f"Flow server did not come up on {base}")
+            time.sleep(0.2)
+
+
+def percentiles(values: List[float]) -> Dict[str, Optional[float]]:
+    if not values:
+        return {'p50': None, 'p90': None, 'p99': None}
+    p = np.percentile(values, [50, 90, 99])
+    return {'p50': float(p[0]), 'p90': float(p[1]), 'p99': float(p[2])}
+
+
+def summarize(kind: str, results: List[ClientResult], duration: float) -> Dict[str, Any]:
+    fps = [r.frames / duration for r in results]
+    ages = [a for r in results for a in r.ages]
+    return {
+        'kind': kind,
+        'clients': len(results),
+        'errors': [r.error for r in results if r.error],
+        'fps_mean': float(np.mean(fps)) if fps else 0.0,
+        'fps_min': float(np.min(fps)) if fps else 0.0,
+        'bytes_per_s': sum(r.bytes for r in results) / duration,
+        'age_s': percentiles(ages),
+    }
+
+
+def _ms(value: Optional[float]) -> str:
+    return '-' if value is None else f'{value * 1000:.1f}'
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('-n', '--clients', type=int, default=4, help='clients of each kind')
+    parser.add_argument('--ws', type=int, help='/ws/writer clients (default: -n)')
+    parser.add_argument('--points', type=int, help='/ws/binary/camera.points clients (default: -n)')
+    parser.add_argument('--mjpeg', type=int, help='/mjpeg/camera clients (default: -n)')
+    parser.add_argument('--ws-writer', default='speakerphone.mic')
+    parser.add_argument('--ws-format', default='binary', choices=['binary', 'json'])
+    parser.add_argument('--budget', type=int, default=100000, help='point budget per points client')
+    parser.add_argument('--camera-hz', type=float, default=30.0)
+    parser.add_argument('--points-hz', type=float, default=10.0)
+    parser.add_argument('--mic-hz', type=float, default=10.0)
+    parser.add_argument('--jpeg-kb', type=int, default=60)
+    parser.add_argument('--max-points', type=int, default=100000)
+    parser.add_argument('--duration', type=float, default=15.0, help='measured seconds')
+    parser.add_argument('--warmup', type=float, default=3.0)
+    parser.add_argument('--port', type=int, default=8092)
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    counts = {
+        'ws': args.clients if args.ws is None else args.ws,
+        'points': args.clients if args.points is None else args.points,
+        'mjpeg': args.clients if args.mjpeg is None else args.mjpeg,
+    }
+    rates = {'camera.jpeg': args.camera_hz, 'camera.points': args.points_hz, 'speakerphone.mic': args.mic_hz}
+    host, port = '127.0.0.1', args.port
+    base = f'{host}:{port}'
+
+    server = multiprocessing.get_context('spawn').Process(
+        target=serve, args=(port, rates, args.jpeg_kb * 1024, args.max_points), daemon=True)
+    server.start()
+    try:
+        wait_ready(base)
+        proc = psutil.Process(server.pid)
+        start = time.time() + args.warmup
+        window = [start, start + args.duration]
+        results: Dict[str, List[ClientResult]] = {kind: [] for kind in counts}
+
+        async def run():
+            tasks = []
+            for kind, n in counts.items():
+                for _ in range(n):
+                    result = ClientResult(kind, window)
+                    results[kind].append(result)
+                    if kind == 'ws':
+                        coro = ws_writer_client(base, args.ws_writer, args.ws_format, result)
+                    elif kind == 'points':
+                        coro = points_client(base, args.budget, result)
+                    else:
+                        coro = mjpeg_client(host, port, result)
+                    tasks.append(asyncio.create_task(run_client(coro, result)))
+            await asyncio.sleep(max(start - time.time(), 0))
+            cpu0, t0 = proc.cpu_times(), time.time()
+            await asyncio.sleep(max(window[1] - time.time(), 0))
+            cpu1, t1 = proc.cpu_times(), time.time()
+            await asyncio.wait(tasks, timeout=5.0)
+            for task in tasks:
+                task.cancel()
+            busy = (cpu1.user - cpu0.user) + (cpu1.system - cpu0.system)
+            return {'cpu_percent': 100.0 * busy / (t1 - t0), 'rss_mb': proc.memory_info().rss / 2**20,
+                    'threads': proc.num_threads()}
+
+        server_stats = asyncio.run(run())
+        telemetry = json.loads(urllib.request.urlopen(f'http://{base}/api/stats', timeout=5).read())
+    finally:
+        server.terminate()
+        server.join(5)
+
+    summary = [summarize(kind, rs, args.duration) for kind, rs in results.items() if rs]
+    # Point cloud frames carry no timestamp: use the server's age at send
+    points_age = (telemetry.get('writers', {}).get('camera.points', {})
+                  .get('streams', {}).get('points', {}).get('age_s'))
+    for entry in summary:
+        if entry['kind'] == 'points' and points_age:
+            entry['age_s'] = {k: points_age[k] for k in ('p50', 'p90', 'p99')}
+            entry['age_source'] = 'server'
+
+    names = {'ws': f'ws {args.ws_writer}', 'points': 'camera.points', 'mjpeg': 'mjpeg'}
+    nominal = {'ws': rates.get(args.ws_writer), 'points': args.points_hz, 'mjpeg': args.camera_hz}
+    print(f"{'stream':<24}{'clients':>8}{'fps/client':>12}{'min fps':>9}{'of':>6}"
+          f"{'MB/s':>8}{'age p50':>9}{'p90':>8}{'p99':>8} ms")
+    for entry in summary:
+        age = entry['age_s']
+        rate = nominal.get(entry['kind'])
+        print(f"{names[entry['kind']]:<24}{entry['clients']:>8}{entry['fps_mean']:>12.1f}{entry['fps_min']:>9.1f}"
+              f"{rate or 0:>6g}{entry['bytes_per_s'] / 1e6:>8.2f}"
+              f"{_ms(age['p50']):>9}{_ms(age['p90']):>8}{_ms(age['p99']):>8}"
+              + (' (server)' if entry.get('age_source') else ''))
+        for error in entry['errors'][:3]:
+            print(f"    error: {error}")
+    print(f"server: {server_stats['cpu_percent']:.0f}% CPU, {server_stats['rss_mb']:.0f} MB RSS, "
+          f"{server_stats['threads']} threads")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({'args': vars(args), 'streams': summary, 'server': server_stats}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -15,24 +15,44 @@
 import asyncio
 import json
 import os
-import subprocess
-import socket
-import psutil
-import numpy as np
-from typing import Dict, Any, List
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect
-from fastapi.responses import HTMLResponse, Response, StreamingResponse
+import time
+from typing import Dict, Any, Optional, Tuple
+from fastapi import FastAPI, HTTPException, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import HTMLResponse, PlainTextResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 import uvicorn
 from bbos import Reader, Config
 import threading
-import queue
 from datetime import datetime
-from contextlib import ExitStack
+from ingest import IngestEngine
+from hub import Hub
+from discovery import WriterDiscovery
+from system import SystemSampler
+from processes import ProcessIndex
+from audio import AudioAnalyzer
+from mux import MuxSession, StatusFeed, pace
+from telemetry import ClientStats, Telemetry, sample_time, shared_dtype
+from history import HistoryStore
+from governor import DEFAULT_PRIORITY, Governor
+import shm
+from codec import Projection, binary_encoder, json_encoder, parse_fields
+import pointcloud
+import assets
+import vendor
 
 # Configuration
 CFG_SPKPN = Config("speakerphone")
 AUDIO_BUFFER_MS = 5000  # 5 seconds of audio buffer
+HISTORY_MAX_MB = float(os.environ.get('FLOW_HISTORY_MB', '8'))  # per writer
+AUDIO_MAX_FPS = 60  # cap on /ws/audio display rate
+
+# Per-kind rate caps (messages/s) for topics on the /ws push channel
+MUX_MAX_RATE = {
+    'writer': 30.0,
+    'points': 15.0,
+    'audio': float(AUDIO_MAX_FPS),
+    'status': 2.0,
+}
 
 # Readers based on actual writers
 READERS = [
@@ -46,11 +66,72 @@ READERS = [
     'camera.points'  # Point cloud data
 ]
 
+# Seconds of raw samples kept per writer for /api/history. Camera frames and
+# point clouds are too large to keep and are served live only.
+HISTORY_SECONDS = {
+    'speakerphone.mic': AUDIO_BUFFER_MS / 1000,
+    'speakerphone.speaker': AUDIO_BUFFER_MS / 1000,
+    'led_strip.ctrl': 10,
+    'transcript': 300,
+    'drive.state': 30,
+    'drive.status': 30,
+}
+
+# Writers kept open even with no client connected (comma-separated), e.g. to
+# keep history filling on a headless robot
+PINNED_READERS = [w for w in os.environ.get('FLOW_PINNED_READERS', '').split(',') if w in READERS]
+
+# Seconds a reader stays open after its last client leaves
+READER_GRACE_S = float(os.environ.get('FLOW_READER_GRACE_S', '10'))
+
+# With more than one worker, a single ingest process publishes into shared
+# memory and uvicorn worker processes serve clients from it (see shm.py)
+FLOW_WORKERS = int(os.environ.get('FLOW_WORKERS', '1'))
+
 # Daemon names for status checking
 DAEMON_NAMES = ['camera', 'drive', 'led_strip', 'speakerphone', 'transcriber', 'depth']
 
-# Global queues for writer data
-queues = {}
+# Active writers found through /proc/net/unix, cached by socket inode
+writer_discovery = WriterDiscovery()
+
+# System metrics sampled in the background, with history
+system_sampler = SystemSampler(rate_hz=float(os.environ.get('FLOW_SYSTEM_HZ', '1')),
+                               history_s=float(os.environ.get('FLOW_SYSTEM_HISTORY_S', '600')))
+
+# Daemon/app processes, tracked incrementally by PID
+process_index = ProcessIndex(DAEMON_NAMES)
+
+# Latest sample per writer, fanned out to every client from a slab pool
+# (FLOW_POOL_SLABS caps the slabs per writer)
+hub = Hub(READERS, grace=READER_GRACE_S, max_slabs=int(os.environ.get('FLOW_POOL_SLABS', '8')))
+
+# Envelope/RMS/spectrogram computed once per audio chunk
+audio_analyzers = {
+    'speakerphone.mic': AudioAnalyzer(CFG_SPKPN.mic_sample_rate),
+    'speakerphone.speaker': AudioAnalyzer(CFG_SPKPN.speaker_sample_rate),
+}
+
+# Throughput, latency and drop counters per writer and client
+telemetry = Telemetry()
+
+# Stream rates and point budgets stepped down under load, lowest priority
+# first (FLOW_SHED_PRIORITY lists stream classes, most important first)
+governor = Governor(telemetry.send_lag,
+                    priority=os.environ.get('FLOW_SHED_PRIORITY', ','.join(DEFAULT_PRIORITY)).split(','))
+
+# Recent raw samples per writer, for scrubbing and late-joining clients
+history = HistoryStore(HISTORY_SECONDS, max_bytes=int(HISTORY_MAX_MB * (1 << 20)))
+
+# Point cloud frames encoded once per level of detail
+points_lod = pointcloud.LodCache()
+read_points = lambda fn: hub.read('camera.points', fn)
+
+# Frontend page and vendored libraries (see vendor.py), served from memory
+frontend_page = assets.Asset.load(os.path.join(os.path.dirname(__file__), 'frontend.html'), assets.REVALIDATE)
+vendor_assets = assets.AssetStore(vendor.VENDOR_DIR)
+
+# Reader ingestion engine (set by main)
+ingest = None
 
 # FastAPI app instance
 app = FastAPI()
@@ -66,273 +147,375 @@ app.add_middleware(
 
 def get_writer_metadata() -> Dict[str, Any]:
     """Get metadata about active writers from unix sockets."""
-    def get_data(sock: str):
-        s = socket.socket(socket.AF_UNIX, socket.SOCK_SEQPACKET)
-        res = s.connect_ex(f'\0{sock}')
-        s.settimeout(0.1)
-        data = None
-        if res == 0:
-            try:
-                data = s.recv(1024)
-            except socket.timeout:
-                pass
-        s.close()
-        return data
-
-    # Use /proc/net/unix to find LISTEN state abstract sockets ending in .bbos
-    awk_prog = 'NR>1 && $6=="01" && $NF ~ /^@.*\.bbos$/ {sub(/^@/, "", $NF); print $NF}'
-    result = subprocess.run(["awk", awk_prog, "/proc/net/unix"], capture_output=True, text=True)
-    sockets = result.stdout.splitlines()
-    
-    writer_metadata = {}
-    
-    for sock in sockets:
-        w = sock.split("__")[0].replace(".bbos", "")
-        if "timelog" not in sock:
-            data = get_data(sock)
-            if data:
-                try:
-                    info = json.loads(data)
-                    writer_metadata[w] = {
-                        'name': w,
-                        'caller': info.get('caller', 'Unknown'),
-                        'owner': info.get('owner', 'Unknown'),
-                        'period': info.get('period', 0),
-                        'dtype': info.get('dtype', [])
-                    }
-                except:
-                    pass
-    
-    return writer_metadata
+    return writer_discovery.writers()
 
 def get_system_metrics() -> Dict[str, Any]:
     """Get system performance metrics."""
-    try:
-        cpu_percent = psutil.cpu_percent(interval=0.1)
-        memory = psutil.virtual_memory()
-        swap = psutil.swap_memory()
-        load_avg = os.getloadavg()
-        
-        # Get top processes by CPU
-        processes = []
-        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent']):
-            try:
-                pinfo = proc.info
-                if pinfo['cpu_percent'] > 0:
-                    processes.append({
-                        'pid': pinfo['pid'],
-                        'name': pinfo['name'],
-                        'cpu': pinfo['cpu_percent']
-                    })
-            except:
-                pass
-        
-        processes.sort(key=lambda x: x['cpu'], reverse=True)
-        
-        return {
-            'cpu': {
-                'percent': cpu_percent,
-                'count': psutil.cpu_count()
-            },
-            'memory': {
-                'total': memory.total,
-                'used': memory.used,
-                'percent': memory.percent
-            },
-            'swap': {
-                'total': swap.total,
-                'used': swap.used,
-                'percent': swap.percent
-            },
-            'load_avg': load_avg,
-            'top_processes': processes[:5]
-        }
-    except Exception as e:
-        return {'error': str(e)}
+    return system_sampler.latest()
 
-def get_daemon_status(daemon_name: str) -> str:
-    """Check if a daemon is running."""
+def get_daemon_status(daemon_name: str) -> Dict[str, Any]:
+    """Check if a daemon is running, with its PID, uptime and restart count."""
     try:
-        for proc in psutil.process_iter(['pid', 'name', 'cmdline']):
-            try:
-                cmdline = proc.info.get('cmdline', [])
-                if cmdline and 'daemon.py' in ' '.join(cmdline) and daemon_name in ' '.join(cmdline):
-                    return 'running'
-            except (psutil.NoSuchProcess, psutil.AccessDenied):
-                continue
-        return 'stopped'
+        process_index.refresh()
+        return process_index.daemon(daemon_name)
     except Exception:
-        return 'unknown'
+        return {'status': 'unknown'}
 
-def convert_numpy_to_json(data, skip_jpeg=False):
-    """Convert numpy structured array to JSON-serializable dict."""
-    json_data = {}
-    
-    if hasattr(data, 'dtype') and data.dtype.names:
-        # It's a structured array
-        for field_name in data.dtype.names:
-            value = data[field_name]
-            
-            # Skip JPEG data if requested (for MJPEG streaming)
-            if field_name == 'jpeg' and skip_jpeg:
-                continue
-            
-            # Skip large point cloud arrays to avoid JSON bloat
-            if field_name in ['points', 'colors'] and 'num_points' in data.dtype.names:
-                # Don't send the actual arrays for point clouds
-                continue
-            
-            if isinstance(value, np.ndarray):
-                # For audio data, convert to int16 list (flatten if 2D)
-                if field_name == 'audio' and value.dtype == np.int16:
-                    if value.ndim == 2 and value.shape[1] == 1:
-                        # Flatten mono audio from (samples, 1) to (samples,)
-                        json_data[field_name] = value.flatten().tolist()
-                    else:
-                        json_data[field_name] = value.tolist()
-                # For other arrays, convert based on type
-                elif value.dtype in [np.float16, np.float32, np.float64]:
-                    json_data[field_name] = value.tolist()
-                elif value.dtype in [np.uint8, np.uint16, np.uint32]:
-                    json_data[field_name] = value.tolist()
-                else:
-                    json_data[field_name] = value.tolist()
-            elif isinstance(value, (np.int32, np.int64, np.uint32, np.uint64)):
-                json_data[field_name] = int(value)
-            elif isinstance(value, (np.float32, np.float64)):
-                json_data[field_name] = float(value)
-            elif isinstance(value, np.datetime64):
-                json_data[field_name] = str(value)
-            elif isinstance(value, bytes):
-                json_data[field_name] = value.decode('utf-8', errors='replace')
-            elif isinstance(value, np.bytes_):
-                # Handle numpy bytes strings (like text from transcriber)
-                json_data[field_name] = value.decode('utf-8', errors='replace').strip()
-            else:
-                json_data[field_name] = value
-    else:
-        # If it's already a dict, use it directly
-        json_data = data if isinstance(data, dict) else {'data': data}
-    
-    return json_data
+def get_daemon_statuses() -> Dict[str, Any]:
+    """Get status of all daemons, keyed by name."""
+    return {name: {'name': name, **get_daemon_status(name)} for name in DAEMON_NAMES}
+
+def read_pointcloud_status() -> Dict[str, Any]:
+    """Get size, sequence number and age of the latest point cloud."""
+    snap = hub.read('camera.points', lambda data: {
+        'num_points': int(data['num_points']),
+        'timestamp': str(data['timestamp']) if 'timestamp' in data.dtype.names else None
+    })
+    if snap is None:
+        return {'num_points': 0}
+    return {**snap.value, 'seq': snap.seq, 'age': time.time() - snap.recv_time}
+
+# Shared status feeds for /ws, polled only while a client is subscribed.
+# Uptime and age tick every poll, so they are left out of change detection.
+status_feeds = {
+    'daemons': StatusFeed(lambda: asyncio.to_thread(get_daemon_statuses), interval=2.0,
+                          key=lambda v: {n: {k: x for k, x in s.items() if k != 'uptime'} for n, s in v.items()}),
+    'system': StatusFeed(lambda: asyncio.to_thread(get_system_metrics), interval=system_sampler.period,
+                         key=lambda v: v.get('time')),
+    'pointcloud': StatusFeed(lambda: asyncio.to_thread(read_pointcloud_status), interval=1.0,
+                             key=lambda v: v.get('seq')),
+}
 
 @app.get("/", response_class=HTMLResponse)
-async def root():
+async def root(request: Request):
     """Serve the frontend HTML."""
-    with open(os.path.join(os.path.dirname(__file__), 'frontend.html'), 'r') as f:
-        return HTMLResponse(content=f.read())
+    return assets.respond(frontend_page, request.headers)
+
+@app.get("/vendor/{name}")
+async def get_vendor(name: str, request: Request):
+    """Serve a vendored frontend library (fetched at startup, see vendor.ensure)."""
+    asset = vendor_assets.get(name)
+    if asset is not None:
+        return assets.respond(asset, request.headers)
+    raise HTTPException(status_code=404, detail=f"Unknown vendored file {name}")
 
 @app.get("/api/writers")
 async def get_writers():
     """Get metadata for all active writers."""
-    return get_writer_metadata()
+    return await asyncio.to_thread(get_writer_metadata)
 
 @app.get("/api/readers")
 async def get_readers():
     """Get list of readers configured for this app."""
     return READERS
 
+def ingest_stats() -> Dict[str, Any]:
+    """Ingest engine stats, published by the ingest process in multi-process mode."""
+    if ingest is not None:
+        return ingest.stats()
+    return shm_state.ingest_stats() if shm_state is not None else {}
+
+@app.get("/api/ingest")
+async def get_ingest():
+    """Get CPU and scheduling stats for the reader ingestion thread."""
+    return ingest_stats()
+
+@app.get("/api/stats")
+async def get_stats():
+    """Get per-writer ingest, send, drop and latency telemetry."""
+    return {**telemetry.snapshot(), 'history': history.stats(), 'pools': hub.pools(),
+            'governor': governor.snapshot()}
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def get_metrics():
+    """Telemetry in Prometheus text format."""
+    return PlainTextResponse(telemetry.prometheus(), media_type="text/plain; version=0.0.4")
+
+@app.get("/api/subscriptions")
+async def get_subscriptions():
+    """Get client reference counts and open/closed state of every reader."""
+    demand = hub.demand()
+    opened = ingest_stats().get('readers', {})
+    return {
+        writer: {'open': writer in opened, **state, 'pinned': writer in PINNED_READERS}
+        for writer, state in demand.items()
+    }
+
 @app.get("/api/daemons")
 async def get_daemons():
     """Get status of all daemons."""
-    return {
-        name: {
-            'name': name,
-            'status': get_daemon_status(name)
-        }
-        for name in DAEMON_NAMES
-    }
+    return await asyncio.to_thread(get_daemon_statuses)
+
+@app.get("/api/apps")
+async def get_apps():
+    """Get status of every app process seen since Flow started."""
+    await asyncio.to_thread(process_index.refresh)
+    return process_index.apps()
 
 @app.get("/api/system")
 async def get_system():
     """Get system metrics."""
     return get_system_metrics()
 
+@app.get("/api/system/history")
+async def get_system_history(minutes: float = 5.0):
+    """Get system metrics sampled over the last N minutes."""
+    return system_sampler.history(minutes * 60)
+
 @app.get("/api/pointcloud/status")
 async def get_pointcloud_status():
     """Get current point cloud status."""
-    if 'camera.points' in queues:
-        try:
-            # Try to get the latest data without blocking
-            data = None
-            # Drain the queue and keep only the latest
-            while True:
-                try:
-                    data = queues['camera.points'].get_nowait()
-                except queue.Empty:
-                    break
-            
-            if data is not None:
-                # Put it back for the binary websocket
-                try:
-                    queues['camera.points'].put_nowait(data)
-                except queue.Full:
-                    pass
-                
-                return {
-                    'num_points': int(data['num_points']),
-                    'timestamp': str(data['timestamp']) if 'timestamp' in data.dtype.names else None
-                }
-        except Exception as e:
-            print(f"Error getting point cloud status: {e}")
-    
-    return {'num_points': 0}
+    return read_pointcloud_status()
+
+def parse_projection(fields: Optional[str]) -> Optional[Projection]:
+    """Projection from a `fields` query/subscribe option, as an HTTP 400 if malformed."""
+    try:
+        return parse_fields(fields) if fields else None
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@app.get("/api/latest/{writer_name}")
+async def get_latest(writer_name: str, fields: Optional[str] = None):
+    """Get the newest sample from a writer without consuming it.
+
+    `fields` selects fields and slices, e.g. `vel,pos[0]` (see codec.py).
+    """
+    if writer_name not in hub:
+        raise HTTPException(status_code=404, detail=f"Unknown writer {writer_name}")
+    projection = parse_projection(fields)
+    try:
+        snap = hub.read(writer_name, lambda data: json_encoder(writer_name, data.dtype, projection).encode(data))
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown field: {e.args[0]}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    if snap is None:
+        return {'writer': writer_name, 'seq': 0, 'data': None}
+    return {
+        'writer': writer_name,
+        'seq': snap.seq,
+        'age': time.time() - snap.recv_time,
+        'data': snap.value
+    }
+
+@app.get("/api/history/{writer_name}")
+async def get_history(writer_name: str, since: Optional[float] = None, fields: Optional[str] = None):
+    """Get recent samples from a writer as one binary response (layout in history.py).
+
+    `since` is epoch seconds, or seconds before now if negative; `fields` is a
+    projection like `vel,pos[0]` (default: the fields the binary writer stream sends).
+    """
+    ring = history.get(writer_name)
+    if ring is None:
+        raise HTTPException(status_code=404, detail=f"No history for {writer_name}")
+    if since is not None and since < 0:
+        since = time.time() + since
+    projection = parse_projection(fields)
+    try:
+        body = await asyncio.to_thread(ring.window, since, projection)
+    except KeyError as e:
+        raise HTTPException(status_code=400, detail=f"Unknown field: {e.args[0]}")
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return Response(content=body, media_type="application/octet-stream")
 
 @app.get("/mjpeg/camera")
 async def mjpeg_stream():
     """Stream MJPEG video from camera."""
     headers = {"Content-Type": "multipart/x-mixed-replace; boundary=frame"}
+    def part(data):
+        """The frame's multipart header, JPEG bytes and timestamp."""
+        size = int(data["bytesused"])
+        header = (b"--frame\r\n"
+            b"Content-Type: image/jpeg\r\n"
+            b"Content-Length: %d\r\n\r\n" % size)
+        return header, data["jpeg"][:size].tobytes(), sample_time(data)
+
     async def generate():
-        while True:
-            try:
-                # Get the latest JPEG frame from the camera queue
-                if 'camera.jpeg' in queues:
-                    try:
-                        data = queues['camera.jpeg'].get_nowait()
-                        # Access numpy structured array fields
-                        size = int(data["bytesused"])
-                        jpeg = memoryview(data["jpeg"])[:size]
-                        yield (b"--frame\r\n"
-                            b"Content-Type: image/jpeg\r\n"
-                            b"Content-Length: %d\r\n\r\n" % size + jpeg +
-                            b"\r\n")
-                    except queue.Empty:
-                        pass
-                
-                await asyncio.sleep(0.01)
-            except Exception as e:
-                print(f"Error in MJPEG stream: {e}")
-                break
+        stats = telemetry.client(telemetry.client_id('mjpeg'), 'camera.jpeg', 'mjpeg')
+        with hub.subscribe('camera.jpeg') as sub, stats:
+            while True:
+                try:
+                    # Only the used bytes are copied out, so a slow client never pins a slab
+                    header, jpeg, t = await sub.next(part)
+                    stats.sample(t, sub.recv_time, sub.skipped)
+                    yield header
+                    yield jpeg
+                    yield b"\r\n"
+                    stats.sent(len(header) + len(jpeg) + 2)
+                    limit = governor.limit('camera.jpeg', 'mjpeg', full_rate('camera.jpeg'))
+                    if limit:
+                        await asyncio.sleep(1.0 / limit)
+                except Exception as e:
+                    print(f"Error in MJPEG stream: {e}")
+                    break
     
     return StreamingResponse(generate(), 
                            headers=headers)
 
+def full_rate(writer_name: str) -> float:
+    """Native sample rate of a writer, for pacing unpaced streams while they are shed."""
+    period = telemetry.period(writer_name)
+    return 1.0 / period if period else MUX_MAX_RATE['writer']
+
+async def writer_stream(writer_name: str, format: str, stats: ClientStats,
+                        fields: Optional[Projection] = None):
+    """Messages for each new sample of a writer: dicts for JSON, bytes for binary.
+
+    In binary mode the dtype header dict is yielded before the first sample
+    and again whenever the dtype changes. `fields` projects the sample; each
+    sample is encoded once for all clients with the same format and projection.
+    """
+    make_encoder = binary_encoder if format == 'binary' else json_encoder
+
+    schema = None
+    with hub.subscribe(writer_name) as sub:
+        while True:
+            with await sub.next_lease() as lease:
+                data = lease.value
+                encoder = make_encoder(writer_name, data.dtype, fields)
+                payload, t = encoder.encode_latest(lease.seq, data), sample_time(data)
+            stats.sample(t, sub.recv_time, sub.skipped)
+            if format == 'binary':
+                if encoder is not schema:
+                    yield encoder.header
+                    schema = encoder
+                yield payload
+                continue
+            json_data = payload
+            yield {
+                'writer': writer_name,
+                'data': json_data,
+                'timestamp': str(json_data.get('timestamp', datetime.now().isoformat()))
+            }
+
+def check_projection(writer_name: str, fields: Optional[Projection]):
+    """Raise KeyError/ValueError now if a projection doesn't fit the writer's current dtype."""
+    if fields is not None:
+        hub.read(writer_name, lambda data: json_encoder(writer_name, data.dtype, fields))
+
+async def points_stream(params: pointcloud.LodParams, stats: ClientStats):
+    """Encoded point cloud frames at the requested level of detail."""
+    with hub.subscribe('camera.points') as sub:
+        while True:
+            num_points, t = await sub.next(lambda data: (int(data['num_points']), sample_time(data)))
+            if num_points <= 0:
+                continue
+            budget = governor.budget(params.budget)
+            frame = await points_lod.get(sub.seq, read_points, params._replace(budget=budget))
+            stats.sample(t, sub.recv_time, sub.skipped)
+            yield frame
+
+async def audio_stream(writer_name: str, stats: ClientStats):
+    """Audio analyzer header, then whatever is new after each chunk.
+
+    Skipped chunks are not counted as drops: the analyzer saw all of them.
+    """
+    analyzer = audio_analyzers[writer_name]
+    yield {**analyzer.header, 'writer': writer_name}
+    env_cursor = frame_cursor = None
+    with hub.subscribe(writer_name) as sub:
+        while True:
+            t, = await sub.next(lambda data: (sample_time(data),))
+            message, env_cursor, frame_cursor = analyzer.since(env_cursor, frame_cursor)
+            if message:
+                stats.sample(t, sub.recv_time)
+                yield message
+
+def topic_writer(topic: str) -> Optional[Tuple[str, str]]:
+    """(writer, stream) that a /ws topic sends, or None for status topics and unknown names."""
+    kind, _, name = topic.partition(':')
+    if kind == 'writer' and name in hub:
+        return name, 'writer'
+    if kind == 'audio' and name in audio_analyzers:
+        return name, 'audio'
+    if kind == 'points':
+        return 'camera.points', 'points'
+    return None
+
+def topic_rate(topic: str) -> Optional[float]:
+    """Rate cap for a /ws topic, lowered while the governor sheds its stream."""
+    cap = MUX_MAX_RATE.get(topic.partition(':')[0])
+    target = topic_writer(topic)
+    return governor.rate(*target, cap) if target else cap
+
+def topic_option(options: Dict[str, Any], name: str, default: Any, kind: type) -> Any:
+    """A /ws subscribe option, checked to be a `kind` (ValueError otherwise)."""
+    value = options.get(name, default)
+    if isinstance(value, bool) or not isinstance(value, kind):
+        raise ValueError(f"Option {name} must be a {'string' if kind is str else 'number'}")
+    return value
+
+def open_topic(topic: str, options: Dict[str, Any], stats: Optional[ClientStats]):
+    """Stream for a /ws topic: writer:<name>, audio:<name>, points or status:<name>."""
+    kind, _, name = topic.partition(':')
+    if kind == 'status' and name in status_feeds:
+        return status_feeds[name].updates()
+    if stats is None:
+        raise KeyError(f"Unknown topic {topic}")
+    if kind == 'writer':
+        fields = topic_option(options, 'fields', '', str)
+        fields = parse_fields(fields) if fields else None
+        check_projection(name, fields)
+        return writer_stream(name, topic_option(options, 'format', 'json', str), stats, fields)
+    if kind == 'audio':
+        return audio_stream(name, stats)
+    params = pointcloud.LodParams.parse(topic_option(options, 'budget', 100000, (int, float)),
+                                        topic_option(options, 'voxel', 0.0, (int, float)),
+                                        topic_option(options, 'quant', 'float16', str),
+                                        topic_option(options, 'colors', 'rgb', str))
+    return points_stream(params, stats)
+
+async def send(websocket: WebSocket, message, stats: ClientStats):
+    """Send a stream message (bytes or a JSON-able dict) and count its size."""
+    if isinstance(message, bytes):
+        await websocket.send_bytes(message)
+        stats.sent(len(message))
+    else:
+        text = json.dumps(message)
+        await websocket.send_text(text)
+        stats.sent(len(text))
+
+@app.websocket("/ws")
+async def mux_websocket(websocket: WebSocket):
+    """Single push channel per client; see mux.py for the protocol."""
+    await websocket.accept()
+    client = telemetry.client_id('mux')
+
+    def track(topic):
+        target = topic_writer(topic)
+        return telemetry.client(client, *target) if target else None
+
+    await MuxSession(websocket, open_topic, topic_rate, track).run()
+
 @app.websocket("/ws/writer/{writer_name}")
-async def writer_websocket(websocket: WebSocket, writer_name: str):
-    """WebSocket endpoint for streaming writer data."""
+async def writer_websocket(websocket: WebSocket, writer_name: str, format: str = 'json',
+                           fields: Optional[str] = None):
+    """WebSocket endpoint for streaming writer data.
+
+    With `?format=binary` a dtype header is sent once as text, followed by one
+    binary message of little-endian field bytes per sample. JSON is the default.
+    `?fields=vel,pos[0]` sends only those fields and slices.
+    """
     await websocket.accept()
     
-    if writer_name not in queues:
+    if writer_name not in hub:
         await websocket.close()
         return
+
+    try:
+        projection = parse_fields(fields) if fields else None
+        check_projection(writer_name, projection)
+    except (KeyError, ValueError) as e:
+        await websocket.close(code=1008, reason=f"Bad fields: {e}")
+        return
     
     try:
-        while True:
-            # Get data from queue
-            try:
-                data = queues[writer_name].get_nowait()
-                # Skip JPEG data for camera.jpeg (use MJPEG stream instead)
-                skip_jpeg = (writer_name == 'camera.jpeg')
-                json_data = convert_numpy_to_json(data, skip_jpeg=skip_jpeg)
-                await websocket.send_json({
-                    'writer': writer_name,
-                    'data': json_data,
-                    'timestamp': str(json_data.get('timestamp', datetime.now().isoformat()))
-                })
-            except queue.Empty:
-                pass
-            
-            await asyncio.sleep(0.01)  # Small delay to prevent busy loop
+        with telemetry.client(telemetry.client_id('ws'), writer_name, 'writer') as stats:
+            stream = writer_stream(writer_name, format, stats, projection)
+            limit = lambda: governor.limit(writer_name, 'writer', full_rate(writer_name))
+            async for message in pace(stream, limit):
+                await send(websocket, message, stats)
                 
     except WebSocketDisconnect:
         pass  # Normal disconnect
@@ -340,92 +523,179 @@ async def writer_websocket(websocket: WebSocket, writer_name: str):
         print(f"Error in WebSocket for {writer_name}: {e}")
 
 @app.websocket("/ws/binary/camera.points")
-async def points_binary_websocket(websocket: WebSocket):
-    """Binary WebSocket endpoint for point cloud data."""
-    print("Binary WebSocket connection attempt for camera.points")
+async def points_binary_websocket(websocket: WebSocket, budget: int = 100000, voxel: float = 0.0,
+                                  quant: str = 'float16', colors: str = 'rgb'):
+    """Binary WebSocket endpoint for point cloud data.
+
+    Clients choose a point budget, an optional voxel size in meters, position
+    quantization (`float16` or `int16`) and colors (`rgb`, `palette` or `none`).
+    See pointcloud.py for the message layout.
+    """
+    params = pointcloud.LodParams.parse(budget, voxel, quant, colors)
+    print(f"Binary WebSocket connection attempt for camera.points {params}")
     await websocket.accept()
     print("Binary WebSocket connection accepted for camera.points")
     
     try:
-        while True:
-            # Try to get data without blocking
-            data = None
-            try:
-                # Get latest data from main loop
-                if 'camera.points' in queues:
-                    data = queues['camera.points'].get_nowait()
-            except queue.Empty:
-                await asyncio.sleep(0.01)
-                continue
-            except Exception as e:
-                print(f"Error getting data from queue: {e}")
-                await asyncio.sleep(0.01)
-                continue
-                
-            if data is not None:
-                try:
-                    # Pack binary data efficiently
-                    num_points = int(data['num_points'])
-                    if num_points > 0 and num_points < 100000:  # Sanity check
-                        # Create a binary message with header + points + colors
-                        # Header: 4 bytes (num_points as int32)
-                        header = np.array([num_points],dtype=np.int32).tobytes()
-                        # Points: num_points * 3 * 2 bytes (float16)
-                        points_data = data['points'][:num_points].tobytes()
-                        # Colors: num_points * 3 * 1 byte (uint8)
-                        colors_data = data['colors'][:num_points].tobytes() if 'colors' in data.dtype.names else b''
-                        
-                        # Send as binary message
-                        await websocket.send_bytes(header + points_data + colors_data)
-                except Exception as e:
-                    print(f"Error sending binary data: {e}")
+        with telemetry.client(telemetry.client_id('ws'), 'camera.points', 'points') as stats:
+            limit = lambda: governor.limit('camera.points', 'points', MUX_MAX_RATE['points'])
+            async for frame in pace(points_stream(params, stats), limit):
+                await send(websocket, frame, stats)
                     
     except WebSocketDisconnect:
         print("Binary WebSocket disconnected")
     except Exception as e:
         print(f"Error in binary WebSocket for camera.points: {e}")
 
-def ui(port: int, q: Dict[str, queue.Queue]):
+@app.websocket("/ws/audio/{writer_name}")
+async def audio_websocket(websocket: WebSocket, writer_name: str, fps: float = 20.0):
+    """WebSocket endpoint for derived audio streams (envelope, RMS, spectrogram).
+
+    Sends a JSON header once, then at most `fps` binary messages per second
+    carrying only what is new since the last one. See audio.py for the layout.
+    """
+    await websocket.accept()
+    
+    if writer_name not in audio_analyzers:
+        await websocket.close()
+        return
+    
+    try:
+        with telemetry.client(telemetry.client_id('ws'), writer_name, 'audio') as stats:
+            rate = min(max(fps, 1.0), AUDIO_MAX_FPS)
+            limit = lambda: governor.rate(writer_name, 'audio', rate)
+            async for message in pace(audio_stream(writer_name, stats), limit):
+                await send(websocket, message, stats)
+                
+    except WebSocketDisconnect:
+        pass  # Normal disconnect
+    except Exception as e:
+        print(f"Error in audio WebSocket for {writer_name}: {e}")
+
+# Shared-memory attachment of a worker process (multi-process mode only)
+shm_state = None
+
+@app.on_event("startup")
+async def startup():
+    """Let the ingest thread wake subscribers on this event loop and start (in a worker: attach to) samplers."""
+    global hub, history, shm_state
+    prefix = os.environ.get(shm.PREFIX_ENV)
+    if prefix:
+        # Worker process: serve the ingest process's segments instead of local state
+        shm_state = shm.ShmState(prefix, READERS)
+        hub, history = shm_state.hub, shm_state.history
+        for writer, analyzer in audio_analyzers.items():
+            analyzer.share(shm_state.audio_buffer(writer), init=False)
+        telemetry.share(READERS, shm_state.telemetry_buffer(), shm.MAX_WORKERS, slot=shm_state.slot, init=False)
+        # Sampled and governed once, by the ingest process
+        system_sampler.share(shm_state.system_buffer(), init=False)
+        governor.share(shm_state.governor_buffer(), init=False)
+    else:
+        system_sampler.start()
+        governor.start()
+    hub.bind(asyncio.get_running_loop())
+
+@app.on_event("shutdown")
+async def shutdown():
+    """Stop the governor and give up this worker's reader demand."""
+    governor.stop()
+    if shm_state is not None:
+        shm_state.close()
+
+def ui(port: int):
     """Run the FastAPI application in a separate thread."""
-    global queues
-    queues = q
     uvicorn.run(app, host='0.0.0.0', port=port)
 
+def open_reader(name: str):
+    """Create a Reader for the ingest thread, with the writer's current period."""
+    period = get_writer_metadata().get(name, {}).get('period', 0)
+    if period:
+        telemetry.periods[name] = history.periods[name] = period / 1000.0
+    return Reader(name), period
+
+def on_sample(r, data):
+    """Handle a new sample from the ingest thread."""
+    telemetry.ingest(r, data)
+    history.append(r, data)
+    if r in audio_analyzers:
+        audio_analyzers[r].feed(data['audio'])
+    hub.publish(r, data)
+
+def main_workers(port: int) -> None:
+    """Run ingestion here and serve clients from FLOW_WORKERS processes over shared memory."""
+    global ingest, hub, history
+    prefix = f'flow-{os.getpid()}'
+    publisher = shm.ShmPublisher(prefix, READERS, grace=READER_GRACE_S)
+    ingest = IngestEngine({}, on_sample, open_reader=open_reader)
+    ingest_thread = threading.Thread(target=ingest.run, name='flow-ingest', daemon=True)
+    try:
+        hub = publisher
+        history = HistoryStore(HISTORY_SECONDS, max_bytes=history.max_bytes, allocate=publisher.history_ring)
+        for writer, analyzer in audio_analyzers.items():
+            analyzer.share(publisher.audio_buffer(writer, analyzer.nbytes))
+        nbytes = shared_dtype(len(READERS), shm.MAX_WORKERS).itemsize
+        telemetry.share(READERS, publisher.telemetry_buffer(nbytes), shm.MAX_WORKERS)
+        system_sampler.share(publisher.system_buffer(system_sampler.nbytes))
+        governor.share(publisher.governor_buffer(governor.nbytes))
+        publisher.on_worker_exit = telemetry.forget_worker
+        publisher.ingest_stats = ingest.stats
+        publisher.on_demand = lambda writer, active: ingest.open(writer) if active else ingest.close(writer)
+        for writer in PINNED_READERS:
+            publisher.pin(writer)
+        publisher.start()
+        ingest_thread.start()
+        system_sampler.start()
+        governor.start()
+
+        print(f"Flow Dashboard running on http://0.0.0.0:{port} with {FLOW_WORKERS} workers")
+        os.environ[shm.PREFIX_ENV] = prefix
+        uvicorn.run("main:app", host='0.0.0.0', port=port, workers=FLOW_WORKERS,
+                    app_dir=os.path.dirname(os.path.abspath(__file__)))
+    finally:
+        # Stop writing into the segments before unlinking them
+        governor.stop()
+        system_sampler.stop()
+        ingest.stop()
+        if ingest_thread.is_alive():
+            ingest_thread.join(timeout=2.0)
+        publisher.close()
+
+def load_vendor() -> None:
+    """Fetch missing frontend libraries and load them, or exit: the page needs them offline."""
+    global vendor_assets
+    try:
+        vendor.ensure()
+    except RuntimeError as e:
+        raise SystemExit(f"Flow Dashboard cannot start: {e}")
+    vendor_assets = assets.AssetStore(vendor.VENDOR_DIR)
+
 def main() -> None:
     """Entry point to run the Flow Dashboard server."""
+    global ingest
     port = int(os.environ.get('FLOW_PORT', '8002'))
+    load_vendor()
+    if FLOW_WORKERS > 1:
+        main_workers(port)
+        return
     
-    # Create queues with appropriate sizes
-    queues = {r: queue.Queue(maxsize=5 if r == 'camera.points' else 3) for r in READERS}
-    readers = {r: Reader(r) for r in READERS}
+    # Readers are opened by the ingest thread when a client first subscribes
+    # to a writer, and closed once the last one has been gone for the grace period
+    ingest = IngestEngine({}, on_sample, open_reader=open_reader)
+    hub.on_demand = lambda writer, active: ingest.open(writer) if active else ingest.close(writer)
+    for writer in PINNED_READERS:
+        hub.pin(writer)
     
     # Start UI thread
-    ui_thread = threading.Thread(target=ui, args=(port, queues))
+    ui_thread = threading.Thread(target=ui, args=(port,))
     ui_thread.daemon = True
     ui_thread.start()
     
-    # Main reader loop
-    with ExitStack() as stack:
-        for reader in readers.values():
-            stack.enter_context(reader)
-            
-        print(f"Flow Dashboard running on http://0.0.0.0:{port}")
-        
-        try:
-            while True:
-                for r in READERS:
-                    if readers[r].ready():
-                        try:
-                            data = readers[r].data
-                            queues[r].put_nowait(data)
-                        except queue.Full:
-                            try:
-                                queues[r].get_nowait()
-                            except queue.Empty:
-                                pass
-                            queues[r].put_nowait(data)
-        except KeyboardInterrupt:
-            print("\nShutting down...")
+    print(f"Flow Dashboard running on http://0.0.0.0:{port}")
+    
+    try:
+        ingest.run()
+    except KeyboardInterrupt:
+        print("\nShutting down...")
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,240 @@
+"""Multiplexed push channel for Flow clients.
+
+One websocket per client carries every stream it wants. The client sends
+JSON control messages:
+
+    {"op": "subscribe", "topic": "writer:drive.state", "format": "binary", "rate": 10}
+    {"op": "unsubscribe", "topic": "writer:drive.state"}
+
+and the server acknowledges each subscription with a channel id:
+
+    {"type": "subscribed", "topic": "writer:drive.state", "channel": 3}
+
+Text messages for a topic are JSON objects carrying its `topic`; binary
+messages are prefixed with the uint16 little-endian channel id. Each topic is
+paced to the lower of the client's requested rate and a per-kind cap. A
+malformed control message or bad option gets an error reply and leaves the
+session and its other topics running:
+
+    {"type": "error", "topic": "points", "detail": "rate must be a positive number"}
+
+Caps are looked up again after every message, so they can change while a
+topic streams (see governor.py).
+
+Status topics (daemons, system metrics, ...) are backed by a shared
+StatusFeed that polls only while someone is subscribed and pushes a new value
+only when it differs from the last one.
+
+`track(topic)` may return a recorder for a topic; its `sent(nbytes)` is called
+after every message and `close()` when the subscription ends.
+"""
+
+import asyncio
+import json
+import math
+import struct
+from typing import Any, AsyncIterator, Callable, Dict, Optional, Tuple, Union
+
+from fastapi import WebSocket, WebSocketDisconnect
+
+CHANNEL = struct.Struct('<H')
+
+
+def _requested_rate(options: Dict[str, Any]) -> Optional[float]:
+    """The client's requested rate (None: the cap); raises ValueError unless 0 < rate < inf."""
+    value = options.get('rate')
+    if value is None or value == 0:
+        return None
+    if isinstance(value, bool) or not isinstance(value, (int, float, str)):
+        raise ValueError('rate must be a positive number')
+    try:
+        rate = float(value)
+    except ValueError:
+        rate = math.nan
+    if not (rate > 0 and math.isfinite(rate)):
+        raise ValueError('rate must be a positive number')
+    return rate
+
+
+def _is_header(item: Any) -> bool:
+    return isinstance(item, dict) and item.get('type') == 'header'
+
+
+async def pace(stream: AsyncIterator[Any],
+               rate: Union[None, float, Callable[[], Optional[float]]]) -> AsyncIterator[Any]:
+    """Yield from `stream`, at most `rate` data messages per second.
+
+    `rate` may be a callable, read again after every message. Headers pass
+    straight through. The wait happens before the stream is resumed, so
+    latest-value streams skip ahead instead of queueing.
+    """
+    current = rate if callable(rate) else (lambda: rate)
+    async for item in stream:
+        yield item
+        if not _is_header(item):
+            limit = current()
+            if limit:
+                await asyncio.sleep(1.0 / limit)
+
+
+class StatusFeed:
+    """A status value shared by all subscribers, pushed only when it changes."""
+
+    def __init__(self, fetch: Callable[[], Any], interval: float,
+                 key: Callable[[Any], Any] = lambda value: value):
+        self.fetch = fetch
+        self.interval = interval
+        self.key = key
+        self.version = 0
+        self.value = None
+        self._key = None
+        self._refs = 0
+        self._task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Condition()
+
+    async def _run(self):
+        while True:
+            try:
+                value = await self.fetch()
+                key = self.key(value)
+                if self.version == 0 or key != self._key:
+                    async with self._changed:
+                        self.value, self._key = value, key
+                        self.version += 1
+                        self._changed.notify_all()
+            except Exception as e:
+                print(f"Error polling status feed: {e}")
+            await asyncio.sleep(self.interval)
+
+    async def updates(self) -> AsyncIterator[Dict[str, Any]]:
+        """Yield the current value, then every change, while subscribed."""
+        self._refs += 1
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        try:
+            seen = 0
+            while True:
+                async with self._changed:
+                    await self._changed.wait_for(lambda: self.version != seen)
+                    seen, value = self.version, self.value
+                yield {'type': 'status', 'data': value}
+        finally:
+            self._refs -= 1
+            if self._refs == 0 and self._task is not None:
+                self._task.cancel()
+                self._task = None
+                self.version = 0
+
+
+class MuxSession:
+    """One client's multiplexed websocket."""
+
+    def __init__(self, websocket: WebSocket,
+                 open_topic: Callable[[str, Dict[str, Any], Any], AsyncIterator[Any]],
+                 max_rate: Callable[[str], Optional[float]],
+                 track: Callable[[str], Any] = lambda topic: None):
+        self.websocket = websocket
+        self.open_topic = open_topic
+        self.max_rate = max_rate
+        self.track = track
+        self._channels: Dict[str, Tuple[int, asyncio.Task]] = {}
+        self._next_channel = 1
+        self._send_lock = asyncio.Lock()
+
+    async def _send_json(self, message: Dict[str, Any]) -> int:
+        text = json.dumps(message)
+        async with self._send_lock:
+            await self.websocket.send_text(text)
+        return len(text)
+
+    async def _send_bytes(self, message: bytes) -> int:
+        async with self._send_lock:
+            await self.websocket.send_bytes(message)
+        return len(message)
+
+    def _channel_id(self) -> int:
+        channel = self._next_channel
+        self._next_channel = self._next_channel % 0xFFFF + 1
+        return channel
+
+    async def _pump(self, topic: str, channel: int, stream: AsyncIterator[Any],
+                    rate: Callable[[], Optional[float]], stats: Any):
+        prefix = CHANNEL.pack(channel)
+        paced = pace(stream, rate)
+        try:
+            async for item in paced:
+                if isinstance(item, (bytes, bytearray, memoryview)):
+                    size = await self._send_bytes(prefix + item)
+                else:
+                    size = await self._send_json({**item, 'topic': topic})
+                if stats is not None:
+                    stats.sent(size)
+        except Exception as e:
+            print(f"Error in mux stream {topic}: {e}")
+            try:
+                await self._send_json({'type': 'error', 'topic': topic, 'detail': str(e)})
+            except Exception:
+                pass
+        finally:
+            # Close explicitly so hub subscriptions and feed refcounts drop now
+            await paced.aclose()
+            await stream.aclose()
+            if stats is not None:
+                stats.close()
+
+    async def subscribe(self, topic: str, options: Dict[str, Any]):
+        self.unsubscribe(topic)
+        stats = self.track(topic)
+        try:
+            requested = _requested_rate(options)
+            stream = self.open_topic(topic, options, stats)
+        except (KeyError, ValueError, TypeError) as e:
+            if stats is not None:
+                stats.close()
+            await self._send_json({'type': 'error', 'topic': topic, 'detail': str(e)})
+            return
+
+        def rate() -> Optional[float]:
+            cap = self.max_rate(topic)
+            if requested is None:
+                return cap
+            return min(requested, cap) if cap else requested
+
+        channel = self._channel_id()
+        try:
+            await self._send_json({'type': 'subscribed', 'topic': topic, 'channel': channel, 'rate': rate()})
+        except Exception:
+            if stats is not None:
+                stats.close()
+            raise
+        self._channels[topic] = (channel, asyncio.create_task(self._pump(topic, channel, stream, rate, stats)))
+
+    def unsubscribe(self, topic: str):
+        entry = self._channels.pop(topic, None)
+        if entry is not None:
+            entry[1].cancel()
+
+    async def run(self):
+        """Handle control messages until the client disconnects."""
+        try:
+            while True:
+                try:
+                    message = json.loads(await self.websocket.receive_text())
+                except ValueError:
+                    continue
+                if not isinstance(message, dict):
+                    await self._send_json({'type': 'error', 'detail': 'control messages must be JSON objects'})
+                    continue
+                op, topic = message.get('op'), message.get('topic')
+                if topic is not None and not isinstance(topic, str):
+                    await self._send_json({'type': 'error', 'detail': 'topic must be a string'})
+                    continue
+                if op == 'subscribe' and topic:
+                    await self.subscribe(topic, message)
+                elif op == 'unsubscribe' and topic:
+                    self.unsubscribe(topic)
+        except WebSocketDisconnect:
+            pass
+        finally:
+            for topic in list(self._channels):
+                self.unsubscribe(topic)
@@ -0,0 +1,155 @@
+"""Level-of-detail encoding for the camera.points stream.
+
+Each binary message is a 24-byte little-endian header followed by the point
+data:
+
+    uint32  num_points
+    uint8   position mode   (0 = float16 xyz, 1 = int16 xyz fixed point)
+    uint8   color mode      (0 = none, 1 = uint8 rgb, 2 = palette indexed)
+    uint16  palette size    (entries, color mode 2 only)
+    float32 origin x, y, z  (int16 positions decode as origin + q * scale)
+    float32 scale
+
+    positions   num_points * 3 * 2 bytes
+    palette     palette size * 3 bytes (uint8 rgb)
+    colors      num_points * 3 bytes (rgb) or num_points bytes (palette index)
+
+Frames are encoded once per (frame, parameters) and the bytes are shared by
+every client that asked for the same level of detail.
+"""
+
+import asyncio
+import struct
+from typing import Any, Callable, Dict, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+MAX_POINTS = 500000
+HEADER = struct.Struct('<IBBH4f')
+
+POS_FLOAT16, POS_INT16 = 0, 1
+COLOR_NONE, COLOR_RGB, COLOR_PALETTE = 0, 1, 2
+
+_POS_MODES = {'float16': POS_FLOAT16, 'int16': POS_INT16}
+_COLOR_MODES = {'none': COLOR_NONE, 'rgb': COLOR_RGB, 'palette': COLOR_PALETTE}
+
+
+class LodParams(NamedTuple):
+    """What a client asked for: point budget, voxel size (m) and quantization."""
+    budget: int = 100000
+    voxel: float = 0.0
+    quant: int = POS_FLOAT16
+    colors: int = COLOR_RGB
+
+    @classmethod
+    def parse(cls, budget: int, voxel: float, quant: str, colors: str) -> 'LodParams':
+        return cls(
+            budget=int(np.clip(budget, 1, MAX_POINTS)),
+            # Round so near-identical requests share a cache entry
+            voxel=round(max(float(voxel), 0.0), 3),
+            quant=_POS_MODES.get(quant, POS_FLOAT16),
+            colors=_COLOR_MODES.get(colors, COLOR_RGB),
+        )
+
+
+def decimate(points: np.ndarray, budget: int, voxel: float) -> np.ndarray:
+    """Return indices of the points to keep: one per voxel, then a uniform stride down to budget."""
+    idx = np.arange(len(points))
+    if voxel > 0 and len(points):
+        cells = np.floor(points / voxel).astype(np.int64)
+        cells -= cells.min(axis=0)
+        dims = cells.max(axis=0) + 1
+        flat = (cells[:, 0] * dims[1] + cells[:, 1]) * dims[2] + cells[:, 2]
+        _, first = np.unique(flat, return_index=True)
+        idx = np.sort(first)
+    if len(idx) > budget:
+        idx = idx[np.linspace(0, len(idx) - 1, budget).astype(np.int64)]
+    return idx
+
+
+def _palette(colors: np.ndarray):
+    """Index colors into at most 256 entries: bucket by 3-3-2 RGB, palette entry is the bucket mean."""
+    code = (colors[:, 0] >> 5).astype(np.uint16) << 5 | (colors[:, 1] >> 5) << 2 | colors[:, 2] >> 6
+    _, inverse, counts = np.unique(code, return_inverse=True, return_counts=True)
+    inverse = inverse.reshape(-1)
+    palette = np.stack([np.bincount(inverse, weights=colors[:, c]) for c in range(3)], axis=1)
+    palette = np.round(palette / counts[:, None]).astype(np.uint8)
+    return palette, inverse.astype(np.uint8)
+
+
+def encode_frame(data, params: LodParams) -> bytes:
+    """Build one point cloud message at the requested level of detail."""
+    n = min(int(data['num_points']), len(data['points']))
+    points = data['points'][:n].astype(np.float32)
+    colors = data['colors'][:n] if 'colors' in data.dtype.names else None
+
+    keep = np.flatnonzero(np.isfinite(points).all(axis=1))
+    keep = keep[decimate(points[keep], params.budget, params.voxel)]
+    points = points[keep]
+    n = len(points)
+
+    origin = np.zeros(3, dtype=np.float32)
+    scale = 1.0
+    if params.quant == POS_INT16 and n:
+        lo, hi = points.min(axis=0), points.max(axis=0)
+        origin = (lo + hi) / 2
+        scale = max(float((hi - lo).max()) / 2 / 32767, 1e-6)
+        positions = np.round((points - origin) / scale).astype('<i2')
+    else:
+        positions = points.astype('<f2')
+
+    color_mode = COLOR_NONE if colors is None else params.colors
+    parts = [None, positions.tobytes()]
+    palette_size = 0
+    if color_mode == COLOR_RGB:
+        parts.append(colors[keep].tobytes())
+    elif color_mode == COLOR_PALETTE:
+        palette, index = _palette(colors[keep]) if n else (np.zeros((0, 3), np.uint8), np.zeros(0, np.uint8))
+        palette_size = len(palette)
+        parts += [palette.tobytes(), index.tobytes()]
+
+    parts[0] = HEADER.pack(n, params.quant, color_mode, palette_size, *origin.tolist(), scale)
+    return b''.join(parts)
+
+
+def _encode_latest(read: Callable[[Callable], Any], params: LodParams):
+    """Snapshot of the newest sample, encoded: its seq and the frame bytes."""
+    return read(lambda data: encode_frame(data, params))
+
+
+class LodCache:
+    """Encodes each (frame, parameters) pair once and shares the result between clients.
+
+    `read` is a hub reader for camera.points (see Hub.read); encoding runs in
+    a worker thread against the slot's latest sample, which may be newer than
+    the one the client asked for. Each frame is kept under the seq it asked
+    for until it is encoded, then under the seq it actually encoded.
+    """
+
+    def __init__(self):
+        self._seq: Optional[int] = None  # newest seq encoded
+        self._frames: Dict[LodParams, Tuple[int, asyncio.Future]] = {}
+
+    async def get(self, seq: int, read: Callable[[Callable], Any], params: LodParams) -> bytes:
+        cached = self._frames.get(params)
+        if cached is None or cached[0] < seq:
+            loop = asyncio.get_running_loop()
+            frame = loop.run_in_executor(None, _encode_latest, read, params)
+            frame.add_done_callback(lambda f: self._encoded(params, f))
+            cached = self._frames[params] = (seq, frame)
+        # Shielded so one client disconnecting doesn't cancel the frame for the others
+        return (await asyncio.shield(cached[1])).value
+
+    def _encoded(self, params: LodParams, frame: asyncio.Future):
+        cached = self._frames.get(params)
+        if cached is None or cached[1] is not frame:
+            return
+        if frame.cancelled() or frame.exception() is not None or frame.result() is None:
+            del self._frames[params]
+            return
+        seq = frame.result().seq
+        self._frames[params] = (seq, frame)
+        if self._seq is None or seq > self._seq:
+            # A client still on an older frame gets the current one, which is newer anyway
+            self._seq = seq
+            self._frames = {p: c for p, c in self._frames.items() if c[0] >= seq or not c[1].done()}
@@ -0,0 +1,146 @@
+"""Process index for daemon and app status checks.
+
+Instead of walking the process table once per daemon, the index tracks the
+set of live PIDs and only classifies processes it has not seen before
+(daemon, app, or neither), so status lookups are dictionary reads. A process
+is known by (pid, create time), so a reused PID is classified afresh, and
+young processes are reclassified if their command line changes (a fork that
+has not exec'd yet looks like its parent). Per-name history gives PID, uptime
+and restart counts.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+import psutil
+
+# Processes younger than this get their command line checked on every refresh
+RECHECK_S = 10.0
+
+
+class _Entry:
+    """Live processes and lifecycle history for one daemon or app."""
+
+    __slots__ = ('pids', 'started', 'restarts', 'seen')
+
+    def __init__(self):
+        self.pids: Dict[int, float] = {}  # pid -> create time
+        self.started = 0.0
+        self.restarts = 0
+        self.seen = False
+
+
+def classify(cmdline: List[str], daemons: Set[str]) -> Optional[str]:
+    """Return 'daemon:<name>' / 'app:<name>' for a command line, or None."""
+    joined = ' '.join(cmdline)
+    if 'daemon.py' in joined:
+        for arg in cmdline:
+            if arg.endswith('daemon.py'):
+                parent = os.path.basename(os.path.dirname(arg))
+                if parent in daemons:
+                    return f'daemon:{parent}'
+        for name in daemons:
+            if name in joined:
+                return f'daemon:{name}'
+        return None
+    for arg in cmdline:
+        if arg.endswith('.py'):
+            stem = os.path.splitext(os.path.basename(arg))[0]
+            if stem == 'main':
+                stem = os.path.basename(os.path.dirname(arg)) or stem
+            return f'app:{stem}'
+    return None
+
+
+class ProcessIndex:
+    """Incrementally refreshed map of daemon/app name -> live processes."""
+
+    def __init__(self, daemons: Iterable[str], min_interval: float = 1.0):
+        self.daemons = set(daemons)
+        self.min_interval = min_interval
+        self._lock = threading.Lock()
+        self._known: Dict[int, Tuple[float, List[str], Optional[str]]] = {}  # pid -> (created, cmdline, key)
+        self._entries: Dict[str, _Entry] = {}
+        self._refreshed = 0.0
+
+    def refresh(self, force: bool = False):
+        """Sync with the process table; only new, reused and young PIDs are classified again."""
+        with self._lock:
+            if not force and time.monotonic() - self._refreshed < self.min_interval:
+                return
+            pids = set(psutil.pids())
+            for pid in self._known.keys() - pids:
+                self._forget(pid)
+            now = time.time()
+            for pid in pids:
+                known = self._known.get(pid)
+                try:
+                    proc = psutil.Process(pid)
+                    created = proc.create_time()
+                    if known is not None and known[0] == created and (
+                            now - created >= RECHECK_S or proc.cmdline() == known[1]):
+                        continue
+                    cmdline = proc.cmdline()
+                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                    if known is None:
+                        self._known[pid] = (0.0, [], None)
+                    continue
+                if known is not None:
+                    self._forget(pid)
+                self._add(pid, created, cmdline)
+            self._refreshed = time.monotonic()
+
+    def _forget(self, pid: int):
+        _, _, key = self._known.pop(pid)
+        if key is not None:
+            self._entries[key].pids.pop(pid, None)
+
+    def _add(self, pid: int, created: float, cmdline: List[str]):
+        key = classify(cmdline, self.daemons)
+        self._known[pid] = (created, cmdline, key)
+        if key is None:
+            return
+        entry = self._entries.setdefault(key, _Entry())
+        if not entry.pids:
+            if entry.seen:
+                entry.restarts += 1
+            entry.started = created
+        entry.seen = True
+        entry.pids[pid] = created
+
+    def status(self, key: str) -> Dict[str, Any]:
+        with self._lock:
+            return self._status(key)
+
+    def _status(self, key: str) -> Dict[str, Any]:
+        entry = self._entries.get(key)
+        if entry is None or not entry.pids:
+            return {
+                'status': 'stopped',
+                'pid': None,
+                'started': None,
+                'uptime': 0.0,
+                'restarts': entry.restarts if entry else 0,
+            }
+        pid = min(entry.pids, key=entry.pids.get)
+        return {
+            'status': 'running',
+            'pid': pid,
+            'pids': sorted(entry.pids),
+            'started': entry.started,
+            'uptime': time.time() - entry.started,
+            'restarts': entry.restarts,
+        }
+
+    def daemon(self, name: str) -> Dict[str, Any]:
+        return self.status(f'daemon:{name}')
+
+    def app(self, name: str) -> Dict[str, Any]:
+        return self.status(f'app:{name}')
+
+    def apps(self) -> Dict[str, Dict[str, Any]]:
+        """Status of every app seen since startup."""
+        with self._lock:
+            return {key[4:]: self._status(key) for key in self._entries if key.startswith('app:')}
@@ -0,0 +1,587 @@
+"""Shared-memory transport for multi-process Flow (FLOW_WORKERS > 1).
+
+A single ingest process owns the Readers and publishes into POSIX shared
+memory; N uvicorn worker processes map the same segments and serve clients
+from them, so encoding for viewers runs on other cores than ingestion.
+
+Segments, all named after a per-run prefix passed to the workers in
+FLOW_SHM_PREFIX:
+
+* `<prefix>-control`: the worker table (one pid per claimed slot) and one
+  entry per writer holding the slot seqlock (`begin`/`seq`), receive times,
+  the dtype descr and generation of the data and history segments, the
+  open/release state of the reader, and one demand counter per worker.
+* `<prefix>-data-<writer>-<gen>`: the latest sample, double buffered under the
+  seqlock (a worker copies a sample at most once, for clients that hold on
+  to it). A new generation is created if the dtype changes.
+* `<prefix>-hist-<writer>-<gen>`: a HistoryRing's samples and times.
+* `<prefix>-audio-<writer>`: an AudioAnalyzer's rings.
+* `<prefix>-telemetry`: the Telemetry counter table (see telemetry.py).
+* `<prefix>-system`, `<prefix>-governor`: the SystemSampler ring and the
+  Governor state. Only the ingest process samples and governs; workers read.
+* `<prefix>-ingest`: the ingest engine's stats as JSON, refreshed by the
+  ingest process every DEMAND_POLL_S under the same kind of seqlock.
+
+Workers read samples in place through numpy views (no copies or pickling)
+and find new ones by polling sequence numbers while they have subscribers.
+
+Seqlocks: the writer bumps `begin`, writes the payload, then sets `seq`; a
+reader loads `seq`, copies out what it needs, then checks `begin` to see that
+no write started meanwhile. The counters are 8-byte aligned (aligned dtypes),
+so numpy loads and stores them with single instructions, which are atomic on
+x86-64 and ARMv8. numpy issues no memory barriers, so `_fence()` separates the
+counter accesses from the payload on both sides.
+Each worker only ever writes its own demand column; the ingest process sums
+the columns of live workers to open and close readers with a grace period.
+"""
+
+import ast
+import fcntl
+import json
+import os
+import tempfile
+import threading
+import time
+from multiprocessing.shared_memory import SharedMemory
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+import asyncio
+import numpy as np
+
+from hub import Lease, Snapshot, Subscription
+from history import HistoryRing
+
+PREFIX_ENV = 'FLOW_SHM_PREFIX'
+MAX_WORKERS = 32
+DESCR_BYTES = 4096
+POLL_S = float(os.environ.get('FLOW_SHM_POLL_MS', '2')) / 1000.0
+DEMAND_POLL_S = 0.25
+INGEST_STATS_BYTES = 64 << 10
+
+# Aligned: 8-byte fields first, and numpy pads the rest (see the seqlock note above)
+ENTRY_DTYPE = np.dtype([
+    ('seq', '<u8'),
+    ('begin', '<u8'),
+    ('recv_time', '<f8', (2,)),
+    ('release_at', '<f8'),
+    ('hist_count', '<u8', (1,)),
+    ('gen', '<u4'),
+    ('hist_gen', '<u4'),
+    ('hist_capacity', '<u4'),
+    ('demand', '<i4', (MAX_WORKERS,)),
+    ('open', 'u1'),
+    ('descr', f'S{DESCR_BYTES}'),
+    ('hist_descr', f'S{DESCR_BYTES}'),
+], align=True)
+
+
+INGEST_STATS_DTYPE = np.dtype([
+    ('seq', '<u8'),
+    ('begin', '<u8'),
+    ('length', '<u8'),
+    ('json', 'S1', (INGEST_STATS_BYTES,)),
+], align=True)
+
+
+def _control_dtype(n: int) -> np.dtype:
+    return np.dtype([('workers', '<i4', (MAX_WORKERS,)), ('entries', ENTRY_DTYPE, (n,))], align=True)
+
+
+_barrier = threading.local()
+
+
+def _fence():
+    """Full memory barrier between the surrounding loads and stores.
+
+    Releasing and re-acquiring a lock is a store-release followed by an
+    acquiring read-modify-write, which neither the compiler nor the CPU
+    reorders other memory accesses across. The lock is per thread, so this
+    never blocks.
+    """
+    lock = getattr(_barrier, 'lock', None)
+    if lock is None:
+        lock = _barrier.lock = threading.Lock()
+        lock.acquire()
+    lock.release()
+    lock.acquire()
+
+
+def _attach(name: str) -> SharedMemory:
+    """Map an existing segment.
+
+    uvicorn starts workers through multiprocessing, so they share the ingest
+    process's resource tracker: attaching does not add a second owner and the
+    segments are unlinked once, by the ingest process.
+    """
+    return SharedMemory(name=name)
+
+
+def _descr(dtype: np.dtype) -> bytes:
+    raw = str(dtype.descr).encode()
+    if len(raw) > DESCR_BYTES:
+        raise ValueError(f"dtype description too long for shared memory ({len(raw)} bytes)")
+    return raw
+
+
+def _dtype(raw: bytes) -> np.dtype:
+    return np.dtype(ast.literal_eval(raw.decode()))
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _double_buffer(buf, dtype: np.dtype):
+    return tuple(np.ndarray((), dtype=dtype, buffer=buf, offset=i * dtype.itemsize) for i in range(2))
+
+
+def _history_views(buf, dtype: np.dtype, capacity: int):
+    samples = np.ndarray((capacity,), dtype=dtype, buffer=buf)
+    offset = -(-samples.nbytes // 8) * 8
+    times = np.ndarray((capacity,), dtype=np.float64, buffer=buf, offset=offset)
+    return samples, times
+
+
+def _history_size(dtype: np.dtype, capacity: int) -> int:
+    return -(-dtype.itemsize * capacity // 8) * 8 + 8 * capacity
+
+
+class _Control:
+    """Views of the control segment shared by both sides."""
+
+    def __init__(self, shm: SharedMemory, writers: List[str]):
+        self.shm = shm
+        self.writers = writers
+        self.index = {w: i for i, w in enumerate(writers)}
+        control = np.ndarray((), dtype=_control_dtype(len(writers)), buffer=shm.buf)
+        self.workers = control['workers']
+        self.entries = control['entries']
+        self.lock_path = os.path.join(tempfile.gettempdir(), f'{shm.name.lstrip("/")}.lock')
+
+    def locked(self):
+        """Exclusive lock for the worker table (a file lock, so it works across unrelated processes)."""
+        return _FileLock(self.lock_path)
+
+
+class _FileLock:
+    def __init__(self, path: str):
+        self.path = path
+
+    def __enter__(self):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        fcntl.flock(self.fd, fcntl.LOCK_EX)
+        return self
+
+    def __exit__(self, *exc):
+        fcntl.flock(self.fd, fcntl.LOCK_UN)
+        os.close(self.fd)
+
+
+class ShmPublisher:
+    """Ingest-process side: publishes samples, history and reader state.
+
+    Stands in for the Hub in the ingest process (`publish`, `pin`,
+    `on_demand`), and allocates history rings and audio state in shared memory.
+    """
+
+    def __init__(self, prefix: str, writers: Iterable[str], grace: float = 10.0,
+                 on_demand: Optional[Callable[[str, bool], None]] = None):
+        self.prefix = prefix
+        self.grace = grace
+        self.on_demand = on_demand
+        self.on_worker_exit: Optional[Callable[[int], None]] = None
+        self.ingest_stats: Optional[Callable[[], Dict[str, Any]]] = None
+        writers = list(writers)
+        size = _control_dtype(len(writers)).itemsize
+        self._created: List[SharedMemory] = []
+        self.control = _Control(self._create(f'{prefix}-control', size), writers)
+        self._stats = np.ndarray((), dtype=INGEST_STATS_DTYPE,
+                                 buffer=self._create(f'{prefix}-ingest', INGEST_STATS_DTYPE.itemsize).buf)
+        self._buffers: Dict[str, tuple] = {}
+        self._pinned: Set[str] = set()
+        self._active: Set[str] = set()
+        self._release: Dict[str, float] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def _create(self, name: str, size: int) -> SharedMemory:
+        shm = SharedMemory(name=name, create=True, size=max(size, 1))
+        self._created.append(shm)
+        return shm
+
+    def _retire(self, name: str):
+        """Unlink an outdated segment; workers still mapping it keep a valid mapping."""
+        for shm in self._created:
+            if shm.name.lstrip('/') == name:
+                self._created.remove(shm)
+                shm.close()
+                shm.unlink()
+                return
+
+    def __contains__(self, writer: str) -> bool:
+        return writer in self.control.index
+
+    def publish(self, writer: str, data: Any):
+        """Copy a sample into the writer's shared double buffer (ingest thread)."""
+        i = self.control.index[writer]
+        entries = self.control.entries
+        buffers = self._buffers.get(writer)
+        if buffers is None or buffers[0].dtype != data.dtype:
+            buffers = self._allocate(writer, data.dtype)
+        seq = int(entries['seq'][i])
+        half = (seq + 1) & 1
+        entries['begin'][i] = seq + 1
+        _fence()
+        buffers[half][()] = data
+        entries['recv_time'][i, half] = time.time()
+        _fence()
+        entries['seq'][i] = seq + 1
+
+    def _allocate(self, writer: str, dtype: np.dtype):
+        i = self.control.index[writer]
+        entries = self.control.entries
+        gen = int(entries['gen'][i])
+        if gen:
+            self._retire(f'{self.prefix}-data-{writer}-{gen}')
+        shm = self._create(f'{self.prefix}-data-{writer}-{gen + 1}', 2 * dtype.itemsize)
+        entries['descr'][i] = _descr(dtype)
+        entries['gen'][i] = gen + 1
+        buffers = self._buffers[writer] = _double_buffer(shm.buf, dtype)
+        return buffers
+
+    def history_ring(self, writer: str, dtype: np.dtype, capacity: int) -> HistoryRing:
+        """HistoryStore allocator placing the ring in shared memory."""
+        i = self.control.index[writer]
+        entries = self.control.entries
+        gen = int(entries['hist_gen'][i])
+        if gen:
+            self._retire(f'{self.prefix}-hist-{writer}-{gen}')
+        shm = self._create(f'{self.prefix}-hist-{writer}-{gen + 1}', _history_size(dtype, capacity))
+        samples, times = _history_views(shm.buf, dtype, capacity)
+        counter = entries['hist_count'][i]
+        counter[0] = 0
+        entries['hist_descr'][i] = _descr(dtype)
+        entries['hist_capacity'][i] = capacity
+        entries['hist_gen'][i] = gen + 1
+        return HistoryRing(writer, dtype, capacity, samples, times, counter)
+
+    def audio_buffer(self, writer: str, nbytes: int):
+        return self._create(f'{self.prefix}-audio-{writer}', nbytes).buf
+
+    def telemetry_buffer(self, nbytes: int):
+        return self._create(f'{self.prefix}-telemetry', nbytes).buf
+
+    def system_buffer(self, nbytes: int):
+        return self._create(f'{self.prefix}-system', nbytes).buf
+
+    def governor_buffer(self, nbytes: int):
+        return self._create(f'{self.prefix}-governor', nbytes).buf
+
+    def publish_stats(self):
+        """Copy the ingest engine's stats where workers can serve them."""
+        raw = json.dumps(self.ingest_stats()).encode()[:INGEST_STATS_BYTES]
+        stats = self._stats
+        seq = int(stats['seq'])
+        stats['begin'] = seq + 1
+        _fence()
+        stats['json'][:len(raw)] = np.frombuffer(raw, dtype='S1')
+        stats['length'] = len(raw)
+        _fence()
+        stats['seq'] = seq + 1
+
+    def pin(self, writer: str):
+        self._pinned.add(writer)
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='flow-demand', daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(DEMAND_POLL_S):
+            try:
+                self.update_demand()
+                if self.ingest_stats is not None:
+                    self.publish_stats()
+            except Exception as e:
+                print(f"Error updating reader demand: {e}")
+
+    def update_demand(self):
+        """Sum live workers' demand and open/close readers, releasing after the grace period."""
+        control = self.control
+        with control.locked():
+            for slot, pid in enumerate(control.workers):
+                if pid and not _alive(int(pid)):
+                    control.workers[slot] = 0
+                    control.entries['demand'][:, slot] = 0
+                    if self.on_worker_exit is not None:
+                        self.on_worker_exit(slot)
+        totals = control.entries['demand'].sum(axis=1)
+        now = time.time()
+        for writer, i in control.index.items():
+            if totals[i] > 0 or writer in self._pinned:
+                self._release.pop(writer, None)
+                control.entries['release_at'][i] = 0
+                if writer not in self._active:
+                    self._active.add(writer)
+                    control.entries['open'][i] = 1
+                    if self.on_demand is not None:
+                        self.on_demand(writer, True)
+            elif writer in self._active:
+                release = self._release.setdefault(writer, now + self.grace)
+                control.entries['release_at'][i] = release
+                if now >= release:
+                    del self._release[writer]
+                    self._active.discard(writer)
+                    control.entries['open'][i] = 0
+                    control.entries['release_at'][i] = 0
+                    if self.on_demand is not None:
+                        self.on_demand(writer, False)
+
+    def close(self):
+        """Stop the demand thread and unlink every segment and the worker table lock."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self._buffers.clear()
+        try:
+            os.unlink(self.control.lock_path)
+        except FileNotFoundError:
+            pass
+        self.control = None
+        self._stats = None
+        for shm in self._created:
+            try:
+                shm.close()
+            except BufferError:
+                pass  # numpy views still alive; the name is unlinked regardless
+            shm.unlink()
+        self._created.clear()
+
+
+class _SharedSlot:
+    """Worker-side view of one writer's slot, with the same read API as hub._Slot."""
+
+    def __init__(self, state: 'ShmState', writer: str):
+        self.state = state
+        self.writer = writer
+        self.i = state.control.index[writer]
+        self.waiters: Set[asyncio.Event] = set()
+        self.notified = 0
+        self._gen = 0
+        self._shm: Optional[SharedMemory] = None
+        self._buffers = None
+        self._copy: Optional[Snapshot] = None
+
+    @property
+    def seq(self) -> int:
+        return int(self.state.control.entries['seq'][self.i])
+
+    def _map(self):
+        entries = self.state.control.entries
+        gen = int(entries['gen'][self.i])
+        if gen != self._gen:
+            dtype = _dtype(bytes(entries['descr'][self.i]))
+            self._shm = _attach(f'{self.state.prefix}-data-{self.writer}-{gen}')
+            self._buffers = _double_buffer(self._shm.buf, dtype)
+            self._gen = gen
+        return self._buffers
+
+    def read(self, fn: Callable[[Any], Any]) -> Optional[Snapshot]:
+        entries = self.state.control.entries
+        while True:
+            seq = int(entries['seq'][self.i])
+            if seq == 0:
+                return None
+            _fence()
+            buffers = self._map()
+            recv_time = float(entries['recv_time'][self.i, seq & 1])
+            value = fn(buffers[seq & 1])
+            _fence()
+            # The other half is being written until begin reaches seq + 2
+            if int(entries['begin'][self.i]) - seq < 2:
+                return Snapshot(seq, recv_time, value)
+
+    def borrow(self) -> Optional[Lease]:
+        """A copy of the newest sample, since the shared double buffer cannot be held across writes.
+
+        The copy is made once per seq and shared by every lease in this worker;
+        read() runs `fn` in place instead and is preferred where it fits.
+        """
+        if self._copy is None or self._copy.seq != self.seq:
+            snap = self.read(lambda data: data.copy())
+            if snap is None:
+                return None
+            self._copy = snap
+        return Lease(*self._copy)
+
+
+class SharedHub:
+    """Worker-side stand-in for Hub, backed by the ingest process's segments."""
+
+    def __init__(self, state: 'ShmState'):
+        self.state = state
+        self._slots: Dict[str, _SharedSlot] = {w: _SharedSlot(state, w) for w in state.control.writers}
+        self._refs: Dict[str, int] = {w: 0 for w in self._slots}
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._poller: Optional[asyncio.Task] = None
+        self._wake: Optional[asyncio.Event] = None
+
+    def __contains__(self, writer: str) -> bool:
+        return writer in self._slots
+
+    def bind(self, loop: asyncio.AbstractEventLoop):
+        self._loop = loop
+        self._wake = asyncio.Event()
+        self._poller = loop.create_task(self._poll())
+
+    async def _poll(self):
+        """Wake subscribers whose slot sequence moved; sleeps while nobody is subscribed."""
+        while True:
+            watched = [slot for slot in self._slots.values() if slot.waiters]
+            if not watched:
+                self._wake.clear()
+                await self._wake.wait()
+                continue
+            for slot in watched:
+                seq = slot.seq
+                if seq != slot.notified:
+                    slot.notified = seq
+                    for event in slot.waiters:
+                        event.set()
+            await asyncio.sleep(POLL_S)
+
+    def read(self, writer: str, fn: Callable[[Any], Any]) -> Optional[Snapshot]:
+        return self._slots[writer].read(fn)
+
+    def subscribe(self, writer: str) -> Subscription:
+        sub = Subscription(self, writer)
+        if self._wake is not None:
+            self._wake.set()
+        return sub
+
+    def acquire(self, writer: str):
+        self._refs[writer] += 1
+        self.state.control.entries['demand'][self._slots[writer].i, self.state.slot] += 1
+
+    def release(self, writer: str):
+        self._refs[writer] -= 1
+        self.state.control.entries['demand'][self._slots[writer].i, self.state.slot] -= 1
+
+    def borrow(self, writer: str) -> Optional[Lease]:
+        return self._slots[writer].borrow()
+
+    def pools(self) -> Dict[str, Dict[str, Any]]:
+        return {}  # slab pools live in the ingest process
+
+    def demand(self) -> Dict[str, Dict[str, Any]]:
+        entries = self.state.control.entries
+        now = time.time()
+        out = {}
+        for writer, slot in self._slots.items():
+            release_at = float(entries['release_at'][slot.i])
+            out[writer] = {
+                'refs': self._refs[writer],
+                'refs_all_workers': int(entries['demand'][slot.i].sum()),
+                'active': bool(entries['open'][slot.i]),
+                'open': bool(entries['open'][slot.i]),
+                'release_in': max(release_at - now, 0.0) if release_at else None,
+                'seq': slot.seq,
+            }
+        return out
+
+
+class SharedHistory:
+    """Worker-side stand-in for HistoryStore, mapping the ingest process's rings."""
+
+    def __init__(self, state: 'ShmState'):
+        self.state = state
+        self._rings: Dict[str, tuple] = {}  # writer -> (gen, shm, ring)
+
+    def get(self, writer: str) -> Optional[HistoryRing]:
+        control = self.state.control
+        i = control.index.get(writer)
+        if i is None:
+            return None
+        gen = int(control.entries['hist_gen'][i])
+        if gen == 0:
+            return None
+        cached = self._rings.get(writer)
+        if cached is None or cached[0] != gen:
+            dtype = _dtype(bytes(control.entries['hist_descr'][i]))
+            capacity = int(control.entries['hist_capacity'][i])
+            shm = _attach(f'{self.state.prefix}-hist-{writer}-{gen}')
+            samples, times = _history_views(shm.buf, dtype, capacity)
+            ring = HistoryRing(writer, dtype, capacity, samples, times, control.entries['hist_count'][i])
+            cached = self._rings[writer] = (gen, shm, ring)
+        return cached[2]
+
+    def stats(self) -> Dict[str, Any]:
+        out = {}
+        for writer in self.state.control.writers:
+            ring = self.get(writer)
+            if ring is not None:
+                out[writer] = {'capacity': ring.capacity, 'count': ring.count, 'bytes': ring.samples.nbytes}
+        return out
+
+
+class ShmState:
+    """A worker's attachment to the shared segments, holding one worker slot."""
+
+    def __init__(self, prefix: str, writers: Iterable[str]):
+        self.prefix = prefix
+        self.control = _Control(_attach(f'{prefix}-control'), list(writers))
+        self.slot = self._claim()
+        self.hub = SharedHub(self)
+        self.history = SharedHistory(self)
+        self._attached: List[SharedMemory] = []
+        self._stats_shm = _attach(f'{prefix}-ingest')
+        self._stats = np.ndarray((), dtype=INGEST_STATS_DTYPE, buffer=self._stats_shm.buf)
+
+    def _claim(self) -> int:
+        with self.control.locked():
+            for slot, pid in enumerate(self.control.workers):
+                if pid == 0 or not _alive(int(pid)):
+                    self.control.entries['demand'][:, slot] = 0
+                    self.control.workers[slot] = os.getpid()
+                    return slot
+        raise RuntimeError(f"More than {MAX_WORKERS} Flow workers")
+
+    def audio_buffer(self, writer: str):
+        return self._buffer(f'audio-{writer}')
+
+    def telemetry_buffer(self):
+        return self._buffer('telemetry')
+
+    def system_buffer(self):
+        return self._buffer('system')
+
+    def governor_buffer(self):
+        return self._buffer('governor')
+
+    def _buffer(self, name: str):
+        shm = _attach(f'{self.prefix}-{name}')
+        self._attached.append(shm)
+        return shm.buf
+
+    def ingest_stats(self) -> Dict[str, Any]:
+        """The ingest engine's stats as last published by the ingest process."""
+        stats = self._stats
+        while True:
+            seq = int(stats['seq'])
+            _fence()
+            raw = stats['json'][:int(stats['length'])].tobytes()
+            _fence()
+            if int(stats['begin']) == seq:
+                return json.loads(raw) if raw else {}
+
+    def close(self):
+        """Give up the worker slot and its demand."""
+        with self.control.locked():
+            self.control.entries['demand'][:, self.slot] = 0
+            self.control.workers[self.slot] = 0
@@ -0,0 +1,160 @@
+"""Background system metrics sampler for the Flow dashboard.
+
+A daemon thread samples CPU, memory, swap, load and the top processes at a
+fixed rate into a preallocated numpy ring buffer, so /api/system answers
+from the latest row instantly and /api/system/history can return minutes of
+data without ever blocking the event loop. With several server processes the
+ring is moved into shared memory (`share()`): one process samples and the
+others only read.
+"""
+
+import os
+import threading
+import time
+from typing import Any, Dict
+
+import numpy as np
+import psutil
+
+TOP_N = 5
+
+SAMPLE_DTYPE = np.dtype([
+    ('time', '<f8'),
+    ('cpu_percent', '<f4'),
+    ('cpu_count', '<u2'),
+    ('mem_total', '<u8'),
+    ('mem_used', '<u8'),
+    ('mem_percent', '<f4'),
+    ('swap_total', '<u8'),
+    ('swap_used', '<u8'),
+    ('swap_percent', '<f4'),
+    ('load_avg', '<f4', (3,)),
+    ('top_pid', '<i4', (TOP_N,)),
+    ('top_name', 'S32', (TOP_N,)),
+    ('top_cpu', '<f4', (TOP_N,)),
+])
+
+
+class SystemSampler:
+    """Samples system metrics on a background thread into a ring buffer."""
+
+    def __init__(self, rate_hz: float = 1.0, history_s: float = 600.0):
+        self.period = 1.0 / max(rate_hz, 1e-3)
+        self._bind(np.zeros((), dtype=np.dtype([
+            ('count', '<u8'),
+            ('ring', SAMPLE_DTYPE, (max(int(history_s * rate_hz), 1),)),
+        ], align=True)))
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _bind(self, state: np.ndarray):
+        self._state = state
+        self._ring = state['ring']
+
+    @property
+    def _count(self) -> int:
+        return int(self._state['count'])
+
+    @property
+    def nbytes(self) -> int:
+        return self._state.nbytes
+
+    def share(self, buffer, init: bool = True):
+        """Move the ring into `buffer` (e.g. shared memory), copying it if `init`."""
+        state = np.ndarray((), dtype=self._state.dtype, buffer=buffer)
+        if init:
+            state[()] = self._state
+        self._bind(state)
+
+    def start(self):
+        """Take the first sample now, so latest() has data at once, then sample in the background."""
+        if self._thread is None:
+            # A short CPU measurement (as /api/system always made) primes the first sample
+            psutil.cpu_percent(interval=0.1)
+            try:
+                self._sample()
+            except Exception as e:
+                print(f"Error sampling system metrics: {e}")
+            self._thread = threading.Thread(target=self._run, name='flow-system', daemon=True)
+            self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.period):
+            try:
+                self._sample()
+            except Exception as e:
+                print(f"Error sampling system metrics: {e}")
+
+    def _sample(self):
+        processes = []
+        for proc in psutil.process_iter(['pid', 'name', 'cpu_percent']):
+            pinfo = proc.info
+            if pinfo['cpu_percent']:
+                processes.append((pinfo['cpu_percent'], pinfo['pid'], pinfo['name'] or ''))
+        processes.sort(reverse=True)
+        top = processes[:TOP_N]
+
+        memory = psutil.virtual_memory()
+        swap = psutil.swap_memory()
+        with self._lock:
+            row = self._ring[self._count % len(self._ring)]
+            row['time'] = time.time()
+            row['cpu_percent'] = psutil.cpu_percent(interval=None)
+            row['cpu_count'] = psutil.cpu_count() or 0
+            row['mem_total'], row['mem_used'], row['mem_percent'] = memory.total, memory.used, memory.percent
+            row['swap_total'], row['swap_used'], row['swap_percent'] = swap.total, swap.used, swap.percent
+            row['load_avg'] = os.getloadavg()
+            row['top_pid'] = [p[1] for p in top] + [0] * (TOP_N - len(top))
+            row['top_name'] = [p[2].encode()[:32] for p in top] + [b''] * (TOP_N - len(top))
+            row['top_cpu'] = [p[0] for p in top] + [0.0] * (TOP_N - len(top))
+            # Counted last, so readers in other processes never see a half-written row
+            self._state['count'] += 1
+
+    def latest(self) -> Dict[str, Any]:
+        """The newest sample in the same shape /api/system has always returned."""
+        with self._lock:
+            if self._count == 0:
+                return {}
+            row = self._ring[(self._count - 1) % len(self._ring)].copy()
+        return {
+            'time': float(row['time']),
+            'cpu': {
+                'percent': round(float(row['cpu_percent']), 2),
+                'count': int(row['cpu_count'])
+            },
+            'memory': {
+                'total': int(row['mem_total']),
+                'used': int(row['mem_used']),
+                'percent': round(float(row['mem_percent']), 2)
+            },
+            'swap': {
+                'total': int(row['swap_total']),
+                'used': int(row['swap_used']),
+                'percent': round(float(row['swap_percent']), 2)
+            },
+            'load_avg': row['load_avg'].astype(float).round(2).tolist(),
+            'top_processes': [
+                {'pid': int(pid), 'name': name.decode(errors='replace'), 'cpu': round(float(cpu), 2)}
+                for pid, name, cpu in zip(row['top_pid'], row['top_name'], row['top_cpu']) if pid
+            ]
+        }
+
+    def history(self, seconds: float) -> Dict[str, Any]:
+        """Column-oriented samples from the last `seconds`, oldest first."""
+        with self._lock:
+            n = min(self._count, len(self._ring))
+            start = self._count - n
+            rows = np.roll(self._ring, -(start % len(self._ring)))[:n]
+        rows = rows[rows['time'] >= time.time() - seconds]
+        return {
+            'time': rows['time'].tolist(),
+            'cpu_percent': rows['cpu_percent'].astype(float).round(2).tolist(),
+            'mem_percent': rows['mem_percent'].astype(float).round(2).tolist(),
+            'mem_used': rows['mem_used'].tolist(),
+            'swap_percent': rows['swap_percent'].astype(float).round(2).tolist(),
+            'load_avg': rows['load_avg'].astype(float).round(2).tolist(),
+        }
@@ -0,0 +1,500 @@
+"""Throughput, latency and drop telemetry for Flow streams.
+
+Counters are kept per writer for ingest and per (writer, stream) for sends,
+where the stream is how the writer reaches clients: `writer`, `audio`,
+`points` or `mjpeg`. Every connected client also has its own live counters.
+
+* samples in: samples handed to the hub by the ingest thread
+* dropped at ingest: samples the writer published that Flow never read,
+  estimated from gaps in the sample `timestamp` against the writer period
+  (gaps longer than MAX_GAP_S are treated as the writer pausing)
+* sent / skipped: samples sent to clients, and samples a client never saw
+  because it was still sending an older one
+* bytes and bytes/s sent
+* age at send: now minus the sample `timestamp` (the hub receive time for
+  writers without one), as a histogram
+
+`snapshot()` backs /api/stats and `prometheus()` backs /metrics.
+
+With several worker processes (see shm.py) the counters also go into a shared
+table (`share()`): the ingest process writes the ingest counters and writer
+periods, each worker adds its send counters to its own slot, and snapshots sum
+all slots, so any worker answers for the whole server. Per-client counters
+stay with the worker serving the client.
+"""
+
+import itertools
+import math
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+AGE_BUCKETS_S = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+RATE_WINDOW_S = 5.0
+MAX_GAP_S = 2.0
+
+# Streams with a row in the shared table
+STREAMS = ('writer', 'audio', 'points', 'mjpeg')
+
+INGEST_DTYPE = np.dtype([
+    ('samples', '<u8'),
+    ('dropped', '<u8'),
+    ('rate', '<f8'),
+    ('rate_time', '<f8'),  # time.monotonic() of the last rate update
+    ('period', '<f8'),
+])
+
+OUTPUT_DTYPE = np.dtype([
+    ('clients', '<i8'),
+    ('sent', '<u8'),
+    ('skipped', '<u8'),
+    ('lagged', '<u8'),
+    ('bytes', '<u8'),
+    ('rate', '<f8'),
+    ('rate_time', '<f8'),
+    ('age_counts', '<u8', (len(AGE_BUCKETS_S) + 1,)),
+    ('age_sum', '<f8'),
+])
+
+
+def shared_dtype(n_writers: int, n_slots: int) -> np.dtype:
+    """Shared table: ingest counters per writer, send counters per worker slot, writer and stream."""
+    return np.dtype([
+        ('ingest', INGEST_DTYPE, (n_writers,)),
+        ('outputs', OUTPUT_DTYPE, (n_slots, n_writers, len(STREAMS))),
+    ])
+
+
+def sample_time(data: Any) -> Optional[float]:
+    """Sample `timestamp` field as epoch seconds, if the dtype has one."""
+    names = data.dtype.names
+    if not names or 'timestamp' not in names:
+        return None
+    ts = data['timestamp']
+    if ts.dtype.kind == 'M':
+        ns = int(ts.astype('datetime64[ns]').astype(np.int64))
+        return ns / 1e9 if ns > 0 else None
+    if ts.dtype.kind == 'f':
+        return float(ts) or None
+    return None
+
+
+class Histogram:
+    """Fixed-bucket histogram with Prometheus `le` semantics."""
+
+    def __init__(self, buckets=AGE_BUCKETS_S):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def bucket(self, value: float) -> int:
+        i = 0
+        while i < len(self.buckets) and value > self.buckets[i]:
+            i += 1
+        return i
+
+    def observe(self, value: float):
+        self.counts[self.bucket(value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def cumulative(self) -> List[Tuple[str, int]]:
+        bounds = [repr(b) for b in self.buckets] + ['+Inf']
+        return list(zip(bounds, itertools.accumulate(self.counts)))
+
+    def quantile(self, q: float) -> Optional[float]:
+        """Upper bucket bound containing quantile q (None when empty)."""
+        if not self.count:
+            return None
+        target = q * self.count
+        for bound, total in zip(self.buckets, itertools.accumulate(self.counts)):
+            if total >= target:
+                return bound
+        return math.inf
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'count': self.count,
+            'mean': self.sum / self.count if self.count else None,
+            'p50': self.quantile(0.5),
+            'p90': self.quantile(0.9),
+            'p99': self.quantile(0.99),
+            'buckets': dict(self.cumulative()),
+        }
+
+
+def _decayed(value: float, last: float, now: float) -> float:
+    return value * math.exp(-(now - last) / RATE_WINDOW_S)
+
+
+class _Rate:
+    """Exponentially decaying per-second rate."""
+
+    __slots__ = ('value', 'last')
+
+    def __init__(self):
+        self.value = 0.0
+        self.last = time.monotonic()
+
+    def _decay(self, now: float):
+        self.value = _decayed(self.value, self.last, now)
+        self.last = now
+
+    def add(self, n: float):
+        self._decay(time.monotonic())
+        self.value += n
+
+    def per_second(self) -> float:
+        self._decay(time.monotonic())
+        return self.value / RATE_WINDOW_S
+
+
+class _Ingest:
+    __slots__ = ('samples', 'dropped', 'last_time', 'rate')
+
+    def __init__(self):
+        self.samples = 0
+        self.dropped = 0
+        self.last_time: Optional[float] = None
+        self.rate = _Rate()
+
+
+class _Output:
+    """Send counters for one (writer, stream), including closed clients.
+
+    `row` is this worker's (slot, writer, stream) index into the shared output
+    table, if any: every change is added there too.
+    """
+
+    __slots__ = ('sent', 'skipped', 'lagged', 'bytes', 'rate', 'age', 'clients', 'table', 'row')
+
+    def __init__(self, table: Optional[np.ndarray] = None, row: Optional[Tuple[int, int, int]] = None):
+        self.sent = 0
+        self.skipped = 0
+        self.lagged = 0
+        self.bytes = 0
+        self.rate = _Rate()
+        self.age = Histogram()
+        self.clients = 0
+        self.table = table
+        self.row = row
+
+    def add_clients(self, n: int):
+        self.clients += n
+        if self.row is not None:
+            self.table['clients'][self.row] += n
+
+    def add_sample(self, skipped: int, age: float):
+        self.sent += 1
+        self.skipped += skipped
+        i = self.age.bucket(age)
+        self.age.observe(age)
+        if self.row is not None:
+            table, row = self.table, self.row
+            table['sent'][row] += 1
+            table['skipped'][row] += skipped
+            table['age_counts'][row + (i,)] += 1
+            table['age_sum'][row] += age
+
+    def add_lagged(self, lagged: int):
+        self.lagged += lagged
+        if self.row is not None:
+            self.table['lagged'][self.row] += lagged
+
+    def add_bytes(self, nbytes: int):
+        self.bytes += nbytes
+        self.rate.add(nbytes)
+        if self.row is not None:
+            table, row, now = self.table, self.row, time.monotonic()
+            table['rate'][row] = _decayed(float(table['rate'][row]), float(table['rate_time'][row]), now) + nbytes
+            table['rate_time'][row] = now
+            table['bytes'][row] += nbytes
+
+
+class ClientStats:
+    """Send counters for one client of one (writer, stream).
+
+    The stream calls `sample()` for each sample it is about to send; the code
+    that writes to the socket calls `sent()` with the message size.
+
+    `lagged` counts samples of the writer that were passed over while a send
+    was in flight: every arrival between `sample()` and the last `sent()` of
+    that sample except the one sent next. Unlike `skipped` it leaves out the
+    samples a paced stream skips on purpose between sends.
+    """
+
+    def __init__(self, telemetry: 'Telemetry', client: str, writer: str, stream: str):
+        self.telemetry = telemetry
+        self.client = client
+        self.writer = writer
+        self.stream = stream
+        self.sent_count = 0
+        self.skipped = 0
+        self.lagged = 0
+        self.bytes = 0
+        self.age: Optional[float] = None
+        self.rate = _Rate()
+        self._output = telemetry._output(writer, stream)
+        self._mark: Optional[int] = None  # writer's samples_in when the send began
+        self._arrived = 0
+
+    def sample(self, timestamp: Optional[float], recv_time: float, skipped: int = 0):
+        """Record a sample about to be sent; `skipped` is the subscription's running total."""
+        age = time.time() - (timestamp or recv_time)
+        mark = self.telemetry.samples_in(self.writer)
+        with self.telemetry._lock:
+            self._mark, self._arrived = mark, 0
+            self.sent_count += 1
+            new_skips = max(skipped - self.skipped, 0)
+            self.skipped = max(skipped, self.skipped)
+            self.age = age
+            self._output.add_sample(new_skips, max(age, 0.0))
+
+    def sent(self, nbytes: int):
+        now_in = self.telemetry.samples_in(self.writer) if self._mark is not None else 0
+        with self.telemetry._lock:
+            if self._mark is not None:
+                before = self._arrived
+                self._arrived += max(now_in - self._mark, 0)
+                self._mark = now_in
+                lagged = max(self._arrived - 1, 0) - max(before - 1, 0)
+                self.lagged += lagged
+                self._output.add_lagged(lagged)
+            self.bytes += nbytes
+            self.rate.add(nbytes)
+            self._output.add_bytes(nbytes)
+
+    def close(self):
+        self.telemetry._close(self)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'client': self.client,
+            'writer': self.writer,
+            'stream': self.stream,
+            'sent': self.sent_count,
+            'skipped': self.skipped,
+            'lagged': self.lagged,
+            'bytes': self.bytes,
+            'bytes_per_s': round(self.rate.per_second(), 1),
+            'age': self.age,
+        }
+
+
+class Telemetry:
+    """Registry of ingest, per-stream and per-client counters."""
+
+    def __init__(self):
+        self.periods: Dict[str, float] = {}  # writer -> period in seconds
+        self._lock = threading.Lock()
+        self._ingest: Dict[str, _Ingest] = {}
+        self._outputs: Dict[Tuple[str, str], _Output] = {}
+        self._clients: Dict[int, ClientStats] = {}
+        self._ids = itertools.count(1)
+        self._shared: Optional[np.ndarray] = None
+        self._index: Dict[str, int] = {}
+        self._slot: Optional[int] = None
+
+    def share(self, writers: List[str], buffer, n_slots: int, slot: Optional[int] = None, init: bool = True):
+        """Also keep counters in `buffer` (e.g. shared memory), zeroing it if `init`.
+
+        The ingest process (`slot` None) writes ingest counters and periods;
+        a worker adds its send counters to row `slot`.
+        """
+        self._shared = np.ndarray((), dtype=shared_dtype(len(writers), n_slots), buffer=buffer)
+        if init:
+            self._shared[()] = np.zeros((), dtype=self._shared.dtype)
+        self._index = {w: i for i, w in enumerate(writers)}
+        self._slot = slot
+
+    def forget_worker(self, slot: int):
+        """Drop the client gauge of a worker that exited; its counters stay in the totals."""
+        if self._shared is not None:
+            self._shared['outputs']['clients'][slot] = 0
+
+    def period(self, writer: str) -> Optional[float]:
+        """Writer period in seconds, from the ingest process if it runs elsewhere."""
+        period = self.periods.get(writer)
+        if period is None and self._shared is not None and writer in self._index:
+            period = float(self._shared['ingest']['period'][self._index[writer]]) or None
+        return period
+
+    def ingest(self, writer: str, data: Any):
+        """Count a sample read by the ingest thread and estimate missed ones."""
+        t = sample_time(data)
+        with self._lock:
+            stats = self._ingest.get(writer)
+            if stats is None:
+                stats = self._ingest[writer] = _Ingest()
+            stats.samples += 1
+            stats.rate.add(1)
+            period = self.periods.get(writer)
+            if t is not None and stats.last_time is not None and period:
+                gap = t - stats.last_time
+                if 1.5 * period < gap <= MAX_GAP_S:
+                    stats.dropped += int(round(gap / period)) - 1
+            if t is not None:
+                stats.last_time = t
+            if self._shared is not None and writer in self._index:
+                row = self._shared['ingest'][self._index[writer]]
+                row['samples'], row['dropped'] = stats.samples, stats.dropped
+                row['rate'], row['rate_time'] = stats.rate.value, stats.rate.last
+                row['period'] = period or 0.0
+
+    def samples_in(self, writer: str) -> int:
+        """Samples of a writer read so far (by whichever process ingests)."""
+        if self._shared is not None and writer in self._index:
+            return int(self._shared['ingest']['samples'][self._index[writer]])
+        stats = self._ingest.get(writer)
+        return stats.samples if stats is not None else 0
+
+    def client_id(self, prefix: str) -> str:
+        return f'{prefix}-{next(self._ids)}'
+
+    def _output(self, writer: str, stream: str) -> _Output:
+        with self._lock:
+            output = self._outputs.get((writer, stream))
+            if output is None:
+                row = None
+                if self._slot is not None and writer in self._index and stream in STREAMS:
+                    row = (self._slot, self._index[writer], STREAMS.index(stream))
+                output = self._outputs[(writer, stream)] = _Output(
+                    self._shared['outputs'] if row is not None else None, row)
+            output.add_clients(1)
+            return output
+
+    def client(self, client: str, writer: str, stream: str) -> ClientStats:
+        stats = ClientStats(self, client, writer, stream)
+        with self._lock:
+            self._clients[id(stats)] = stats
+        return stats
+
+    def _close(self, stats: ClientStats):
+        with self._lock:
+            if self._clients.pop(id(stats), None) is not None:
+                stats._output.add_clients(-1)
+
+    def send_lag(self) -> Tuple[int, int]:
+        """Samples sent, and samples passed over during sends, since startup (by every process when shared)."""
+        with self._lock:
+            outputs = [o for o in self._outputs.values() if o.row is None]
+            sent, lagged = sum(o.sent for o in outputs), sum(o.lagged for o in outputs)
+            if self._shared is not None:
+                table = self._shared['outputs']
+                sent, lagged = sent + int(table['sent'].sum()), lagged + int(table['lagged'].sum())
+            return sent, lagged
+
+    def _collect(self):
+        """Ingest and send counters, summed over all processes when shared (call with the lock held).
+
+        Returns ({writer: (samples, dropped, samples/s)},
+                 {(writer, stream): (clients, sent, skipped, bytes, bytes/s, Histogram)}).
+        """
+        now = time.monotonic()
+        outputs = {}
+        for key, o in self._outputs.items():
+            if o.row is None:
+                outputs[key] = (o.clients, o.sent, o.skipped, o.bytes, o.rate.per_second(), o.age)
+        if self._shared is None:
+            ingest = {w: (s.samples, s.dropped, s.rate.per_second()) for w, s in self._ingest.items()}
+            return ingest, outputs
+
+        ingest = {}
+        for writer, i in self._index.items():
+            row = self._shared['ingest'][i]
+            if row['samples']:
+                rate = _decayed(float(row['rate']), float(row['rate_time']), now) / RATE_WINDOW_S
+                ingest[writer] = (int(row['samples']), int(row['dropped']), rate)
+        table = self._shared['outputs']
+        for writer, i in self._index.items():
+            for j, stream in enumerate(STREAMS):
+                rows = table[:, i, j]
+                if not rows['sent'].any() and not rows['clients'].any():
+                    continue
+                age = Histogram()
+                age.counts = [int(c) for c in rows['age_counts'].sum(axis=0)]
+                age.count = sum(age.counts)
+                age.sum = float(rows['age_sum'].sum())
+                rate = sum(_decayed(float(v), float(t), now) for v, t in zip(rows['rate'], rows['rate_time']))
+                outputs[(writer, stream)] = (int(rows['clients'].sum()), int(rows['sent'].sum()),
+                                             int(rows['skipped'].sum()), int(rows['bytes'].sum()),
+                                             rate / RATE_WINDOW_S, age)
+        return ingest, outputs
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            ingest, outputs = self._collect()
+            writers = {}
+            for writer, (samples, dropped, rate) in ingest.items():
+                writers[writer] = {
+                    'samples_in': samples,
+                    'dropped_in': dropped,
+                    'samples_per_s': round(rate, 2),
+                    'streams': {},
+                }
+            for (writer, stream), (clients, sent, skipped, nbytes, rate, age) in outputs.items():
+                entry = writers.setdefault(writer, {'samples_in': 0, 'dropped_in': 0,
+                                                    'samples_per_s': 0.0, 'streams': {}})
+                entry['streams'][stream] = {
+                    'clients': clients,
+                    'sent': sent,
+                    'skipped': skipped,
+                    'bytes': nbytes,
+                    'bytes_per_s': round(rate, 1),
+                    'age_s': age.to_dict(),
+                }
+            clients = [c.to_dict() for c in self._clients.values()]
+        return {'time': time.time(), 'writers': writers, 'clients': clients}
+
+    def prometheus(self) -> str:
+        """All counters in the Prometheus text exposition format."""
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, help: str, samples):
+            lines.append(f'# HELP {name} {help}')
+            lines.append(f'# TYPE {name} {kind}')
+            for labels, value in samples:
+                label = ','.join(f'{k}="{v}"' for k, v in labels.items())
+                lines.append(f'{name}{{{label}}} {value}')
+
+        with self._lock:
+            collected_ingest, collected_outputs = self._collect()
+        ingest = [({'writer': w}, s) for w, s in sorted(collected_ingest.items())]
+        outputs = [({'writer': w, 'stream': st}, o) for (w, st), o in sorted(collected_outputs.items())]
+        metric('flow_samples_in_total', 'counter', 'Samples read from each writer.',
+               [(l, s[0]) for l, s in ingest])
+        metric('flow_samples_dropped_total', 'counter',
+               'Writer samples never read by Flow, estimated from timestamp gaps.',
+               [(l, s[1]) for l, s in ingest])
+        metric('flow_clients', 'gauge', 'Connected clients per writer stream.',
+               [(l, o[0]) for l, o in outputs])
+        metric('flow_samples_sent_total', 'counter', 'Samples sent to clients.',
+               [(l, o[1]) for l, o in outputs])
+        metric('flow_samples_skipped_total', 'counter',
+               'Samples clients skipped because they were still sending an older one.',
+               [(l, o[2]) for l, o in outputs])
+        metric('flow_bytes_sent_total', 'counter', 'Bytes sent to clients.',
+               [(l, o[3]) for l, o in outputs])
+        metric('flow_bytes_per_second', 'gauge', f'Bytes sent per second ({RATE_WINDOW_S:g}s decay).',
+               [(l, round(o[4], 1)) for l, o in outputs])
+
+        name = 'flow_sample_age_seconds'
+        lines.append(f'# HELP {name} Age of samples when sent, from the sample timestamp.')
+        lines.append(f'# TYPE {name} histogram')
+        for labels, o in outputs:
+            label = ','.join(f'{k}="{v}"' for k, v in labels.items())
+            age = o[5]
+            for bound, total in age.cumulative():
+                lines.append(f'{name}_bucket{{{label},le="{bound}"}} {total}')
+            lines.append(f'{name}_sum{{{label}}} {age.sum}')
+            lines.append(f'{name}_count{{{label}}} {age.count}')
+        return '\n'.join(lines) + '\n'
@@ -0,0 +1,82 @@
+"""Governor level changes driven by fake pressure signals.
+
+    python -m pytest test_governor.py
+"""
+
+from governor import Governor
+
+
+class FakeBacklog:
+    """Running (sent, lagged) totals that grow by a chosen lag share per check."""
+
+    def __init__(self):
+        self.sent = 0
+        self.lagged = 0
+
+    def add(self, sent: int, lagged: int):
+        self.sent += sent
+        self.lagged += lagged
+
+    def __call__(self):
+        return self.sent, self.lagged
+
+
+def make_governor(backlog: FakeBacklog, **kwargs) -> Governor:
+    return Governor(backlog, interval=1.0, restore_s=10.0,
+                    temperature=lambda: None, load=lambda: 0.1, **kwargs)
+
+
+def test_backlog_raises_level_then_restores():
+    backlog = FakeBacklog()
+    governor = make_governor(backlog)
+    now = 0.0
+
+    for _ in range(3):
+        backlog.add(sent=10, lagged=10)
+        now += 1.0
+        governor.update(now)
+    assert governor.level == 3
+    assert governor.scales['points'] == 0.1
+    assert governor.scales['camera'] == 1.0
+
+    # Sends keep up again: one level back per restore_s of calm
+    while governor.level and now < 100.0:
+        backlog.add(sent=10, lagged=0)
+        now += 1.0
+        governor.update(now)
+    assert governor.level == 0
+    assert governor.scales == {c: 1.0 for c in governor.priority}
+    assert 30.0 <= now <= 35.0
+
+
+def test_idle_streams_are_calm():
+    backlog = FakeBacklog()
+    governor = make_governor(backlog)
+    governor.level = 2
+
+    for t in range(1, 25):
+        governor.update(float(t))  # nothing sent, nothing lagged
+    assert governor.level == 0
+
+
+def test_level_holds_between_thresholds():
+    backlog = FakeBacklog()
+    governor = make_governor(backlog)
+    backlog.add(sent=10, lagged=10)
+    governor.update(1.0)
+    assert governor.level == 1
+
+    for t in range(2, 40):
+        backlog.add(sent=80, lagged=20)  # 0.2: below high, above low
+        governor.update(float(t))
+    assert governor.level == 1
+
+
+def test_high_load_sheds_in_priority_order():
+    backlog = FakeBacklog()
+    governor = Governor(backlog, temperature=lambda: None, load=lambda: 2.0)
+    for t in range(governor.max_level + 2):
+        governor.update(float(t))
+    assert governor.level == governor.max_level
+    assert governor.scales['transcript'] == 1.0
+    assert governor.scales['writer'] == 0.5
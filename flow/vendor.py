@@ -0,0 +1,105 @@
+#!/usr/bin/env python3
+# /// script
+# dependencies = [
+#   "brotli",
+# ]
+# ///
+"""Fetch the pinned frontend libraries into static/vendor for offline use.
+
+Run once on a machine with internet access (or on the robot before it goes
+onto the shop floor network):
+
+    uv run vendor.py [--force]
+
+Each file is saved under a versioned name with `.gz` and `.br` variants
+next to it, so the Flow server can send them with immutable caching and
+without compressing per request (see assets.py). The server calls `ensure()`
+at startup: it fetches whatever is missing and refuses to start if that
+fails, since the page would otherwise depend on a CDN it may not reach.
+"""
+
+import argparse
+import gzip
+import os
+import urllib.request
+from typing import List
+
+VENDOR_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'vendor')
+
+# Vendored file name -> pinned production build
+VENDOR = {
+    'react-18.3.1.production.min.js':
+        'https://unpkg.com/react@18.3.1/umd/react.production.min.js',
+    'react-dom-18.3.1.production.min.js':
+        'https://unpkg.com/react-dom@18.3.1/umd/react-dom.production.min.js',
+    'reactflow-11.11.4.min.js':
+        'https://cdn.jsdelivr.net/npm/reactflow@11.11.4/dist/umd/index.min.js',
+    'reactflow-11.11.4.css':
+        'https://cdn.jsdelivr.net/npm/reactflow@11.11.4/dist/style.css',
+    'three-0.160.0.module.min.js':
+        'https://cdn.jsdelivr.net/npm/three@0.160.0/build/three.module.min.js',
+    'three-0.160.0.OrbitControls.js':
+        'https://cdn.jsdelivr.net/npm/three@0.160.0/examples/jsm/controls/OrbitControls.js',
+}
+
+
+def write(path: str, data: bytes):
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        f.write(data)
+    os.replace(tmp, path)
+
+
+def fetch(name: str, url: str, force: bool = False):
+    try:
+        import brotli  # only needed here, so the server can import VENDOR without it
+    except ImportError:
+        brotli = None  # assets.py compresses with gzip at load instead
+
+    path = os.path.join(VENDOR_DIR, name)
+    if os.path.exists(path) and not force:
+        print(f"{name}: already vendored")
+        return
+    with urllib.request.urlopen(url, timeout=30) as response:
+        data = response.read()
+    write(path, data)
+    write(path + '.gz', gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli is not None:
+        write(path + '.br', brotli.compress(data, quality=11))
+    print(f"{name}: {len(data)} bytes from {url}")
+
+
+def missing() -> List[str]:
+    return [name for name in VENDOR if not os.path.exists(os.path.join(VENDOR_DIR, name))]
+
+
+def ensure():
+    """Fetch any file that is not vendored yet; RuntimeError naming the ones that could not be."""
+    names = missing()
+    if not names:
+        return
+    os.makedirs(VENDOR_DIR, exist_ok=True)
+    failed = []
+    for name in names:
+        try:
+            fetch(name, VENDOR[name])
+        except Exception as e:
+            print(f"{name}: {e}")
+            failed.append(name)
+    if failed:
+        raise RuntimeError(f"Frontend libraries missing from {VENDOR_DIR}: {', '.join(failed)}. "
+                           f"Run `uv run vendor.py` on a machine with internet access and copy them over.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--force', action='store_true', help='download files that are already vendored')
+    args = parser.parse_args()
+
+    os.makedirs(VENDOR_DIR, exist_ok=True)
+    for name, url in VENDOR.items():
+        fetch(name, url, args.force)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,245 @@
+# /// script
+# dependencies = [
+#   "bbos",
+#   "psutil",
+# ]
+# [tool.uv.sources]
+# bbos = { path = "/home/bracketbot/BracketBotOS", editable = true }
+# ///
+"""Cold-start profiler: how long an app takes from start_app to its first published sample.
+
+    uv run tools/coldstart.py follow [--writer drive.ctrl] [--runs 3] [--timeout 120] [--keep]
+
+The app is stopped first if it is running, then started through
+bbos.app_manager while a polling loop timestamps, in seconds after the call:
+
+    start_app      start_app() returned
+    spawn          the first process running the app's script was created
+    interpreter    the first extension module was mapped into it, i.e. the
+                   interpreter is up and the script has started importing
+    <import>       each heavy library in HEAVY_IMPORTS was mapped (found in
+                   /proc/<pid>/maps of the app or any child, so only
+                   libraries with native code can be seen)
+    first_publish  the first sample arrived on the app's writer
+
+Runs are appended per app to RESULTS_PATH, which the dashboard shows. This
+lives under tools/ rather than next to the apps so app_manager does not list
+it as one.
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import statistics
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Set
+
+import psutil
+from bbos import Reader
+from bbos.app_manager import get_status, start_app, stop_app
+
+RESULTS_PATH = Path(os.environ.get("COLDSTART_RESULTS", Path(__file__).with_name("coldstart.json")))
+RUNS_KEPT = 20  # per app
+
+POLL_S = 0.02
+
+# Writer whose first sample marks an app as up
+APP_WRITERS = {
+    "follow": "drive.ctrl",
+    "teleop": "drive.ctrl",
+    "wasd": "drive.ctrl",
+    "realtime": "speakerphone.speaker",
+    "kitten_tts": "speakerphone.speaker",
+    "hey_bracketbot": "led_strip.ctrl",
+    "audio_led": "led_strip.ctrl",
+    "rainbow": "led_strip.ctrl",
+    "strobe_blue": "led_strip.ctrl",
+    "fireplace": "led_strip.ctrl",
+}
+
+# Import name -> substrings of the shared objects it maps
+HEAVY_IMPORTS = {
+    "numpy": ("_multiarray_umath",),
+    "cv2": ("/cv2/", "libopencv"),
+    "torch": ("libtorch",),
+    "Detector": ("onnxruntime", "librknnrt"),  # bracketbot_ai's inference runtimes
+}
+
+EXTENSION_MARKERS = ("/lib-dynload/", "/site-packages/")
+
+
+def app_name(cmdline: List[str]) -> Optional[str]:
+    """App a command line runs: the first .py script's stem, or its directory for main.py."""
+    for arg in cmdline:
+        if arg.endswith(".py"):
+            stem = os.path.splitext(os.path.basename(arg))[0]
+            if stem == "main":
+                stem = os.path.basename(os.path.dirname(arg)) or stem
+            return stem
+    return None
+
+
+def mapped(pid: int) -> Set[str]:
+    """Paths of the files a process has mapped."""
+    try:
+        with open(f"/proc/{pid}/maps") as f:
+            return {line.split(None, 5)[5].strip() for line in f if line.count(" ") >= 5 and "/" in line}
+    except (OSError, IndexError):
+        return set()
+
+
+class ProcessWatch:
+    """The processes running one app, found by command line and followed to their children."""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.pids: Set[int] = set()
+        self._seen: Set[int] = set(psutil.pids())  # existed before the start: not ours
+
+    def poll(self) -> Set[int]:
+        for pid in set(psutil.pids()) - self._seen:
+            self._seen.add(pid)
+            try:
+                if app_name(psutil.Process(pid).cmdline()) == self.name:
+                    self.pids.add(pid)
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                pass
+        for pid in list(self.pids):
+            try:
+                self.pids.update(child.pid for child in psutil.Process(pid).children(recursive=True))
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                self.pids.discard(pid)
+        return self.pids
+
+    def created(self) -> Optional[float]:
+        times = []
+        for pid in self.pids:
+            try:
+                times.append(psutil.Process(pid).create_time())
+            except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
+                pass
+        return min(times) if times else None
+
+
+def open_reader(writer: str, stack: contextlib.ExitStack) -> Optional[Reader]:
+    """Enter a Reader for `writer` on `stack`, or None if the writer is not up yet."""
+    try:
+        return stack.enter_context(Reader(writer))
+    except Exception:
+        return None
+
+
+def wait_stopped(name: str, timeout: float):
+    if not get_status().get(name):
+        return
+    print(f"{name} is running, stopping it first")
+    stop_app(name)
+    deadline = time.time() + timeout
+    while get_status().get(name) and time.time() < deadline:
+        time.sleep(0.2)
+    time.sleep(1.0)  # let its writer go away
+
+
+def profile(name: str, writer: Optional[str], timeout: float) -> Dict[str, Any]:
+    """Start `name` once and time its startup phases."""
+    watch = ProcessWatch(name)
+    phases: Dict[str, float] = {}
+    pending = dict(HEAVY_IMPORTS)
+
+    with contextlib.ExitStack() as stack:
+        reader = open_reader(writer, stack) if writer else None
+        t0 = time.time()
+        ok = start_app(name)
+        phases["start_app"] = time.time() - t0
+        while time.time() - t0 < timeout:
+            now = time.time() - t0
+            pids = watch.poll()
+            if pids and "spawn" not in phases:
+                created = watch.created()
+                phases["spawn"] = max(created - t0, 0.0) if created else now
+            if pids and ("interpreter" not in phases or pending):
+                maps = set().union(*(mapped(pid) for pid in pids))
+                if "interpreter" not in phases and any(m in path for path in maps for m in EXTENSION_MARKERS):
+                    phases["interpreter"] = now
+                for lib, markers in list(pending.items()):
+                    if any(m in path for path in maps for m in markers):
+                        phases[lib] = now
+                        del pending[lib]
+            if writer:
+                if reader is None:
+                    reader = open_reader(writer, stack)
+                elif reader.ready():
+                    phases["first_publish"] = time.time() - t0
+                    break
+            elif not pending and "interpreter" in phases:
+                break
+            time.sleep(POLL_S)
+
+    return {
+        "time": t0,
+        "writer": writer,
+        "started": bool(ok),
+        "timed_out": writer is not None and "first_publish" not in phases,
+        "phases": {k: round(v, 3) for k, v in sorted(phases.items(), key=lambda kv: kv[1])},
+    }
+
+
+def load_results(path: Path = RESULTS_PATH) -> Dict[str, List[Dict[str, Any]]]:
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_run(name: str, run: Dict[str, Any], path: Path = RESULTS_PATH):
+    results = load_results(path)
+    results[name] = (results.get(name, []) + [run])[-RUNS_KEPT:]
+    tmp = path.with_suffix(".tmp")
+    with open(tmp, "w") as f:
+        json.dump(results, f, indent=1)
+    os.replace(tmp, path)
+
+
+def summary(runs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Latest run plus the median of each phase over the kept runs."""
+    phases: Dict[str, List[float]] = {}
+    for run in runs:
+        for phase, t in run["phases"].items():
+            phases.setdefault(phase, []).append(t)
+    return {
+        "runs": len(runs),
+        "latest": runs[-1] if runs else None,
+        "median": {phase: round(statistics.median(ts), 3) for phase, ts in phases.items()},
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time an app from start_app to its first published sample.")
+    parser.add_argument("app", help="app name as known to bbos.app_manager")
+    parser.add_argument("--writer", help="writer that marks the app as up (default: from APP_WRITERS)")
+    parser.add_argument("--runs", type=int, default=1)
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds to wait for the first sample")
+    parser.add_argument("--keep", action="store_true", help="leave the app running after the last run")
+    args = parser.parse_args()
+
+    writer = args.writer or APP_WRITERS.get(args.app)
+    if writer is None:
+        print(f"No writer known for {args.app}: timing process startup and imports only")
+    for i in range(args.runs):
+        wait_stopped(args.app, args.timeout)
+        run = profile(args.app, writer, args.timeout)
+        save_run(args.app, run)
+        phases = "  ".join(f"{k} {v:.2f}s" for k, v in run["phases"].items())
+        print(f"[{i + 1}/{args.runs}] {args.app}: {phases}" + ("  (timed out)" if run["timed_out"] else ""))
+        if i < args.runs - 1 or not args.keep:
+            stop_app(args.app)
+
+    s = summary(load_results()[args.app])
+    print(f"Median over {s['runs']} runs: " + "  ".join(f"{k} {v:.2f}s" for k, v in s["median"].items()))
+
+
+if __name__ == "__main__":
+    main()